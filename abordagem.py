@@ -1,13 +1,31 @@
 # -*- coding: utf-8 -*-
 import streamlit as st
 import pandas as pd
+import numpy as np
 import gspread
 from google.oauth2.service_account import Credentials
 from datetime import datetime, date
 from zoneinfo import ZoneInfo
+import os
 import re
+import sqlite3
+import bisect
+import math
+import random
 import base64
+import copy
+import functools
+import hmac
+import io
+import json
+import logging
+import threading
+import time
 import unicodedata
+import uuid
+import zlib
+from collections import deque
+from contextlib import contextmanager
 from pathlib import Path
 from typing import Optional, Dict, List
 
@@ -17,10 +35,36 @@ BTN_HEIGHT = "5.12em"   # Altura de TODOS os botões
 BTN_GAP    = "3px"      # Espaçamento vertical unificado
 # ============================================================
 
+# --- ATIVOS ESTÁTICOS (lidos e codificados uma vez por processo) ---
+BASE_DIR = Path(__file__).parent
+ALTURA_LOGO_PX = 112  # 2x os 56 px do cabeçalho: nítido em telas de alta densidade
+
+def _png_reduzido(path: Path, altura_max: int) -> bytes:
+    """PNG redimensionado para no máximo `altura_max` px de altura (original se o Pillow faltar)."""
+    dados = path.read_bytes()
+    try:
+        from PIL import Image
+    except ImportError:
+        return dados
+    img = Image.open(io.BytesIO(dados))
+    if img.height <= altura_max:
+        return dados
+    img = img.resize((max(1, round(img.width * altura_max / img.height)), altura_max), Image.LANCZOS)
+    saida = io.BytesIO()
+    img.save(saida, format="PNG", optimize=True)
+    return saida.getvalue()
+
+@st.cache_resource(show_spinner=False)
+def _img_bytes(nome: str, altura_max: int = ALTURA_LOGO_PX) -> Optional[bytes]:
+    p = BASE_DIR / nome
+    if not p.exists():
+        return None
+    return _png_reduzido(p, altura_max)
+
 # --- CONFIG DA PÁGINA ---
 st.set_page_config(
     page_title="App COP30",
-    page_icon="logo.png",
+    page_icon=_img_bytes("logo.png", 64) or "logo.png",
     layout="centered",
     initial_sidebar_state="collapsed"
 )
@@ -71,30 +115,39 @@ FAIXA_OPCOES = [
 ]
 
 # --- LOGOS (BASE64) ---
-def _img_b64(path: str) -> Optional[str]:
-    p = Path(path)
-    if not p.exists():
+def _img_src(nome: str) -> Optional[str]:
+    """
+    URL da imagem no cabeçalho: com server.enableStaticServing e o arquivo em static/, o navegador
+    baixa uma vez e guarda em cache; senão, data URI do PNG reduzido.
+    """
+    if st.get_option("server.enableStaticServing") and (BASE_DIR / "static" / nome).exists():
+        return f"app/static/{nome}"
+    dados = _img_bytes(nome)
+    if dados is None:
         return None
-    return base64.b64encode(p.read_bytes()).decode("utf-8")
-
-def render_header(esquerda: str = "logo.png", direita: str = "anatel.png"):
-    left_b64  = _img_b64(esquerda)
-    right_b64 = _img_b64(direita)
-    left_tag  = f'<img class="hdr-img hdr-left" src="data:image/png;base64,{left_b64}" alt="Logo esquerda">' if left_b64 else ""
-    right_tag = f'<img class="hdr-img hdr-right" src="data:image/png;base64,{right_b64}" alt="Logo direita">' if right_b64 else ""
-    st.markdown(
-        f"""
+    return "data:image/png;base64," + base64.b64encode(dados).decode("utf-8")
+
+@st.cache_resource(show_spinner=False)
+def _html_cabecalho(esquerda: str, direita: str) -> str:
+    left_src  = _img_src(esquerda)
+    right_src = _img_src(direita)
+    left_tag  = f'<img class="hdr-img hdr-left" src="{left_src}" alt="Logo esquerda">' if left_src else ""
+    right_tag = f'<img class="hdr-img hdr-right" src="{right_src}" alt="Logo direita">' if right_src else ""
+    return f"""
         <div class="header-logos">
             {left_tag}
             <h2>{TITULO_PRINCIPAL}</h2>
             {right_tag}
         </div>
-        """,
-        unsafe_allow_html=True
-    )
+        """
+
+def render_header(esquerda: str = "logo.png", direita: str = "anatel.png"):
+    st.markdown(_html_cabecalho(esquerda, direita), unsafe_allow_html=True)
 
 # --- CSS — implementando as SUGESTÕES do usuário ---
-st.markdown(f"""
+@st.cache_resource(show_spinner=False)
+def _css_app() -> str:
+    return f"""
 <style>
   /* ===== CONFIG GERAL ===== */
   :root{{
@@ -257,11 +310,17 @@ st.markdown(f"""
   }}
 
 </style>
-""", unsafe_allow_html=True)
+"""
+
+st.markdown(_css_app(), unsafe_allow_html=True)
 
 # --- CONEXÃO GSPREAD ---
 @st.cache_resource(ttl=3600)
 def get_gspread_client():
+    # Backend local em memória (testes/benchmarks sem tocar na planilha real): COP30_BACKEND=fake
+    if os.environ.get("COP30_BACKEND", "").strip().lower() == "fake":
+        import planilha_fake
+        return planilha_fake.ClienteFake()
     creds = Credentials.from_service_account_info(st.secrets["gcp_service_account"])
     scoped = creds.with_scopes([
         "https://www.googleapis.com/auth/spreadsheets",
@@ -269,13 +328,463 @@ def get_gspread_client():
     ])
     return gspread.authorize(scoped)
 
+# --- DIAGNÓSTICO (chamadas ao Sheets e cache) ---
+# Métodos do gspread que vão à rede; os demais atributos passam direto.
+_METODOS_API = frozenset({
+    "open_by_url", "open_by_key", "open",
+    "worksheets", "worksheet", "add_worksheet", "values_batch_get", "values_get", "values_update",
+    "values_append", "get_lastUpdateTime", "fetch_sheet_metadata",
+    "get", "get_values", "get_all_values", "get_all_records", "batch_get", "col_values", "row_values",
+    "acell", "cell", "find", "findall", "update", "update_cell", "update_acell", "batch_update",
+    "append_row", "append_rows", "insert_row", "insert_rows", "delete_rows", "clear", "batch_clear", "format",
+})
+# Métricas por rerun em JSONL só com COP30_METRICAS=<arquivo>; sem ela ficam apenas na memória (últimos reruns).
+# O arquivo é rotacionado (um .1) ao passar de COP30_METRICAS_MB.
+ARQUIVO_METRICAS = Path(os.environ["COP30_METRICAS"]) if os.environ.get("COP30_METRICAS", "").strip() else None
+METRICAS_MAX_MB = float(os.environ.get("COP30_METRICAS_MB", "20"))
+
+def _tamanho_aprox(obj) -> int:
+    """Bytes aproximados (caracteres) de um payload do Sheets: listas de linhas, dicts da API, strings."""
+    if obj is None:
+        return 0
+    if isinstance(obj, str):
+        return len(obj)
+    if isinstance(obj, (int, float)):
+        return len(str(obj))
+    if isinstance(obj, dict):
+        return sum(_tamanho_aprox(v) for v in obj.values())
+    if isinstance(obj, (list, tuple)):
+        try:
+            if obj and isinstance(obj[0], list):
+                return sum(map(len, map("".join, obj)))  # lista de linhas (values)
+            return len("".join(obj))  # linha de células
+        except TypeError:
+            return sum(_tamanho_aprox(v) for v in obj)
+    return 0
+
+def _intervalo_da_chamada(metodo: str, args, kwargs) -> str:
+    if metodo == "values_batch_get":
+        alvo = args[0] if args else kwargs.get("ranges", [])
+        texto = ", ".join(map(str, alvo))
+    elif metodo == "batch_update":
+        alvo = args[0] if args else kwargs.get("data", [])
+        texto = ", ".join(str(d.get("range", "")) for d in alvo if isinstance(d, dict))
+    elif args and isinstance(args[0], (str, int)):
+        texto = str(args[0])
+    else:
+        texto = str(kwargs.get("range_name", ""))
+    return texto if len(texto) <= 200 else texto[:197] + "..."
+
+class _Diagnostico:
+    """
+    Contadores do processo: cada chamada ao Sheets (tempo, intervalo, bytes), agrupada
+    por rerun e por tela, e acertos/faltas dos loaders em st.cache_data.
+    O rerun corrente fica em um threading.local (cada sessão roda o script na sua thread).
+    Os últimos MAX_RERUNS reruns ficam na memória; com ARQUIVO_METRICAS definido, cada rerun
+    também vira uma linha JSONL nesse arquivo, rotacionado ao passar de max_mb.
+    """
+    MAX_CHAMADAS = 500
+    MAX_RERUNS = 200
+
+    def __init__(self, arquivo: Optional[Path] = ARQUIVO_METRICAS, max_mb: float = METRICAS_MAX_MB):
+        self.arquivo = arquivo
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.inicio = time.time()
+        self.chamadas = deque(maxlen=self.MAX_CHAMADAS)
+        self.reruns = deque(maxlen=self.MAX_RERUNS)
+        self.por_tela: Dict[str, Dict[str, float]] = {}
+        self.por_metodo: Dict[str, Dict[str, float]] = {}
+        self.cache: Dict[str, Dict[str, int]] = {}
+        self._ultimo_minuto = deque()  # (instante, tela)
+
+    def _acumular(self, tabela, chave, **valores):
+        linha = tabela.setdefault(chave, {k: 0 for k in ("reruns", "chamadas", "ms", "bytes", "erros")})
+        for k, v in valores.items():
+            linha[k] += v
+
+    # ---- rerun corrente ----
+    def iniciar_rerun(self, sessao: str, numero: int, tela: str):
+        self._local.rerun = {"ts": time.time(), "sessao": sessao, "rerun": numero, "tela": tela,
+                             "chamadas": [], "cache": {}}
+        self._local.t0 = time.perf_counter()
+
+    def tela_corrente(self) -> str:
+        rerun = getattr(self._local, "rerun", None)
+        return rerun["tela"] if rerun else "(fora de rerun)"
+
+    def finalizar_rerun(self):
+        rerun = getattr(self._local, "rerun", None)
+        if rerun is None:
+            return
+        self._local.rerun = None
+        rerun["ms_rerun"] = round((time.perf_counter() - self._local.t0) * 1000, 1)
+        rerun["total_chamadas"] = len(rerun["chamadas"])
+        rerun["ms_sheets"] = round(sum(c["ms"] for c in rerun["chamadas"]), 1)
+        rerun["bytes"] = sum(c["bytes_recebidos"] + c["bytes_enviados"] for c in rerun["chamadas"])
+        with self._lock:
+            self.reruns.append(rerun)
+            self._acumular(self.por_tela, rerun["tela"], reruns=1)
+        if self.arquivo is not None:
+            self._gravar(rerun)
+
+    def _gravar(self, rerun: dict):
+        linha = json.dumps(rerun, ensure_ascii=False) + "\n"
+        try:
+            with self._lock:
+                if self.arquivo.exists() and self.arquivo.stat().st_size + len(linha) > self.max_bytes:
+                    os.replace(self.arquivo, self.arquivo.with_name(self.arquivo.name + ".1"))
+                with open(self.arquivo, "a", encoding="utf-8") as f:
+                    f.write(linha)
+        except OSError:
+            pass  # métrica nunca derruba a tela
+
+    # ---- registros ----
+    def registrar_chamada(self, metodo: str, alvo: str, intervalo: str, ms: float,
+                          enviados: int, recebidos: int, erro: Optional[str] = None):
+        tela = self.tela_corrente()
+        chamada = {"ts": round(time.time(), 3), "tela": tela, "metodo": metodo, "alvo": alvo,
+                   "intervalo": intervalo, "ms": round(ms, 1), "bytes_enviados": enviados,
+                   "bytes_recebidos": recebidos, "erro": erro}
+        rerun = getattr(self._local, "rerun", None)
+        if rerun is not None:
+            rerun["chamadas"].append(chamada)
+        bytes_total = enviados + recebidos
+        with self._lock:
+            self.chamadas.append(chamada)
+            self._acumular(self.por_tela, tela, chamadas=1, ms=ms, bytes=bytes_total, erros=int(erro is not None))
+            self._acumular(self.por_metodo, metodo, chamadas=1, ms=ms, bytes=bytes_total, erros=int(erro is not None))
+            agora = time.monotonic()
+            self._ultimo_minuto.append((agora, tela))
+            while self._ultimo_minuto and agora - self._ultimo_minuto[0][0] > 60:
+                self._ultimo_minuto.popleft()
+
+    def registrar_cache(self, loader: str, falta: bool):
+        rerun = getattr(self._local, "rerun", None)
+        if rerun is not None and falta:
+            rerun["cache"][loader] = "falta"
+        elif rerun is not None:
+            rerun["cache"].setdefault(loader, "acerto")
+        with self._lock:
+            linha = self.cache.setdefault(loader, {"chamadas": 0, "faltas": 0})
+            linha["faltas" if falta else "chamadas"] += 1
+
+    def fotografia(self) -> dict:
+        """Cópia consistente dos contadores para exibição."""
+        with self._lock:
+            return {
+                "por_tela": {k: dict(v) for k, v in self.por_tela.items()},
+                "por_metodo": {k: dict(v) for k, v in self.por_metodo.items()},
+                "cache": {k: dict(v) for k, v in self.cache.items()},
+                "reruns": list(self.reruns),
+                "chamadas": list(self.chamadas),
+            }
+
+    def chamadas_ultimo_minuto(self) -> Dict[str, int]:
+        with self._lock:
+            agora = time.monotonic()
+            contagem: Dict[str, int] = {}
+            for instante, tela in self._ultimo_minuto:
+                if agora - instante <= 60:
+                    contagem[tela] = contagem.get(tela, 0) + 1
+            return contagem
+
+@st.cache_resource
+def get_diagnostico() -> _Diagnostico:
+    return _Diagnostico()
+
+# --- LIMITADOR DE COTA DO SHEETS (compartilhado por todas as sessões) ---
+# Cota padrão da API: 60 leituras e 60 escritas por minuto por usuário (a conta de serviço é um usuário só)
+COTA_LEITURAS_MIN = int(os.environ.get("COP30_COTA_LEITURA", "55"))
+COTA_ESCRITAS_MIN = int(os.environ.get("COP30_COTA_ESCRITA", "55"))
+_METODOS_ESCRITA = frozenset({
+    "values_update", "values_append", "add_worksheet", "update", "update_cell", "update_acell", "batch_update",
+    "append_row", "append_rows", "insert_row", "insert_rows", "delete_rows", "clear", "batch_clear", "format",
+})
+_CODIGOS_TRANSITORIOS = frozenset({429, 500, 502, 503, 504})
+MAX_TENTATIVAS = 5
+BACKOFF_MAX_S = 16.0
+
+class _BaldeTokens:
+    def __init__(self, por_minuto: int):
+        self.capacidade = float(max(1, por_minuto))
+        self.taxa = self.capacidade / 60.0  # tokens por segundo
+        self.tokens = self.capacidade
+        self.atualizado = time.monotonic()
+
+    def espera(self, agora: float) -> float:
+        """Segundos até haver um token (0 = pode consumir já)."""
+        self.tokens = min(self.capacidade, self.tokens + (agora - self.atualizado) * self.taxa)
+        self.atualizado = agora
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.taxa
+
+class _LimitadorCota:
+    """
+    Token bucket por processo, com orçamentos separados para leitura e escrita.
+    Enquanto houver escrita na fila, as leituras esperam: um envio de campo nunca
+    perde a vez para recarga de dados. Um 429 esvazia o balde, freando todas as sessões.
+    """
+    def __init__(self, leituras_min: int = COTA_LEITURAS_MIN, escritas_min: int = COTA_ESCRITAS_MIN):
+        self._cond = threading.Condition()
+        self._baldes = {"leitura": _BaldeTokens(leituras_min), "escrita": _BaldeTokens(escritas_min)}
+        self._escritas_na_fila = 0
+        self.esperas = 0
+        self.segundos_espera = 0.0
+        self.retentativas = 0
+        self.cotas_excedidas = 0
+
+    def adquirir(self, tipo: str, timeout: float = 120.0):
+        inicio = time.monotonic()
+        with self._cond:
+            if tipo == "escrita":
+                self._escritas_na_fila += 1
+            try:
+                while True:
+                    agora = time.monotonic()
+                    falta = self._baldes[tipo].espera(agora)
+                    if tipo == "leitura" and self._escritas_na_fila:
+                        falta = max(falta, 0.05)
+                    if falta <= 0:
+                        self._baldes[tipo].tokens -= 1
+                        break
+                    if agora - inicio >= timeout:
+                        break  # segue sem token; um eventual 429 cai no backoff
+                    self._cond.wait(min(falta, timeout - (agora - inicio)))
+            finally:
+                if tipo == "escrita":
+                    self._escritas_na_fila -= 1
+                    self._cond.notify_all()
+            espera = time.monotonic() - inicio
+            if espera > 0.001:
+                self.esperas += 1
+                self.segundos_espera += espera
+
+    def falhou(self, tipo: str, codigo: int):
+        with self._cond:
+            self.retentativas += 1
+            if codigo == 429:
+                self.cotas_excedidas += 1
+                self._baldes[tipo].tokens = 0.0
+
+    def estado(self) -> dict:
+        with self._cond:
+            agora = time.monotonic()
+            for balde in self._baldes.values():
+                balde.espera(agora)
+            return {
+                "leitura": int(self._baldes["leitura"].tokens), "escrita": int(self._baldes["escrita"].tokens),
+                "esperas": self.esperas, "segundos_espera": round(self.segundos_espera, 1),
+                "retentativas": self.retentativas, "cotas_excedidas": self.cotas_excedidas,
+            }
+
+@st.cache_resource
+def get_limitador() -> _LimitadorCota:
+    return _LimitadorCota()
+
+def _backoff(tentativa: int) -> float:
+    """Exponencial com jitter: ~1s, 2s, 4s, 8s... (+ até 1s aleatório)."""
+    return min(BACKOFF_MAX_S, 2.0 ** (tentativa - 1)) + random.random()
+
+class _ApiInstrumentada:
+    """
+    Proxy para Client/Spreadsheet/Worksheet do gspread: os métodos em _METODOS_API passam
+    pelo limitador de cota, são repetidos com backoff em 429/5xx e cronometrados no diagnóstico;
+    planilhas e abas devolvidas também são envolvidas.
+    """
+    def __init__(self, alvo, rotulo: str):
+        self._alvo = alvo
+        self._rotulo = rotulo
+
+    def __getattr__(self, nome):
+        atributo = getattr(self._alvo, nome)
+        if nome not in _METODOS_API or not callable(atributo):
+            return atributo
+
+        def chamada(*args, **kwargs):
+            tipo = "escrita" if nome in _METODOS_ESCRITA else "leitura"
+            limitador = get_limitador()
+            for tentativa in range(1, MAX_TENTATIVAS + 1):
+                limitador.adquirir(tipo)
+                t0 = time.perf_counter()
+                erro = None
+                resultado = None
+                # O gspread altera o payload no lugar (batch_update prefixa data[i]["range"] com a aba):
+                # cada tentativa envia uma cópia do original, senão a repetição vai com "'Aba'!'Aba'!H10"
+                args_tentativa, kwargs_tentativa = copy.deepcopy((args, kwargs))
+                try:
+                    resultado = atributo(*args_tentativa, **kwargs_tentativa)
+                    return self._envolver(nome, resultado)
+                except gspread.exceptions.APIError as e:
+                    erro = f"APIError {e.code}: {str(e)[:200]}"
+                    if e.code not in _CODIGOS_TRANSITORIOS or tentativa == MAX_TENTATIVAS:
+                        raise
+                    limitador.falhou(tipo, e.code)
+                except Exception as e:
+                    erro = f"{type(e).__name__}: {str(e)[:200]}"
+                    raise
+                finally:
+                    get_diagnostico().registrar_chamada(
+                        nome, self._rotulo, _intervalo_da_chamada(nome, args, kwargs),
+                        (time.perf_counter() - t0) * 1000,
+                        _tamanho_aprox(list(args)) + _tamanho_aprox(kwargs.get("data") or kwargs.get("values")),
+                        _tamanho_aprox(resultado), erro,
+                    )
+                time.sleep(_backoff(tentativa))
+        return chamada
+
+    @staticmethod
+    def _envolver(nome: str, resultado):
+        if nome in ("open_by_url", "open_by_key", "open"):
+            return _ApiInstrumentada(resultado, "planilha")
+        if nome in ("worksheet", "add_worksheet"):
+            return _ApiInstrumentada(resultado, resultado.title)
+        if nome == "worksheets":
+            return [_ApiInstrumentada(a, a.title) for a in resultado]
+        return resultado
+
+def _cache_data_medido(**opcoes):
+    """st.cache_data que também conta chamadas e faltas (execuções reais) no diagnóstico."""
+    def decorador(func):
+        @functools.wraps(func)
+        def executar(*args, **kwargs):
+            get_diagnostico().registrar_cache(func.__name__, falta=True)
+            return func(*args, **kwargs)
+        em_cache = st.cache_data(**opcoes)(executar)
+
+        @functools.wraps(func)
+        def chamar(*args, **kwargs):
+            get_diagnostico().registrar_cache(func.__name__, falta=False)
+            return em_cache(*args, **kwargs)
+        chamar.clear = em_cache.clear
+        return chamar
+    return decorador
+
+def _diagnostico_autorizado() -> bool:
+    """Painel só abre com ?diag=<token> igual ao segredo `diagnostico_token` (ou COP30_DIAG_TOKEN)."""
+    token = st.query_params.get("diag")
+    if not token:
+        return False
+    esperado = os.environ.get("COP30_DIAG_TOKEN")
+    if not esperado:
+        try:
+            esperado = st.secrets.get("diagnostico_token")
+        except Exception:
+            esperado = None  # sem secrets.toml
+    return bool(esperado) and hmac.compare_digest(str(token), str(esperado))
+
+# --- REGISTRO DE PLANILHA/ABAS (compartilhado pelo processo) ---
+class _RegistroPlanilha:
+    """
+    Guarda o objeto Spreadsheet e o mapa título -> Worksheet, evitando um open_by_url
+    e um worksheet() (chamadas de metadados) a cada leitura/escrita.
+    O mapa só é recarregado quando um título não é encontrado.
+    """
+    def __init__(self, client):
+        self._client = _ApiInstrumentada(client, "cliente")
+        self._lock = threading.Lock()
+        self._planilha = None
+        self._abas = {}
+
+    def planilha(self):
+        with self._lock:
+            if self._planilha is None:
+                self._planilha = self._client.open_by_url(URL_PLANILHA)
+            return self._planilha
+
+    def _recarregar_abas(self):
+        abas = self.planilha().worksheets()
+        with self._lock:
+            self._abas = {a.title: a for a in abas}
+
+    def aba(self, nome: str):
+        # Aceita tanto o título exato quanto o nome bruto da estação (ex.: "RFeye002093", "Miaer")
+        titulo = _normalize_aba_name(nome) or nome
+        with self._lock:
+            aba = self._abas.get(titulo)
+        if aba is None:
+            self._recarregar_abas()
+            with self._lock:
+                aba = self._abas.get(titulo)
+        if aba is None:
+            raise gspread.exceptions.WorksheetNotFound(titulo)
+        return aba
+
+@st.cache_resource(ttl=3600)
+def get_registro_planilha(_client) -> _RegistroPlanilha:
+    return _RegistroPlanilha(_client)
+
 # ===================== HELPERS =====================
-def _first_col_match(columns, *preds):
-    for c in columns:
-        s = (c or "").strip().lower()
-        for p in preds:
-            if p(s): return c
-    return None
+# --- ESQUEMA DAS ABAS (campo lógico -> coluna) ---
+# Abas com cabeçalho (PAINEL e abas mãe das estações): cada campo é achado pelo nome da coluna
+# (cabeçalho já em minúsculas e sem espaços nas pontas). Vale a primeira coluna que casar.
+CAMPOS_OCORRENCIA = {
+    "Situação":                 lambda s: s == "situação" or s == "situacao",
+    "Estação":                  lambda s: "estação" in s or "estacao" in s,
+    "ID":                       lambda s: s == "id",
+    "Fiscal":                   lambda s: "fiscal" in s,
+    "Data":                     lambda s: s == "data" or s == "dia",
+    "HH:mm":                    lambda s: "hh" in s or "hora" in s or "h:" in s,
+    "Frequência (MHz)":         lambda s: "frequência" in s or "frequencia" in s,
+    "Largura (kHz)":            lambda s: "largura" in s,
+    "Faixa de Frequência Envolvida": lambda s: "faixa" in s and "envolvida" in s,
+    "Identificação":            lambda s: "identificação" in s or "identificacao" in s,
+    "Autorizado?":              lambda s: "autorizado" in s,
+    "UTE?":                     lambda s: s.strip() == "ute" or "ute?" in s,
+    "Processo SEI UTE":         lambda s: "processo" in s and "sei" in s,
+    "Ocorrência (observações)": lambda s: "ocorrência" in s or "ocorrencia" in s or "observa" in s,
+    "Alguém mais ciente?":      lambda s: "ciente" in s,
+    "Interferente?":            lambda s: "interferente" in s,
+}
+
+# Abordagem: posições fixas (bloco H..W), independentes do cabeçalho
+LAYOUT_ABORDAGEM = {
+    "ID": "H", "Local": "I", "Fiscal": "J", "Data": "K", "HH:mm": "L",
+    "Frequência (MHz)": "M", "Largura (kHz)": "N", "Faixa de Frequência Envolvida": "O",
+    "Identificação": "P", "Autorizado?": "Q", "UTE?": "R", "Processo SEI UTE": "S",
+    "Ocorrência (observações)": "T", "Alguém mais ciente?": "U", "Interferente?": "V", "Situação": "W",
+}
+
+class _RegistroEsquemas:
+    """
+    Resolve os campos lógicos de cada aba para índices de coluna (1 = coluna A),
+    uma única vez por versão de cabeçalho. Guarda também o último cabeçalho visto
+    de cada aba, para que as escritas não precisem de um row_values(1) a cada salvamento.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cabecalhos = {}
+        self._resolvidos = {}
+
+    def resolver(self, header: List[str]) -> Dict[str, Optional[int]]:
+        chave = tuple((h or "") for h in header)
+        with self._lock:
+            pos = self._resolvidos.get(chave)
+        if pos is None:
+            normais = [h.strip().lower() for h in chave]
+            pos = {
+                campo: next((i for i, h in enumerate(normais, start=1) if pred(h)), None)
+                for campo, pred in CAMPOS_OCORRENCIA.items()
+            }
+            with self._lock:
+                self._resolvidos[chave] = pos
+        return pos
+
+    def atualizar_cabecalho(self, titulo_aba: str, header: List[str]):
+        with self._lock:
+            self._cabecalhos[titulo_aba] = list(header)
+
+    def campos_da_aba(self, aba) -> Dict[str, Optional[int]]:
+        with self._lock:
+            header = self._cabecalhos.get(aba.title)
+        if header is None:
+            header = aba.row_values(1)
+            self.atualizar_cabecalho(aba.title, header)
+        return self.resolver(header)
+
+@st.cache_resource
+def get_esquemas() -> _RegistroEsquemas:
+    return _RegistroEsquemas()
 
 def _extract_rfeye_code(estacao_str: str) -> str:
     if not estacao_str: return ""
@@ -333,72 +842,310 @@ def _col_to_index(letter: str) -> int:
         res = res * 26 + (ord(ch) - ord('A') + 1)
     return res
 
-def _first_empty_row_in_block(aba, start_col_letter: str, end_col_letter: str) -> int:
-    start_idx = _col_to_index(start_col_letter)
-    end_idx   = _col_to_index(end_col_letter)
-
-    max_len = 1
-    for idx in range(start_idx, end_idx + 1):
-        try:
-            vals = aba.col_values(idx)
-            if len(vals) > max_len:
-                max_len = len(vals)
-        except Exception:
-            pass
-    if max_len < 1:
-        max_len = 1
-
-    rng = f"{start_col_letter}1:{end_col_letter}{max_len}"
-    try:
-        rows = aba.get(rng)
-    except Exception:
-        rows = []
-
-    if len(rows) < max_len:
-        rows += [[""] * (end_idx - start_idx + 1) for _ in range(max_len - len(rows))]
+def _index_to_col(idx: int) -> str:
+    letter = ""
+    while idx > 0:
+        idx, r = divmod(idx - 1, 26)
+        letter = chr(ord('A') + r) + letter
+    return letter
 
-    for i, row in enumerate(rows, start=1):
-        if all((c or "").strip() == "" for c in row):
-            return i
-    return max_len + 1
+# --- PLANEJADOR DE ESCRITAS ---
+class _PlanoEscrita:
+    """
+    Acumula as células a gravar (linha, coluna, valor) e envia tudo num único batch_update.
+    Células vizinhas na mesma linha viram um só intervalo; linhas consecutivas com o mesmo
+    trecho de colunas viram um só retângulo.
+    """
+    def __init__(self, aba, value_input_option: str = "USER_ENTERED"):
+        self.aba = aba
+        self.value_input_option = value_input_option
+        self._celulas = {}
+
+    def celula(self, row: int, col: int, valor) -> "_PlanoEscrita":
+        self._celulas[(row, col)] = valor
+        return self
+
+    def linha(self, row: int, col_letter: str, valores: List) -> "_PlanoEscrita":
+        col = _col_to_index(col_letter)
+        for i, v in enumerate(valores):
+            self.celula(row, col + i, v)
+        return self
+
+    def celulas(self) -> Dict[tuple, object]:
+        """Cópia das células do plano, {(linha, coluna): valor} (para aplicar na cópia local após o envio)."""
+        return dict(self._celulas)
+
+    def intervalos(self) -> List[Dict]:
+        # 1. Trechos contíguos por linha: (row, col_ini, col_fim, [valores])
+        trechos = []
+        for (r, c) in sorted(self._celulas):
+            v = self._celulas[(r, c)]
+            if trechos and trechos[-1][0] == r and trechos[-1][2] == c - 1:
+                trechos[-1][2] = c
+                trechos[-1][3].append(v)
+            else:
+                trechos.append([r, c, c, [v]])
+
+        # 2. Empilha trechos de linhas consecutivas com as mesmas colunas
+        blocos = []
+        for r, c1, c2, vals in sorted(trechos, key=lambda t: (t[1], t[2], t[0])):
+            b = blocos[-1] if blocos else None
+            if b and b["c1"] == c1 and b["c2"] == c2 and b["r2"] == r - 1:
+                b["r2"] = r
+                b["values"].append(vals)
+            else:
+                blocos.append({"r1": r, "r2": r, "c1": c1, "c2": c2, "values": [vals]})
 
-def _first_row_where_col_empty(aba, col_letter: str, start_row: int = 2) -> int:
-    col_idx = _col_to_index(col_letter)
-    try:
-        col_vals = aba.col_values(col_idx)
-    except Exception:
-        col_vals = []
+        return [
+            {"range": f"{_index_to_col(b['c1'])}{b['r1']}:{_index_to_col(b['c2'])}{b['r2']}", "values": b["values"]}
+            for b in blocos
+        ]
 
-    if len(col_vals) < start_row:
-        return start_row
+    def enviar(self):
+        dados = self.intervalos()
+        if not dados:
+            return None
+        return self.aba.batch_update(dados, value_input_option=self.value_input_option)
 
-    for i in range(start_row-1, len(col_vals)):
-        if (col_vals[i] or "").strip() == "":
-            return i + 1
+# --- ALOCADOR DE LINHAS/IDs (inserções) ---
+class _AlocadorLinhas:
+    """
+    Entrega a próxima linha livre de um bloco de colunas (e o próximo ID sequencial)
+    sem baixar as colunas inteiras a cada inserção.
+
+    Mantém em memória a próxima linha candidata e o maior ID conhecido. Antes de entregar,
+    confere uma janela curta a partir da candidata com uma única leitura, para pular linhas
+    gravadas por outro processo ou direto na planilha.
+
+    A escolha da linha/ID é registrada numa transação curta em ARQUIVO_TRAVAS (tabela reservas,
+    ver _trava_insercoes): sessões e processos do mesmo host pulam as linhas já reservadas e
+    recebem IDs acima dos reservados, ainda que o envio da outra reserva não tenha chegado à
+    planilha. A leitura da janela e o envio ficam fora da trava. Limitação: réplicas em outros
+    hosts e quem digita direto na planilha não passam pelas reservas; se alguém ocupar a linha
+    entre a conferência e o batch_update (uma ida e volta à API), a gravação sobrescreve essa linha.
+    """
+    JANELA = 20
+
+    def __init__(self, col_ini: str, col_fim: str, col_ocupada: Optional[str] = None,
+                 col_id: Optional[str] = None, start_row: int = 2):
+        self.col_ini = col_ini
+        self.col_fim = col_fim
+        self.start_row = start_row
+        base = _col_to_index(col_ini)
+        # Posição (dentro do bloco) da coluna que marca a linha como ocupada; None = qualquer célula
+        self._pos_ocupada = _col_to_index(col_ocupada) - base if col_ocupada else None
+        self._pos_id = _col_to_index(col_id) - base if col_id else None
+        self._lock = threading.Lock()
+        self._proxima = None
+        self._max_id = 0
+
+    @property
+    def semeado(self) -> bool:
+        return self._proxima is not None
+
+    def _ocupada(self, linha: List[str]) -> bool:
+        if self._pos_ocupada is None:
+            return any((c or "").strip() for c in linha)
+        return len(linha) > self._pos_ocupada and (linha[self._pos_ocupada] or "").strip() != ""
+
+    def _registrar_id(self, linha: List[str]):
+        if self._pos_id is None or len(linha) <= self._pos_id:
+            return
+        try:
+            self._max_id = max(self._max_id, int((linha[self._pos_id] or "").strip()))
+        except ValueError:
+            pass
 
-    return len(col_vals) + 1
+    def semear(self, linhas: List[List[str]]):
+        """Inicializa a partir do bloco já lido (a partir de start_row), sem nova chamada à API."""
+        with self._lock:
+            self._max_id = 0
+            self._proxima = None
+            for i, linha in enumerate(linhas):
+                self._registrar_id(linha)
+                if self._proxima is None and not self._ocupada(linha):
+                    self._proxima = self.start_row + i
+            if self._proxima is None:
+                self._proxima = self.start_row + len(linhas)
+
+    def _bloco(self, aba) -> str:
+        return f"{aba.title}!{self.col_ini}:{self.col_fim}"
+
+    def _usar(self, row: int, id_valor):
+        with self._lock:
+            self._proxima = max(self._proxima, row + 1)
+            if id_valor is not None:
+                self._max_id = max(self._max_id, int(id_valor))
+
+    def reservar(self, aba, dono: str):
+        """Retorna (linha, próximo ID), reservados em nome de `dono`. O ID é None se o bloco não tiver coluna de ID."""
+        janela = None
+        if not self.semeado:
+            # Primeira inserção do processo: uma leitura do bloco inteiro já basta (dados frescos)
+            linhas = aba.get(f"{self.col_ini}{self.start_row}:{self.col_fim}")
+            self.semear(linhas)
+            janela = linhas[self._proxima - self.start_row:]
+        with self._lock:
+            cand = self._proxima
+        bloco = self._bloco(aba)
+        while True:
+            if janela is None:
+                janela = aba.get(f"{self.col_ini}{cand}:{self.col_fim}{cand + self.JANELA - 1}")
+                aberta = len(janela) < self.JANELA  # linhas vazias no fim da janela não voltam na resposta
+            else:
+                aberta = True  # bloco lido até o fim
+            with self._lock:
+                for linha in janela:
+                    self._registrar_id(linha)
+                maior_id = self._max_id
+            livres = [cand + i for i, linha in enumerate(janela) if not self._ocupada(linha)]
+            fim = cand + len(janela)
+            row = novo_id = None
+            with _trava_insercoes() as con:
+                reservadas = {l for (l,) in con.execute(
+                    "SELECT linha FROM reservas WHERE bloco = ? AND linha >= ?", (bloco, cand))}
+                row = next((l for l in livres if l not in reservadas), None)
+                if row is None and aberta:
+                    row = fim
+                    while row in reservadas:
+                        row += 1
+                if row is not None:
+                    if self._pos_id is not None:
+                        (reservado,) = con.execute("SELECT MAX(id) FROM reservas WHERE bloco = ?", (bloco,)).fetchone()
+                        novo_id = max(maior_id, reservado or 0) + 1
+                    con.execute("INSERT INTO reservas (bloco, linha, id, dono, expira) VALUES (?, ?, ?, ?, ?)",
+                                (bloco, row, novo_id, dono, time.time() + RESERVA_VALIDADE_S))
+            if row is not None:
+                self._usar(row, novo_id)
+                return row, novo_id
+            cand, janela = fim, None
+
+    def retomar(self, aba, row: int, id_valor, dono: str, e_nossa) -> bool:
+        """
+        Retentativa de uma reserva já feita (gravada no diário): True se a linha continua livre
+        ou já tem o próprio registro (e_nossa(linha) — o envio anterior chegou à planilha), e
+        nem a linha nem o ID foram reservados por outro dono. Nesse caso a reserva é renovada e
+        linha e ID contam como usados; False = outro registro ocupou a linha ou o ID.
+        """
+        if not self.semeado:
+            self.semear(aba.get(f"{self.col_ini}{self.start_row}:{self.col_fim}"))
+        atual = aba.get(f"{self.col_ini}{row}:{self.col_fim}{row}")
+        linha = atual[0] if atual else []
+        if self._ocupada(linha) and not e_nossa(linha):
+            with self._lock:
+                self._registrar_id(linha)
+            return False
+        bloco = self._bloco(aba)
+        with _trava_insercoes() as con:
+            if con.execute("SELECT 1 FROM reservas WHERE bloco = ? AND dono != ? AND (linha = ? OR id = ?) LIMIT 1",
+                           (bloco, dono, row, id_valor)).fetchone():
+                return False
+            con.execute("INSERT OR REPLACE INTO reservas (bloco, linha, id, dono, expira) VALUES (?, ?, ?, ?, ?)",
+                        (bloco, row, id_valor, dono, time.time() + RESERVA_VALIDADE_S))
+        self._usar(row, id_valor)
+        return True
 
-def _next_sequential_id(aba, col_letter: str = "H", start_row: int = 2) -> int:
-    col_idx = _col_to_index(col_letter)
+    def liberar(self, aba, row: int, id_valor, dono: str):
+        """Desfaz a reserva se a gravação falhou; linha e ID voltam se nada foi reservado depois deles."""
+        try:
+            with _trava_insercoes() as con:
+                con.execute("DELETE FROM reservas WHERE bloco = ? AND linha = ? AND dono = ?", (self._bloco(aba), row, dono))
+        except _TravaOcupada:
+            pass  # a reserva expira sozinha (RESERVA_VALIDADE_S)
+        with self._lock:
+            if self._proxima == row + 1:
+                self._proxima = row
+            if id_valor is not None and self._max_id == id_valor:
+                self._max_id = id_valor - 1
+
+# Reservas de linha/ID entre processos do host (SQLite). BEGIN IMMEDIATE segura o arquivo só
+# enquanto a linha é escolhida e registrada; as chamadas ao Sheets ficam fora da transação.
+ARQUIVO_TRAVAS = Path(os.environ.get("COP30_TRAVAS", Path(__file__).parent / "travas_escrita.sqlite3"))
+TRAVA_TIMEOUT_S = 60.0
+RESERVA_VALIDADE_S = 24 * 3600.0  # cobre as retentativas da fila (espera máxima de 5 min entre elas)
+
+class _TravaOcupada(Exception):
+    """A trava de reservas não foi obtida em TRAVA_TIMEOUT_S: transitório, a escrita pode ser repetida."""
+
+@contextmanager
+def _trava_insercoes(arquivo: Path = ARQUIVO_TRAVAS):
+    """Transação exclusiva sobre a tabela de reservas (já sem as vencidas); confirmada ao sair sem erro."""
+    con = sqlite3.connect(arquivo, timeout=TRAVA_TIMEOUT_S, isolation_level=None)
     try:
-        col_vals = aba.col_values(col_idx)
-    except Exception:
-        col_vals = []
-
-    max_id = 0
-    for i, v in enumerate(col_vals, start=1):
-        if i < start_row:
-            continue
-        s = (v or "").strip()
-        if not s:
-            continue
         try:
-            n = int(s)
-            if n > max_id:
-                max_id = n
-        except:
-            pass
-    return max_id + 1 if max_id >= 0 else 1
+            con.execute("BEGIN IMMEDIATE")
+        except sqlite3.OperationalError as e:
+            raise _TravaOcupada(f"Trava de inserções ocupada por mais de {TRAVA_TIMEOUT_S:.0f}s ({e}).") from e
+        con.execute("CREATE TABLE IF NOT EXISTS reservas (bloco TEXT NOT NULL, linha INTEGER NOT NULL, id INTEGER, "
+                    "dono TEXT NOT NULL, expira REAL NOT NULL, PRIMARY KEY (bloco, linha))")
+        con.execute("DELETE FROM reservas WHERE expira < ?", (time.time(),))
+        yield con
+        con.execute("COMMIT")
+    finally:
+        if con.in_transaction:
+            con.execute("ROLLBACK")
+        con.close()
+
+@st.cache_resource
+def get_alocador_linhas(titulo_aba: str, col_ini: str, col_fim: str, col_ocupada: Optional[str] = None,
+                        col_id: Optional[str] = None, start_row: int = 2) -> _AlocadorLinhas:
+    # Um alocador por (aba, bloco), compartilhado por todas as sessões do processo
+    return _AlocadorLinhas(col_ini, col_fim, col_ocupada=col_ocupada, col_id=col_id, start_row=start_row)
+
+# --- ÍNDICE ID -> LINHA (edições) ---
+class _IndiceIdLinha:
+    """
+    Mapa ID -> número da linha de uma aba, para editar sem aba.find() (busca no servidor).
+    Antes de cada escrita a linha é conferida com uma leitura de uma célula; se o ID não
+    estiver mais lá (linhas inseridas/apagadas na planilha) ou ainda não estiver no mapa
+    (registro novo, desta ou de outra sessão), o índice é reconstruído com uma leitura da
+    coluna de ID. Só então o ID é dado como inexistente.
+    """
+    def __init__(self, col_id: str):
+        self.col_id = col_id
+        self._lock = threading.Lock()
+        self._linhas = None
+        self.versao_fonte = None  # versão do bloco do armazém de onde o mapa veio (None = col_values)
+
+    def carregar(self, valores_coluna: List[str], primeira_linha: int = 1, versao: Optional[str] = None):
+        mapa = {}
+        for i, v in enumerate(valores_coluna):
+            chave = (v or "").strip()
+            if chave and chave not in mapa:
+                mapa[chave] = primeira_linha + i
+        with self._lock:
+            self._linhas = mapa
+            self.versao_fonte = versao
+
+    def registrar(self, id_valor, row: int):
+        with self._lock:
+            if self._linhas is not None:
+                self._linhas[str(id_valor).strip()] = row
+
+    def _reconstruir(self, aba):
+        self.carregar(aba.col_values(_col_to_index(self.col_id)))
+
+    def linha(self, aba, id_valor) -> Optional[int]:
+        chave = str(id_valor).strip()
+        fresco = self._linhas is None
+        if fresco:
+            self._reconstruir(aba)
+        while True:
+            with self._lock:
+                row = self._linhas.get(chave)
+            if row is not None:
+                atual = aba.get(f"{self.col_id}{row}")
+                if atual and atual[0] and (atual[0][0] or "").strip() == chave:
+                    return row
+            if fresco:
+                return None
+            self._reconstruir(aba)
+            fresco = True
+
+@st.cache_resource
+def get_indice_id(titulo_aba: str, col_id: str) -> _IndiceIdLinha:
+    # Um índice por (aba, coluna de ID), compartilhado por todas as sessões do processo
+    return _IndiceIdLinha(col_id)
 
 def _valid_neg_coord(value: str) -> bool:
     if value is None:
@@ -408,17 +1155,28 @@ def _valid_neg_coord(value: str) -> bool:
         return True
     return re.match(r"^-\d+\.\d{6}$", v) is not None
 
+# Blocos de diacríticos combinantes (o que o NFD separa dos textos em alfabeto latino)
+_BLOCOS_DIACRITICOS = [(0x0300, 0x036F), (0x1AB0, 0x1AFF), (0x1DC0, 0x1DFF), (0x20D0, 0x20FF), (0xFE20, 0xFE2F)]
+# Tabela para str.translate que apaga as marcas combinantes (categoria Mn) desses blocos; montada no import
+_SEM_ACENTO: Dict[int, None] = {cp: None for ini, fim in _BLOCOS_DIACRITICOS for cp in range(ini, fim + 1)
+                                if unicodedata.category(chr(cp)) == "Mn"}
+
 def _normalize_text(s: str) -> str:
     if s is None:
         return ""
-    s = str(s)
-    s = unicodedata.normalize("NFD", s)
-    s = "".join(ch for ch in s if unicodedata.category(ch) != "Mn")
+    s = unicodedata.normalize("NFD", str(s)).translate(_SEM_ACENTO)
     return s.strip().lower()
 
-def _contains_norm(series: pd.Series, termo: str) -> pd.Series:
+def _normalizar_serie(series: pd.Series) -> pd.Series:
+    # Mesmo resultado de _normalize_text, mas numa passada vetorizada sobre a coluna inteira
+    return (series.fillna("").astype(str)
+            .str.normalize("NFD").str.translate(_SEM_ACENTO)
+            .str.strip().str.lower())
+
+def _contains_norm(series: pd.Series, termo: str, ja_normalizada: bool = False) -> pd.Series:
     termo_norm = _normalize_text(termo)
-    return series.fillna("").astype(str).apply(lambda x: termo_norm in _normalize_text(x))
+    serie_norm = series if ja_normalizada else _normalizar_serie(series)
+    return serie_norm.str.contains(termo_norm, regex=False)
 
 def _as_bool_sim(valor: str) -> bool:
     s = (str(valor or "")).strip().lower()
@@ -437,22 +1195,606 @@ def _dedupe_columns_index(columns):
             new_cols.append(name)
     return new_cols
 
+_MARCAS_VAZIO = ("nan", "none", "na", "n/a", "null", "-", "--", "—")
+
 def _safe_str(v) -> str:
     if v is None:
         return ""
     s = str(v).strip()
     s_low = s.lower()
-    if s_low in ("nan", "none", "na", "n/a", "null", "-", "--", "—"):
+    if s_low in _MARCAS_VAZIO:
         return ""
     return s
 
-@st.cache_data(ttl=180)
-def carregar_dados_ute(_client):
+def _serie_safe_str(s: pd.Series) -> pd.Series:
+    """_safe_str na coluna inteira, numa passada vetorizada (None/NaN e marcas de vazio -> "")."""
+    txt = s.astype(object).where(s.notna(), "").astype(str).str.strip()
+    return txt.mask(txt.str.lower().isin(_MARCAS_VAZIO), "")
+
+# --- COLUNAS TIPADAS (pendências e Tabela UTE) ---
+# Frequência, largura e data continuam como o texto da planilha (exibição e busca: "450,000 -
+# 470,000" ou "10/11 manhã" não se perdem). Ao lado, os carregadores acrescentam a versão tipada
+# (float32 / datetime64), usada só para ordenar e filtrar; o que não converte vira NaN/NaT apenas
+# nela. Os campos de poucos valores distintos viram category (menos memória por cópia em cache).
+COLUNAS_FLOAT = {"Frequência (MHz)": "FrequenciaOrd", "Largura (kHz)": "LarguraOrd"}
+COLUNAS_DATA = {"Data": "DataOrd"}
+COLUNAS_CATEGORIA = ["Local", "EstacaoRaw", "Situação", "Fonte", "Faixa de Frequência Envolvida",
+                     "Identificação", "Autorizado?", "UTE?", "Interferente?", "País"]
+
+def _serie_float(s: pd.Series) -> pd.Series:
+    """Texto pt-BR ("209,320") -> float32, numa passada vetorizada (inválido/vazio -> NaN)."""
+    txt = s.astype(str).str.strip().str.replace(",", ".", regex=False)
+    return pd.to_numeric(txt, errors="coerce").astype("float32")
+
+def _serie_data(s: pd.Series) -> pd.Series:
+    """dd/mm/aaaa -> datetime64. Fora do padrão, vale o dd/mm[/aa[aa]] do início do texto
+    ("10/11/25 manhã", "10/11" -> ano corrente); sem isso, NaT."""
+    txt = s.astype(str).str.strip()
+    datas = pd.to_datetime(txt, format="%d/%m/%Y", errors="coerce")
+    faltam = datas.isna() & txt.ne("")
+    if faltam.any():
+        partes = txt[faltam].str.extract(r"^(\d{1,2})[/.-](\d{1,2})(?:[/.-](\d{2}|\d{4}))?(?!\d)")
+        ano = partes[2].fillna(str(datetime.now(ZoneInfo("America/Sao_Paulo")).year))
+        ano = ano.where(ano.str.len() == 4, "20" + ano)
+        datas[faltam] = pd.to_datetime(partes[0] + "/" + partes[1] + "/" + ano, format="%d/%m/%Y", errors="coerce")
+    return datas
+
+def _tipar_ocorrencias(df: pd.DataFrame) -> pd.DataFrame:
+    """Acrescenta (in place) as colunas tipadas e categoriza as conhecidas; o que já foi feito fica como está."""
+    for conversor, colunas in ((_serie_float, COLUNAS_FLOAT), (_serie_data, COLUNAS_DATA)):
+        for col, tipada in colunas.items():
+            if col in df.columns and tipada not in df.columns:
+                df[tipada] = conversor(df[col])
+    for col in df.columns.intersection(COLUNAS_CATEGORIA):
+        if not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype("category")
+    return df
+
+# --- SNAPSHOT DA PLANILHA ---
+# Todos os intervalos usados pelos carregadores, lidos numa única ida ao servidor (values_batch_get).
+# Cada carregador recorta o seu pedaço do snapshot em vez de abrir a planilha por conta própria.
+INTERVALOS_SNAPSHOT = {
+    "painel":    ("PAINEL", "A1:AF"),
+    "abordagem": ("Abordagem", "H1:W"),
+    "ute":       ("Tabela UTE", "A1:H"),
+    "ident":     ("RFeye002093 - ANATEL", "AC3:AC9"),
+}
+# Cabeçalhos das abas mãe (estações): alimentam o registro de esquemas usado nas edições
+ABAS_ESTACOES = TODAS_ABAS_RFEYE + ["Miaer - PARQUE DA CIDADE", "CWSM - UFPA"]
+for _aba_estacao in ABAS_ESTACOES:
+    INTERVALOS_SNAPSHOT[f"cab:{_aba_estacao}"] = (_aba_estacao, "1:1")
+
+def _a1_com_aba(titulo: str, intervalo: Optional[str] = None) -> str:
+    nome = "'{}'".format(titulo.replace("'", "''"))
+    return f"{nome}!{intervalo}" if intervalo else nome  # sem intervalo = aba inteira
+
+def _ler_intervalos(registro, pedidos: Dict[str, tuple]) -> Dict[str, Optional[List[List[str]]]]:
+    """
+    Lê vários intervalos {chave: (aba, intervalo)} com um único values_batch_get.
+    Uma aba inexistente derruba o lote inteiro: nesse caso cai para a leitura
+    intervalo a intervalo e devolve None para a aba ausente.
+    """
+    chaves = list(pedidos)
+    try:
+        resp = registro.planilha().values_batch_get([_a1_com_aba(*pedidos[k]) for k in chaves])
+        value_ranges = resp.get("valueRanges", [])
+        return {k: (vr.get("values") or []) for k, vr in zip(chaves, value_ranges)}
+    except gspread.exceptions.APIError:
+        dados = {}
+        for k in chaves:
+            titulo, intervalo = pedidos[k]
+            try:
+                aba = registro.aba(titulo)
+                dados[k] = aba.get(intervalo) if intervalo else aba.get_all_values()
+            except gspread.exceptions.WorksheetNotFound:
+                dados[k] = None
+        return dados
+
+# --- CACHE COMPARTILHADO EM DISCO (várias réplicas no mesmo host) ---
+# Com COP30_CACHE_DISCO=<arquivo .sqlite3>, os processos do host dividem as leituras da planilha:
+# cada intervalo lido é gravado com a revisão da planilha na chave, e só um processo por vez
+# busca uma chave na API (lease); os demais esperam e leem do disco. Vazio = desligado.
+ARQUIVO_CACHE_DISCO = os.environ.get("COP30_CACHE_DISCO", "").strip()
+CACHE_DISCO_TTL_S = float(os.environ.get("COP30_CACHE_DISCO_TTL", "600"))
+CACHE_DISCO_MAX_MB = float(os.environ.get("COP30_CACHE_DISCO_MB", "256"))
+
+class _CacheDisco:
+    """
+    Chave -> valor (JSON comprimido) em SQLite, com validade (TTL), despejo dos menos usados
+    quando o arquivo passa de max_mb e um lease por chave para a produção do valor.
+    """
+    LEASE_S = 60.0
+    ESPERA_S = 0.2
+
+    def __init__(self, arquivo: str, ttl_s: float = CACHE_DISCO_TTL_S, max_mb: float = CACHE_DISCO_MAX_MB):
+        self.arquivo = arquivo
+        self.ttl_s = ttl_s
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.dono = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._lock = threading.Lock()
+        self._contadores = {"acertos": 0, "faltas": 0, "esperas": 0, "despejos": 0}
+        with self._conexao() as con:
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("""
+                CREATE TABLE IF NOT EXISTS entradas (
+                    chave TEXT PRIMARY KEY,
+                    valor BLOB NOT NULL,
+                    tamanho INTEGER NOT NULL,
+                    expira REAL NOT NULL,
+                    usado REAL NOT NULL
+                )""")
+            con.execute("CREATE INDEX IF NOT EXISTS entradas_usado ON entradas (usado)")
+            con.execute("CREATE TABLE IF NOT EXISTS leases (chave TEXT PRIMARY KEY, dono TEXT NOT NULL, expira REAL NOT NULL)")
+
+    def _conexao(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.arquivo, timeout=10, isolation_level=None)
+
+    def _contar(self, nome: str, n: int = 1):
+        with self._lock:
+            self._contadores[nome] += n
+
+    def ler(self, chaves: List[str]) -> Dict[str, object]:
+        """{chave: valor} das chaves presentes e dentro da validade."""
+        if not chaves:
+            return {}
+        agora = time.time()
+        marcas = ",".join("?" * len(chaves))
+        with self._conexao() as con:
+            linhas = con.execute(f"SELECT chave, valor FROM entradas WHERE expira > ? AND chave IN ({marcas})",
+                                 [agora, *chaves]).fetchall()
+            if linhas:
+                con.execute(f"UPDATE entradas SET usado = ? WHERE chave IN ({marcas})", [agora, *(c for c, _ in linhas)])
+        return {chave: json.loads(zlib.decompress(valor)) for chave, valor in linhas}
+
+    def gravar(self, valores: Dict[str, object], ttl_s: Optional[float] = None):
+        agora = time.time()
+        expira = agora + (self.ttl_s if ttl_s is None else ttl_s)
+        registros = []
+        for chave, valor in valores.items():
+            blob = zlib.compress(json.dumps(valor, ensure_ascii=False).encode("utf-8"), 1)
+            registros.append((chave, blob, len(blob), expira, agora))
+        with self._conexao() as con:
+            con.execute("BEGIN IMMEDIATE")
+            con.executemany("INSERT OR REPLACE INTO entradas VALUES (?, ?, ?, ?, ?)", registros)
+            con.execute("DELETE FROM entradas WHERE expira <= ?", (agora,))
+            excesso = con.execute("SELECT COALESCE(SUM(tamanho), 0) FROM entradas").fetchone()[0] - self.max_bytes
+            despejadas = 0
+            if excesso > 0:
+                # Menos usadas primeiro, até caber no limite
+                for chave, tamanho in con.execute("SELECT chave, tamanho FROM entradas ORDER BY usado").fetchall():
+                    if excesso <= 0:
+                        break
+                    con.execute("DELETE FROM entradas WHERE chave = ?", (chave,))
+                    excesso -= tamanho
+                    despejadas += 1
+            con.execute("COMMIT")
+        if despejadas:
+            self._contar("despejos", despejadas)
+
+    def _tomar_lease(self, chave: str) -> bool:
+        agora = time.time()
+        with self._conexao() as con:
+            cur = con.execute(
+                "INSERT INTO leases VALUES (?, ?, ?) ON CONFLICT(chave) DO UPDATE "
+                "SET dono = excluded.dono, expira = excluded.expira WHERE leases.expira < ?",
+                (chave, self.dono, agora + self.LEASE_S, agora),
+            )
+            return cur.rowcount == 1
+
+    def _soltar_lease(self, chaves: List[str]):
+        with self._conexao() as con:
+            con.executemany("DELETE FROM leases WHERE chave = ? AND dono = ?", [(c, self.dono) for c in chaves])
+
+    def obter_ou_produzir(self, chaves: List[str], produzir, ttl_s: Optional[float] = None) -> Dict[str, object]:
+        """
+        Valores das chaves: do disco quando presentes; as que faltam são produzidas por
+        produzir(chaves_faltantes) -> {chave: valor} só no processo que obtiver o lease de cada uma.
+        Quem não obtém espera o dono gravar (até o lease expirar) e, se nada chegar, produz por conta.
+        """
+        valores = self.ler(chaves)
+        self._contar("acertos", len(valores))
+        faltam = [c for c in chaves if c not in valores]
+        if not faltam:
+            return valores
+        self._contar("faltas", len(faltam))
+        minhas = [c for c in faltam if self._tomar_lease(c)]
+        alheias = [c for c in faltam if c not in minhas]
+        if minhas:
+            try:
+                novos = produzir(minhas)
+                self.gravar({c: v for c, v in novos.items() if v is not None}, ttl_s)
+                valores.update(novos)
+            finally:
+                self._soltar_lease(minhas)
+        if alheias:
+            self._contar("esperas", len(alheias))
+            limite = time.time() + self.LEASE_S
+            while alheias and time.time() < limite:
+                time.sleep(self.ESPERA_S)
+                sem_dono = self._sem_dono(alheias)  # antes da leitura: o dono grava e só então solta
+                chegaram = self.ler(alheias)
+                valores.update(chegaram)
+                alheias = [c for c in alheias if c not in chegaram]
+                if sem_dono:
+                    break  # o dono desistiu (erro/queda) sem gravar
+            if alheias:
+                novos = produzir(alheias)
+                self.gravar({c: v for c, v in novos.items() if v is not None}, ttl_s)
+                valores.update(novos)
+        return valores
+
+    def _sem_dono(self, chaves: List[str]) -> bool:
+        marcas = ",".join("?" * len(chaves))
+        with self._conexao() as con:
+            vivos = con.execute(f"SELECT COUNT(*) FROM leases WHERE expira > ? AND chave IN ({marcas})",
+                                [time.time(), *chaves]).fetchone()[0]
+        return vivos == 0
+
+    def estado(self) -> Dict[str, int]:
+        with self._conexao() as con:
+            n, total = con.execute("SELECT COUNT(*), COALESCE(SUM(tamanho), 0) FROM entradas").fetchone()
+        with self._lock:
+            return {**self._contadores, "entradas": n, "bytes": total}
+
+@st.cache_resource
+def get_cache_disco() -> Optional[_CacheDisco]:
+    return _CacheDisco(ARQUIVO_CACHE_DISCO) if ARQUIVO_CACHE_DISCO else None
+
+# --- ARMAZÉM DA PLANILHA (atualização incremental) ---
+# Em vez de reler tudo a cada TTL, cada intervalo fica em memória no processo e só é atualizado
+# quando a revisão da planilha muda: aí relê apenas a cauda (últimas linhas conhecidas + novas).
+# No máximo uma consulta de revisão (metadado do Drive) a cada 30 s
+INTERVALO_REVISAO_S = float(os.environ.get("COP30_INTERVALO_REVISAO", "30"))
+# Releitura completa periódica: pega edições no meio das abas feitas direto na planilha (ex.: a
+# Situação de uma linha antiga), no máximo tão atrasadas quanto o antigo TTL de 180 s
+RESYNC_COMPLETO_S = float(os.environ.get("COP30_RESYNC_COMPLETO", "180"))
+JANELA_CAUDA = 20           # linhas já conhecidas relidas junto com as novas (edições recentes)
+_RE_A1_ABERTO = re.compile(r"^([A-Z]+)(\d+):([A-Z]+)$")  # ex.: "H1:W" (linhas em aberto)
+
+class _BlocoPlanilha:
+    """
+    Um intervalo acompanhado pelo armazém, com as linhas como vieram da API.
+    Intervalos com linhas em aberto ("A1:AF", aba inteira) são incrementais; os de tamanho
+    fixo ("1:1", "AC3:AC9") são pequenos e sempre relidos inteiros.
+    """
+    def __init__(self, titulo: str, intervalo: Optional[str]):
+        self.titulo = titulo
+        self.intervalo = intervalo
+        m = _RE_A1_ABERTO.match(intervalo or "")
+        if intervalo is None:
+            self.col_ini, self.linha_ini, self.col_fim = "A", 1, None
+        elif m:
+            self.col_ini, self.linha_ini, self.col_fim = m.group(1), int(m.group(2)), m.group(3)
+        else:
+            self.col_ini = self.linha_ini = self.col_fim = None
+        self.incremental = self.linha_ini is not None
+        self.carregado = False
+        self.linhas: Optional[List[List[str]]] = None  # None = aba inexistente
+        self.largura = 0
+        self.versao = 0
+        self.completo_em = 0.0
+        self.revisao_completa = None  # revisão da planilha na última leitura inteira
+
+    def aplicar_completo(self, linhas: Optional[List[List[str]]], agora: float, revisao: Optional[str] = None):
+        if not self.carregado or linhas != self.linhas:
+            self.versao += 1
+        self.linhas = linhas
+        self.largura = max((len(r) for r in linhas or []), default=0)
+        self.carregado = True
+        self.completo_em = agora
+        self.revisao_completa = revisao
+
+    def pedido_cauda(self):
+        """(linha inicial, intervalo A1) das últimas JANELA_CAUDA linhas conhecidas em diante."""
+        inicio = self.linha_ini + max(0, len(self.linhas) - JANELA_CAUDA)
+        col_fim = self.col_fim or _index_to_col(max(self.largura, 1))
+        return inicio, f"{self.col_ini}{inicio}:{col_fim}"
+
+    def aplicar_cauda(self, inicio: int, cauda: List[List[str]]) -> bool:
+        """Funde a cauda lida; False se a aba mudou de estrutura (linhas apagadas/deslocadas)."""
+        desloc = inicio - self.linha_ini
+        conhecidas = self.linhas[desloc:]
+        if len(cauda) < len(conhecidas):
+            return False
+        diferentes = sum(1 for a, b in zip(conhecidas, cauda) if a != b)
+        if conhecidas and diferentes > len(conhecidas) // 2:
+            return False
+        if diferentes or len(cauda) > len(conhecidas):
+            # Lista nova (quem já pegou a antiga continua com uma cópia consistente)
+            self.linhas = self.linhas[:desloc] + cauda
+            self.largura = max(self.largura, max((len(r) for r in cauda), default=0))
+            self.versao += 1
+        return True
+
+    def aplicar_celulas(self, celulas: Dict[tuple, object]) -> bool:
+        """Grava {(linha, coluna): valor} (coordenadas da planilha) na cópia local; True se algo mudou."""
+        if not (self.incremental and self.carregado and self.linhas is not None):
+            return False
+        c_ini = _col_to_index(self.col_ini)
+        c_fim = _col_to_index(self.col_fim) if self.col_fim else None
+        linhas, copiadas = None, set()
+        for (r, c), valor in celulas.items():
+            i, j = r - self.linha_ini, c - c_ini
+            if i < 0 or j < 0 or (c_fim and c > c_fim):
+                continue
+            valor = "" if valor is None else str(valor)
+            if linhas is None:
+                linhas = list(self.linhas)  # cópia: quem já pegou a lista antiga não a vê mudar
+            while len(linhas) <= i:
+                linhas.append([])
+            if i not in copiadas:
+                linhas[i] = list(linhas[i])
+                copiadas.add(i)
+            row = linhas[i]
+            if j >= len(row):
+                row.extend([""] * (j + 1 - len(row)))
+            row[j] = valor
+        if linhas is None:
+            return False
+        for i in copiadas:
+            row = linhas[i]
+            while row and row[-1] == "":  # a API não devolve células vazias no fim da linha
+                row.pop()
+        if linhas == self.linhas:
+            return False
+        self.linhas = linhas
+        self.largura = max(self.largura, max((len(linhas[i]) for i in copiadas), default=0))
+        self.versao += 1
+        return True
+
+class _ArmazemPlanilha:
+    """
+    Cópia em memória, compartilhada pelo processo, dos intervalos lidos pelo app.
+    - Intervalo novo: lido inteiro (junto com os demais novos, num único batch_get).
+    - A cada INTERVALO_REVISAO_S, uma consulta barata da revisão da planilha decide se há o que
+      buscar; se mudou, um único batch_get traz só as caudas dos intervalos incrementais.
+    - A cada RESYNC_COMPLETO_S, os intervalos lidos inteiros numa revisão anterior são relidos.
+    - Escritas do próprio app são aplicadas direto na cópia (aplicar_escrita), sem releitura.
+    Cada intervalo tem uma versão; os carregadores derivados usam a versão como chave de cache.
+    Com o cache em disco ligado, revisão e leituras passam por ele (divididas entre as réplicas).
+
+    O lock só protege o estado em memória; as chamadas à API correm fora dele. Uma única sessão
+    por vez atualiza (as demais seguem com a cópia atual), e a carga a frio de um intervalo é
+    feita uma vez só (quem pede o mesmo intervalo espera por ela). Escritas aplicadas durante
+    uma leitura são reaplicadas por cima do resultado, que pode ter saído antes delas.
+    """
+    def __init__(self, disco: Optional[_CacheDisco] = None):
+        self.id = uuid.uuid4().hex[:8]
+        self._disco = disco
+        self._lock = threading.Lock()
+        self._lock_atualizacao = threading.Lock()
+        self._blocos: Dict[str, _BlocoPlanilha] = {}
+        self._carregando: Dict[str, threading.Event] = {}  # chave -> carga a frio em andamento
+        self._revisao = None
+        self._revisao_checada_em = None
+        self._seq_escrita = 0
+        self._leituras = 0     # leituras à API em andamento
+        self._escritas = []    # (seq, aba, células) aplicadas enquanto havia leitura em andamento
+
+    def versao_de(self, chave: str) -> str:
+        bloco = self._blocos.get(chave)
+        return f"{self.id}:{bloco.versao if bloco else 0}"
+
+    def carregado(self, chave: str) -> bool:
+        bloco = self._blocos.get(chave)
+        return bloco is not None and bloco.carregado
+
+    def obter(self, client, pedidos: Dict[str, tuple], forcar: bool = False,
+              versoes: Optional[Dict[str, str]] = None) -> Dict[str, Optional[List[List[str]]]]:
+        """
+        {chave: linhas} para os intervalos pedidos {chave: (aba, intervalo)}, atualizando se preciso.
+        Com `versoes`, preenche também {chave: versão} das linhas devolvidas (lidas juntas, sob o lock).
+        """
+        registro = get_registro_planilha(client)
+        self._atualizar(registro, forcar)
+        while True:
+            novos, esperar = {}, []
+            with self._lock:
+                for chave, (titulo, intervalo) in pedidos.items():
+                    bloco = self._blocos.get(chave)
+                    if bloco is None or (bloco.titulo, bloco.intervalo) != (titulo, intervalo):
+                        self._blocos[chave] = bloco = _BlocoPlanilha(titulo, intervalo)
+                    if bloco.carregado:
+                        continue
+                    if chave in self._carregando:
+                        esperar.append(self._carregando[chave])
+                    else:
+                        self._carregando[chave] = threading.Event()
+                        novos[chave] = bloco
+                if not novos and not esperar:
+                    if versoes is not None:
+                        versoes.update({chave: self.versao_de(chave) for chave in pedidos})
+                    return {chave: self._blocos[chave].linhas for chave in pedidos}
+            if novos:
+                self._carregar(registro, novos)
+            for evento in esperar:
+                evento.wait(timeout=120)
+
+    def _carregar(self, registro, novos: Dict[str, _BlocoPlanilha]):
+        """Carga a frio dos blocos novos (um único batch_get)."""
+        with self._lock:
+            desde = self._inicio_leitura()
+        try:
+            agora = time.monotonic()
+            if self._revisao_checada_em is None and self._disco is not None:
+                # Com disco, a revisão entra na chave das leituras: precisa dela já na carga a frio
+                self._revisao = self._revisao_atual(registro)
+            dados = self._ler(registro, {k: (b.titulo, b.intervalo) for k, b in novos.items()})
+            with self._lock:
+                for chave, linhas in dados.items():
+                    if self._blocos.get(chave) is novos[chave]:
+                        novos[chave].aplicar_completo(linhas, agora, self._revisao)
+                if self._revisao_checada_em is None:
+                    # Carga a frio: a revisão só é consultada no próximo intervalo
+                    self._revisao_checada_em = agora
+        finally:
+            with self._lock:
+                self._fim_leitura(desde)
+                for chave in novos:
+                    self._carregando.pop(chave).set()
+
+    def linhas_da_aba(self, titulo: str) -> Optional[List[List[str]]]:
+        """Linhas (a partir de A1) de um intervalo já carregado da aba, ou None."""
+        with self._lock:
+            for bloco in self._blocos.values():
+                if (bloco.titulo == titulo and bloco.carregado and bloco.linhas is not None
+                        and (bloco.col_ini, bloco.linha_ini) == ("A", 1)):
+                    return bloco.linhas
+        return None
+
+    def aplicar_escrita(self, titulo: str, celulas: Dict[tuple, object]):
+        """Write-through: reflete células gravadas pelo app em todos os intervalos da aba."""
+        with self._lock:
+            self._seq_escrita += 1
+            if self._leituras:
+                self._escritas.append((self._seq_escrita, titulo, celulas))
+            self._aplicar_celulas(titulo, celulas)
+
+    def _aplicar_celulas(self, titulo: str, celulas: Dict[tuple, object]):
+        for bloco in self._blocos.values():
+            if bloco.titulo == titulo:
+                bloco.aplicar_celulas(celulas)
+
+    def _inicio_leitura(self) -> int:
+        self._leituras += 1
+        return self._seq_escrita
+
+    def _fim_leitura(self, desde: int):
+        """Reaplica as escritas feitas depois que a leitura começou (o resultado pode ser anterior a elas)."""
+        for seq, titulo, celulas in self._escritas:
+            if seq > desde:
+                self._aplicar_celulas(titulo, celulas)
+        self._leituras -= 1
+        if not self._leituras:
+            self._escritas.clear()
+
+    def _consultar_revisao(self, registro) -> Optional[str]:
+        try:
+            return registro.planilha().get_lastUpdateTime()
+        except Exception:
+            return None  # sem acesso ao metadado: trata como "pode ter mudado"
+
+    def _revisao_atual(self, registro) -> Optional[str]:
+        if self._disco is None:
+            return self._consultar_revisao(registro)
+        chave = f"{URL_PLANILHA}|revisao"
+        return self._disco.obter_ou_produzir(
+            [chave], lambda _: {chave: self._consultar_revisao(registro)}, ttl_s=INTERVALO_REVISAO_S,
+        ).get(chave)
+
+    def _ler(self, registro, pedidos: Dict[str, tuple]) -> Dict[str, Optional[List[List[str]]]]:
+        """_ler_intervalos, passando pelo cache em disco quando ele está ligado e a revisão é conhecida."""
+        revisao = self._revisao
+        if self._disco is None or revisao is None:
+            return _ler_intervalos(registro, pedidos)
+        # O conteúdo de um intervalo numa dada revisão não muda: a revisão vai na chave
+        chave_disco = {k: f"{URL_PLANILHA}|{revisao}|{_a1_com_aba(*pedidos[k])}" for k in pedidos}
+        por_disco = {v: k for k, v in chave_disco.items()}
+        valores = self._disco.obter_ou_produzir(
+            list(por_disco),
+            lambda faltam: {chave_disco[k]: v for k, v in
+                            _ler_intervalos(registro, {por_disco[c]: pedidos[por_disco[c]] for c in faltam}).items()},
+        )
+        return {k: valores.get(c) for k, c in chave_disco.items()}
+
+    def _atualizar(self, registro, forcar: bool):
+        # Outra sessão já está atualizando: segue com a cópia atual em vez de esperar pela API
+        if not self._lock_atualizacao.acquire(blocking=forcar):
+            return
+        try:
+            with self._lock:
+                carregados = {k: b for k, b in self._blocos.items() if b.carregado}
+                if not carregados:
+                    return
+                agora = time.monotonic()
+                checar = (forcar or self._revisao_checada_em is None
+                          or agora - self._revisao_checada_em >= INTERVALO_REVISAO_S)
+                if checar:
+                    self._revisao_checada_em = agora
+            mudou = False
+            if checar:
+                revisao = self._revisao_atual(registro)
+                mudou = revisao is None or revisao != self._revisao
+                self._revisao = revisao
+
+            with self._lock:
+                # Só relê inteiro o que foi lido numa revisão anterior: planilha parada não custa nada
+                vencidos = {k for k, b in carregados.items() if agora - b.completo_em >= RESYNC_COMPLETO_S
+                            and (self._revisao is None or b.revisao_completa != self._revisao)}
+                if not mudou and not vencidos:
+                    return
+                pedidos, caudas = {}, {}
+                for chave, bloco in carregados.items():
+                    if chave in vencidos or (mudou and not (bloco.incremental and bloco.linhas is not None)):
+                        pedidos[chave] = (bloco.titulo, bloco.intervalo)
+                    elif mudou:
+                        caudas[chave], intervalo = bloco.pedido_cauda()
+                        pedidos[chave] = (bloco.titulo, intervalo)
+                desde = self._inicio_leitura()
+            try:
+                dados = self._ler(registro, pedidos)
+                refazer = {}
+                with self._lock:
+                    for chave, linhas in dados.items():
+                        bloco = carregados[chave]
+                        if self._blocos.get(chave) is not bloco:
+                            continue
+                        if chave not in caudas:
+                            bloco.aplicar_completo(linhas, agora, self._revisao)
+                        elif linhas is None or not bloco.aplicar_cauda(caudas[chave], linhas):
+                            refazer[chave] = (bloco.titulo, bloco.intervalo)
+                if refazer:
+                    dados = self._ler(registro, refazer)
+                    with self._lock:
+                        for chave, linhas in dados.items():
+                            if self._blocos.get(chave) is carregados[chave]:
+                                carregados[chave].aplicar_completo(linhas, agora, self._revisao)
+            finally:
+                with self._lock:
+                    self._fim_leitura(desde)
+        finally:
+            self._lock_atualizacao.release()
+
+@st.cache_resource
+def get_armazem() -> _ArmazemPlanilha:
+    return _ArmazemPlanilha(get_cache_disco())
+
+def carregar_snapshot(_client) -> Dict[str, Optional[List[List[str]]]]:
+    """
+    Intervalos de INTERVALOS_SNAPSHOT, vindos do armazém (a primeira chamada lê tudo num único
+    batch_get; as seguintes só leem o que mudou).
+    Retorna:
+        dict: {"painel": [[...], ...], "abordagem": [...], ...} (None se a aba não existir)
+    """
+    armazem = get_armazem()
+    snap = armazem.obter(_client, INTERVALOS_SNAPSHOT)
+
+    esquemas = get_esquemas()
+    for k, (titulo, _) in INTERVALOS_SNAPSHOT.items():
+        if k.startswith("cab:") and snap.get(k):
+            esquemas.atualizar_cabecalho(titulo, snap[k][0])
+
+    # Aproveita a coluna H (ID) do bloco da Abordagem para o índice ID -> linha das edições
+    indice = get_indice_id("Abordagem", "H")
+    versao = armazem.versao_de("abordagem")
+    if snap.get("abordagem") is not None and indice.versao_fonte != versao:
+        indice.carregar([(r[0] if r else "") for r in snap["abordagem"]], versao=versao)
+    return snap
+
+def _versao_snapshot(client, chave: str) -> str:
+    carregar_snapshot(client)
+    return get_armazem().versao_de(chave)
+
+def carregar_dados_ute(client):
+    return _carregar_dados_ute(client, _versao_snapshot(client, "ute"))
+
+@_cache_data_medido(max_entries=2)
+def _carregar_dados_ute(_client, versao: str):
     try:
-        planilha = _client.open_by_url(URL_PLANILHA)
-        aba = planilha.worksheet("Tabela UTE")
+        matriz = carregar_snapshot(_client)["ute"]
+        if matriz is None:
+            raise gspread.exceptions.WorksheetNotFound("Tabela UTE")
         
-        matriz = aba.get_all_values()
         if not matriz or len(matriz) < 2:
             return pd.DataFrame()
         dados = []
@@ -467,7 +1809,7 @@ def carregar_dados_ute(_client):
 
         df = pd.DataFrame(dados)
         df = df[df["Processo SEI"].str.strip() != ""]
-        return df
+        return _tipar_ocorrencias(df.reset_index(drop=True))
     except gspread.exceptions.WorksheetNotFound:
         st.error("Aba 'Tabela UTE' não encontrada na planilha.")
         return pd.DataFrame()
@@ -476,68 +1818,53 @@ def carregar_dados_ute(_client):
         st.exception(e)
         return pd.DataFrame()
 
-@st.cache_data(ttl=180)
-def carregar_pendencias_painel_mapeadas(_client):
-    try:
-        planilha = _client.open_by_url(URL_PLANILHA)
-        aba = planilha.worksheet("PAINEL")
+def carregar_pendencias_painel_mapeadas(client):
+    return _carregar_pendencias_painel_mapeadas(client, _versao_snapshot(client, "painel"))
 
-        matriz = aba.get("A1:AF")
+@_cache_data_medido(max_entries=2)
+def _carregar_pendencias_painel_mapeadas(_client, versao: str):
+    try:
+        matriz = carregar_snapshot(_client)["painel"]
         if not matriz or len(matriz) < 2:
             return pd.DataFrame()
 
         header, rows = matriz[0], matriz[1:]
         df = pd.DataFrame(rows, columns=header)
 
-        def col_like(*checks):
-            return _first_col_match(df.columns, *[(lambda s, c=c: c(s)) for c in checks])
-
-        col_situ = col_like(lambda s: s == "situação", lambda s: s == "situacao")
-        col_est  = col_like(lambda s: "estação" in s, lambda s: "estacao" in s)
-        col_id   = col_like(lambda s: s == "id")
-        col_fiscal   = col_like(lambda s: "fiscal" in s)
-        col_data     = col_like(lambda s: s == "data" or s == "dia")
-        col_hora     = col_like(lambda s: "hh" in s or "hora" in s or "h:" in s)
-        col_freq     = col_like(lambda s: "frequência" in s or "frequencia" in s)
-        col_bw       = col_like(lambda s: "largura" in s)
-        col_faixa    = col_like(lambda s: "faixa" in s and "envolvida" in s)
-        col_ident    = col_like(lambda s: "identificação" in s or "identificacao" in s)
-        col_autz     = col_like(lambda s: "autorizado" in s)
-        col_ute      = col_like(lambda s: s.strip() == "ute" or "ute?" in s)
-        col_processo = col_like(lambda s: "processo" in s and "sei" in s)
-        col_obs      = col_like(lambda s: "ocorrência" in s or "ocorrencia" in s or "observa" in s)
-        col_ciente   = col_like(lambda s: "ciente" in s)
-        col_interf   = col_like(lambda s: "interferente" in s)
-
-        if not (col_situ and col_est and col_id):
+        pos = get_esquemas().resolver(header)
+        if not (pos["Situação"] and pos["Estação"] and pos["ID"]):
             return pd.DataFrame()
 
-        situ = df[col_situ].astype(str).str.strip().str.lower()
+        situ = df.iloc[:, pos["Situação"] - 1].astype(str).str.strip().str.lower()
         pend = df[situ.eq("pendente")].copy()
         if pend.empty:
             return pd.DataFrame()
 
+        def campo(nome):
+            return pend.iloc[:, pos[nome] - 1] if pos.get(nome) else ""
+
         out = pd.DataFrame()
-        out["Local"] = pend[col_est].map(_map_local_by_estacao)
-        out["EstacaoRaw"] = pend[col_est]
-        out["ID"]                    = pend[col_id]
-        out["Fiscal"]                = pend[col_fiscal] if col_fiscal else ""
-        out["Data"]                  = pend[col_data] if col_data else ""
-        out["HH:mm"]                 = pend[col_hora] if col_hora else ""
-        out["Frequência (MHz)"]  = pend[col_freq] if col_freq else ""
-        out["Largura (kHz)"]     = pend[col_bw] if col_bw else ""
-        out["Faixa de Frequência Envolvida"] = pend[col_faixa] if col_faixa else ""
-        out["Identificação"]                 = pend[col_ident] if col_ident else ""
-        out["Autorizado?"]                   = pend[col_autz]  if col_autz else ""
-        out["UTE?"]                          = pend[col_ute]   if col_ute else ""
-        out["Processo SEI UTE"]              = pend[col_processo] if col_processo else ""
-        out["Ocorrência (observações)"]      = pend[col_obs]   if col_obs else ""
-        out["Alguém mais ciente?"]           = pend[col_ciente] if col_ciente else ""
-        out["Interferente?"]                 = pend[col_interf] if col_interf else ""
-        out["Situação"]                      = pend[col_situ]
-
-        out = out.sort_values(by=["Local", "Data"], kind="stable", na_position="last").reset_index(drop=True)
+        out["Local"] = campo("Estação").map(_map_local_by_estacao)
+        out["EstacaoRaw"] = campo("Estação")
+        out["ID"]                    = campo("ID")
+        out["Fiscal"]                = campo("Fiscal")
+        out["Data"]                  = campo("Data")
+        out["HH:mm"]                 = campo("HH:mm")
+        out["Frequência (MHz)"]  = campo("Frequência (MHz)")
+        out["Largura (kHz)"]     = campo("Largura (kHz)")
+        out["Faixa de Frequência Envolvida"] = campo("Faixa de Frequência Envolvida")
+        out["Identificação"]                 = campo("Identificação")
+        out["Autorizado?"]                   = campo("Autorizado?")
+        out["UTE?"]                          = campo("UTE?")
+        out["Processo SEI UTE"]              = campo("Processo SEI UTE")
+        out["Ocorrência (observações)"]      = campo("Ocorrência (observações)")
+        out["Alguém mais ciente?"]           = campo("Alguém mais ciente?")
+        out["Interferente?"]                 = campo("Interferente?")
+        out["Situação"]                      = campo("Situação")
+
         out["Fonte"] = "PAINEL"
+        out = _tipar_ocorrencias(out)
+        out = out.sort_values(by=["Local", "DataOrd"], kind="stable", na_position="last").reset_index(drop=True)
         return out
 
     except Exception as e:
@@ -545,59 +1872,50 @@ def carregar_pendencias_painel_mapeadas(_client):
         st.exception(e)
         return pd.DataFrame()
 
-@st.cache_data(ttl=180)
-def carregar_pendencias_abordagem_pendentes(_client):
+# Colunas lidas da Abordagem para a lista de pendências (as demais saem vazias, como sempre saíram)
+_COLUNAS_PEND_ABORDAGEM = ["Local", "ID", "Fiscal", "Data", "Frequência (MHz)", "Largura (kHz)",
+                           "Faixa de Frequência Envolvida", "Ocorrência (observações)", "Interferente?", "Situação"]
+_ORDEM_PEND_ABORDAGEM = ["Local", "EstacaoRaw", "ID", "Fiscal", "Data", "HH:mm", "Frequência (MHz)", "Largura (kHz)",
+                         "Faixa de Frequência Envolvida", "Identificação", "Autorizado?", "UTE?", "Processo SEI UTE",
+                         "Ocorrência (observações)", "Alguém mais ciente?", "Interferente?", "Situação", "Fonte"]
+
+def carregar_pendencias_abordagem_pendentes(client):
+    return _carregar_pendencias_abordagem_pendentes(client, _versao_snapshot(client, "abordagem"))
+
+@_cache_data_medido(max_entries=2)
+def _carregar_pendencias_abordagem_pendentes(_client, versao: str):
     try:
-        planilha = _client.open_by_url(URL_PLANILHA)
-        aba = planilha.worksheet("Abordagem")
-        matriz = aba.get("H1:W")
+        matriz = carregar_snapshot(_client)["abordagem"]
         if not matriz or len(matriz) < 2:
             return pd.DataFrame()
 
-        header, rows = matriz[0], matriz[1:]
-        df = pd.DataFrame(rows, columns=header)
+        rows = matriz[1:]
+        base = _col_to_index("H")
+        i_situ = _col_to_index(LAYOUT_ABORDAGEM["Situação"]) - base
 
-        def col_or_pos(name, pos_letter):
-            if name in df.columns:
-                return df[name]
-            pos_map = {"H":0,"I":1,"J":2,"K":3,"L":4,"M":5,"N":6,"O":7,"P":8,"Q":9,"R":10,"S":11,"T":12,"U":13,"V":14,"W":15}
-            idx = pos_map[pos_letter]
-            return pd.Series([r[idx] if len(r)>idx else "" for r in rows])
-
-        colH = col_or_pos("H", "H")
-        colI = col_or_pos("I", "I")
-        colJ = col_or_pos("J", "J")
-        colK = col_or_pos("K", "K")
-        colM = col_or_pos("M", "M")
-        colN = col_or_pos("N", "N")
-        colO = col_or_pos("O", "O")
-        colT = col_or_pos("T", "T")
-        colV = col_or_pos("V", "V")
-        colW = col_or_pos("W", "W")
-
-        pend = pd.DataFrame({
-            "Local": colI.fillna("").astype(str),
-            "EstacaoRaw": pd.Series(["ABORDAGEM"]*len(colI)),
-            "ID": colH.fillna("").astype(str),
-            "Fiscal": colJ.fillna("").astype(str),
-            "Data": colK.fillna("").astype(str),
-            "HH:mm": pd.Series([""]*len(colI)),
-            "Frequência (MHz)": colM.fillna("").astype(str),
-            "Largura (kHz)": colN.fillna("").astype(str),
-            "Faixa de Frequência Envolvida": colO.fillna("").astype(str),
-            "Identificação": pd.Series([""]*len(colI)),
-            "Autorizado?": pd.Series([""]*len(colI)),
-            "UTE?": pd.Series([""]*len(colI)),
-            "Processo SEI UTE": pd.Series([""]*len(colI)),
-            "Ocorrência (observações)": colT.fillna("").astype(str),
-            "Alguém mais ciente?": pd.Series([""]*len(colI)),
-            "Interferente?": colV.fillna("").astype(str),
-            "Situação": colW.fillna("").astype(str),
-            "Fonte": pd.Series(["ABORDAGEM"]*len(colI)),
-        })
-
-        pend = pend[ pend["Situação"].str.strip().str.lower().eq("pendente") ].copy()
-        pend = pend.sort_values(by=["Local","Data"], kind="stable", na_position="last").reset_index(drop=True)
+        # 1. Filtra pela coluna W antes de montar qualquer coluna: o resto só é lido das pendentes
+        situ = pd.Series([r[i_situ] if len(r) > i_situ else "" for r in rows], dtype=object)
+        posicoes = situ.str.strip().str.lower().eq("pendente").to_numpy().nonzero()[0]
+        if len(posicoes) == 0:
+            return pd.DataFrame()
+
+        # 2. Projeta só as colunas usadas (linhas curtas viram None -> "")
+        largura = i_situ + 1
+        pend_rows = [rows[i][:largura] for i in posicoes]
+        bruto = pd.DataFrame(pend_rows, columns=range(max(len(r) for r in pend_rows)))
+        colunas = {}
+        for campo in _COLUNAS_PEND_ABORDAGEM:
+            idx = _col_to_index(LAYOUT_ABORDAGEM[campo]) - base
+            colunas[campo] = bruto[idx] if idx in bruto.columns else ""
+        pend = pd.DataFrame(colunas).fillna("").astype(str)
+
+        for campo in ("HH:mm", "Identificação", "Autorizado?", "UTE?", "Processo SEI UTE", "Alguém mais ciente?"):
+            pend[campo] = ""
+        pend["EstacaoRaw"] = "ABORDAGEM"
+        pend["Fonte"] = "ABORDAGEM"
+
+        pend = _tipar_ocorrencias(pend[_ORDEM_PEND_ABORDAGEM].copy())
+        pend = pend.sort_values(by=["Local", "DataOrd"], kind="stable", na_position="last").reset_index(drop=True)
         return pend
 
     except Exception as e:
@@ -605,199 +1923,496 @@ def carregar_pendencias_abordagem_pendentes(_client):
         st.exception(e)
         return pd.DataFrame()
 
-# --- FUNÇÃO MODIFICADA: Carrega Frequência E Região ---
-@st.cache_data(ttl=180)
-def carregar_todas_frequencias(_client):
+# --- LISTA DE PENDÊNCIAS (tela de tratamento) ---
+PENDENCIAS_POR_PAGINA = 25
+TODAS = "Todas"
+
+class _ListaPendencias:
+    """
+    Pendências de PAINEL + Abordagem já tipadas e ordenadas, montadas uma vez por versão dos dados
+    e compartilhadas (somente leitura) pelas sessões. Filtros são máscaras sobre as colunas
+    tipadas, rótulos só são montados para a página exibida e a seleção é por chave
+    "Fonte|Estação|ID" (a mesma ID se repete entre abas mãe do PAINEL), num dicionário.
+    """
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+        if df.empty:
+            self.chaves = pd.Series([], dtype=str)
+        else:
+            self.chaves = df["Fonte"].astype(str) + "|" + df["EstacaoRaw"].astype(str) + "|" + df["ID"].astype(str)
+        self._posicao = {chave: n for n, chave in enumerate(self.chaves.tolist())}
+
+    def opcoes(self, coluna: str) -> List[str]:
+        if self.df.empty:
+            return []
+        return sorted(c for c in self.df[coluna].cat.categories.astype(str) if c.strip())
+
+    def filtrar(self, regiao: str = TODAS, faixa: str = TODAS, periodo: tuple = ()) -> np.ndarray:
+        """Posições (em self.df) das pendências que passam nos filtros."""
+        if self.df.empty:
+            return np.arange(0)
+        mask = np.ones(len(self.df), dtype=bool)
+        if regiao != TODAS:
+            mask &= (self.df["Local"] == regiao).to_numpy()
+        if faixa != TODAS:
+            mask &= (self.df["Faixa de Frequência Envolvida"] == faixa).to_numpy()
+        if len(periodo) == 2:
+            # Data que não dá para ler (texto livre) não some da lista: fica em qualquer período
+            datas = self.df["DataOrd"]
+            mask &= (datas.isna() | ((datas >= pd.Timestamp(periodo[0])) & (datas <= pd.Timestamp(periodo[1])))).to_numpy()
+        return np.flatnonzero(mask)
+
+    def rotulos(self, posicoes) -> Dict[str, str]:
+        """{rótulo: chave} das posições pedidas (uma página), com operações vetorizadas."""
+        pag = self.df.iloc[posicoes]
+        if pag.empty:
+            return {}
+        rotulo = (pag["Local"].astype(str) + " | " + pag["Data"].astype(str) + " | "
+                  + pag["Frequência (MHz)"].astype(str) + " MHz | "
+                  + pag["Largura (kHz)"].astype(str) + " kHz | "
+                  + pag["Ocorrência (observações)"].astype(str) + " | " + pag["ID"].astype(str))
+        opcoes = {}
+        for texto, chave in zip(rotulo.tolist(), self.chaves.iloc[posicoes].tolist()):
+            if texto in opcoes:  # mesma ocorrência em duas abas mãe: diferencia pela estação
+                texto = f"{texto} ({chave.split('|')[1]})"
+            opcoes[texto] = chave
+        return opcoes
+
+    def registro(self, chave: str) -> Optional[pd.Series]:
+        n = self._posicao.get(chave)
+        return None if n is None else self.df.iloc[n]
+
+def carregar_lista_pendencias(client) -> _ListaPendencias:
+    return _lista_pendencias(client, _versao_snapshot(client, "painel"), _versao_snapshot(client, "abordagem"))
+
+@st.cache_resource(max_entries=2)
+def _lista_pendencias(_client, versao_painel: str, versao_abordagem: str) -> _ListaPendencias:
+    df_painel = carregar_pendencias_painel_mapeadas(_client)
+    df_abord  = carregar_pendencias_abordagem_pendentes(_client)
+    fontes = [df for df in (df_painel, df_abord) if not df.empty]
+    if not fontes:
+        return _ListaPendencias(pd.DataFrame())
+    # Categorias diferentes nas duas fontes viram object no concat: re-tipa o resultado
+    return _ListaPendencias(_tipar_ocorrencias(pd.concat(fontes, ignore_index=True)))
+
+# --- CONTADOR DE PENDÊNCIAS (botão TRATAR do menu) ---
+# Com o snapshot já no processo, o total sai da lista de pendências (em cache por versão). A frio,
+# o menu lê só as colunas de Situação (e o cabeçalho do PAINEL, para confirmar a coluna), como
+# blocos do armazém: ficam em dia pela cauda e pelo write-through, como os demais.
+COL_SITUACAO_PAINEL = "P"  # posição usual; o cabeçalho confirma e, se mudou, a coluna certa é lida
+
+def _contar_pendentes(linhas: Optional[List[List[str]]]) -> int:
+    """'Pendente' na primeira célula de cada linha de dados de um bloco de uma coluna."""
+    return sum(1 for r in (linhas or [])[1:] if r and r[0].strip().lower() == "pendente")
+
+def _col_situacao_painel(cab_linhas: Optional[List[List[str]]]) -> Optional[str]:
+    """Letra da coluna Situação do PAINEL; None se faltar campo exigido pelo carregador do PAINEL."""
+    pos = get_esquemas().resolver(cab_linhas[0] if cab_linhas else [])
+    if not (pos["Situação"] and pos["Estação"] and pos["ID"]):
+        return None
+    return _index_to_col(pos["Situação"])
+
+def contar_pendencias(client) -> int:
+    armazem = get_armazem()
+    if armazem.carregado("painel") and armazem.carregado("abordagem"):
+        return len(carregar_lista_pendencias(client).df)
+
+    col_painel = COL_SITUACAO_PAINEL
+    if armazem.carregado("cnt:cab_painel"):
+        # Cabeçalho já conhecido: pede direto a coluna certa (trocar o intervalo recarregaria o bloco)
+        cab = armazem.obter(client, {"cnt:cab_painel": ("PAINEL", "1:1")})["cnt:cab_painel"]
+        col_painel = _col_situacao_painel(cab) or col_painel
+    col_abordagem = LAYOUT_ABORDAGEM["Situação"]
+    dados = armazem.obter(client, {
+        "cnt:cab_painel": ("PAINEL", "1:1"),
+        "cnt:situ_painel": ("PAINEL", f"{col_painel}1:{col_painel}"),
+        "cnt:situ_abordagem": ("Abordagem", f"{col_abordagem}1:{col_abordagem}"),
+    })
+
+    col = _col_situacao_painel(dados["cnt:cab_painel"])
+    if col is None:
+        n_painel = 0
+    else:
+        if col != col_painel:
+            dados.update(armazem.obter(client, {"cnt:situ_painel": ("PAINEL", f"{col}1:{col}")}))
+        n_painel = _contar_pendentes(dados["cnt:situ_painel"])
+    return n_painel + _contar_pendentes(dados["cnt:situ_abordagem"])
+
+# --- ÍNDICE DE FREQUÊNCIAS (checagem de duplicidade) ---
+TOLERANCIA_FREQ_MHZ = 0.005  # ±5 kHz: 100,500 e 100,501 MHz contam como a mesma emissão
+
+def _parse_float(valor) -> Optional[float]:
+    try:
+        f = float(str(valor).strip().replace(",", "."))
+    except ValueError:
+        return None
+    return f if math.isfinite(f) else None
+
+class _IndiceFrequencias:
+    """
+    Registros (frequência, largura, região, aba, ID) em arrays ordenados por frequência,
+    para consultas por faixa com bisect em O(log n + k).
+
+    Os registros são separados em grupos por ordem de grandeza da largura de banda; dentro
+    de cada grupo a maior meia-banda é conhecida, o que limita a janela pesquisada a um
+    múltiplo constante do necessário mesmo quando convivem emissões de 12,5 kHz e de 5 MHz.
+    """
+    def __init__(self, registros: List[tuple]):
+        grupos = {}
+        for reg in registros:
+            largura = reg[1] or 0.0
+            chave = int(largura).bit_length()  # 0, 1, 2-3, 4-7, ... kHz
+            grupos.setdefault(chave, []).append(reg)
+        self._grupos = []
+        for regs in grupos.values():
+            regs.sort(key=lambda r: r[0])
+            meia_max = max((r[1] or 0.0) for r in regs) / 2000.0  # kHz -> MHz
+            self._grupos.append(([r[0] for r in regs], regs, meia_max))
+        self.total = len(registros)
+
+    def consultar(self, freq_mhz: float, largura_khz: float = 0.0,
+                  tolerancia_mhz: float = TOLERANCIA_FREQ_MHZ) -> List[Dict]:
+        """
+        Registros a até ±tolerância da frequência, ou cuja faixa [f−bw/2, f+bw/2]
+        se sobrepõe à da nova emissão. Ordenados pela distância em frequência.
+        """
+        meia = (largura_khz or 0.0) / 2000.0
+        achados = []
+        for freqs, regs, meia_max in self._grupos:
+            alcance = max(tolerancia_mhz, meia + meia_max)
+            i = bisect.bisect_left(freqs, freq_mhz - alcance)
+            j = bisect.bisect_right(freqs, freq_mhz + alcance)
+            for f, larg, regiao, aba, id_reg in regs[i:j]:
+                meia_reg = (larg or 0.0) / 2000.0
+                if abs(f - freq_mhz) <= tolerancia_mhz or abs(f - freq_mhz) <= meia + meia_reg:
+                    achados.append({"Frequência (MHz)": f, "Largura (kHz)": larg, "Região": regiao,
+                                    "Aba": aba, "ID": id_reg})
+        achados.sort(key=lambda a: abs(a["Frequência (MHz)"] - freq_mhz))
+        return achados
+
+def _registros_de_frequencia(titulo: str, header: List[str], linhas: List[List[str]]) -> List[tuple]:
+    if titulo == "Abordagem":
+        # Bloco H:W do snapshot (posições fixas a partir de H); a região já vem pronta na Col I (Local)
+        base = _col_to_index(LAYOUT_ABORDAGEM["ID"])  # H: primeira coluna do bloco
+        i_freq  = _col_to_index(LAYOUT_ABORDAGEM["Frequência (MHz)"]) - base
+        i_bw    = _col_to_index(LAYOUT_ABORDAGEM["Largura (kHz)"]) - base
+        i_local = _col_to_index(LAYOUT_ABORDAGEM["Local"]) - base
+        i_id    = _col_to_index(LAYOUT_ABORDAGEM["ID"]) - base
+        regiao_de = lambda row: row[i_local] if i_local < len(row) else ""
+    else:
+        # PAINEL: a região sai da estação de cada linha
+        pos = get_esquemas().resolver(header)
+        if not pos["Frequência (MHz)"]:
+            return []
+        i_freq = pos["Frequência (MHz)"] - 1
+        i_bw   = (pos["Largura (kHz)"] or 0) - 1
+        i_id   = (pos["ID"] or 1) - 1
+        i_est  = (pos["Estação"] or 2) - 1
+        regiao_de = lambda row: _map_local_by_estacao(row[i_est]) if i_est < len(row) else ""
+
+    registros = []
+    for row in linhas:
+        if len(row) <= i_freq:
+            continue
+        freq = _parse_float(row[i_freq])
+        if freq is None:
+            continue
+        largura = _parse_float(row[i_bw]) if 0 <= i_bw < len(row) else None
+        registros.append((freq, largura or 0.0, regiao_de(row), titulo, row[i_id] if i_id < len(row) else ""))
+    return registros
+
+class _CacheIndiceFrequencias:
+    """
+    Mantém o índice de frequências em sincronia com as versões dos blocos PAINEL e Abordagem
+    do snapshot. As abas das estações ficam de fora: o PAINEL já as reúne por fórmula, e
+    lê-las de novo contaria a mesma emissão duas vezes.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._versao = None
+        self._indice = _IndiceFrequencias([])
+
+    def obter(self, client) -> _IndiceFrequencias:
+        snap = carregar_snapshot(client)
+        armazem = get_armazem()
+        versao = (armazem.versao_de("painel"), armazem.versao_de("abordagem"))
+        with self._lock:
+            if self._versao != versao:
+                painel = snap.get("painel") or []
+                registros = _registros_de_frequencia("PAINEL", painel[0] if painel else [], painel[1:])
+                registros += _registros_de_frequencia("Abordagem", [], (snap.get("abordagem") or [])[1:])
+                self._indice = _IndiceFrequencias(registros)
+                self._versao = versao
+            return self._indice
+
+@st.cache_resource
+def get_cache_indice_frequencias() -> _CacheIndiceFrequencias:
+    return _CacheIndiceFrequencias()
+
+def carregar_todas_frequencias(_client) -> _IndiceFrequencias:
     """
-    Carrega todas as frequências E SUAS REGIÕES das abas PAINEL (G+B) 
-    e Abordagem (M+I) para checagem de duplicidade.
+    Índice de todas as frequências (com largura e região) de PAINEL (que reúne as abas das
+    estações RFeye, Miaer e CWSM) e da Abordagem, para checagem de duplicidade.
     Retorna:
-        dict: {100.5: "Anatel", 102.7: "UFPA"}
+        _IndiceFrequencias: .consultar(freq_mhz, largura_khz) -> lista de registros coincidentes
     """
-    frequencias_map = {} # Mudar de set para dict
     try:
-        planilha = _client.open_by_url(URL_PLANILHA)
-        
-        # 1. Ler PAINEL (onde estão os dados das RFeye, CWSM, Miaer)
-        aba_painel = planilha.worksheet("PAINEL")
-        # Col B (Estação), Col G (Frequência)
-        dados_painel = aba_painel.get("B2:G") # Pega o bloco B:G
-        
-        for row in dados_painel:
-            # Garante que a linha tem dados até a Col G
-            if len(row) >= 6: 
-                estacao_str = row[0] # Col B
-                freq_str = row[5]    # Col G
-                if estacao_str and freq_str:
-                    try:
-                        freq_float = round(float(str(freq_str).replace(",", ".")), 3)
-                        if freq_float not in frequencias_map: # Pega o primeiro que achar
-                            regiao = _map_local_by_estacao(estacao_str)
-                            frequencias_map[freq_float] = regiao
-                    except ValueError:
-                        pass # Ignora não numérico
-                    
-        # 2. Ler Abordagem
-        aba_abordagem = planilha.worksheet("Abordagem")
-        # Col I (Local), Col M (Frequência)
-        dados_abordagem = aba_abordagem.get("I2:M") # Pega o bloco I:M
-
-        for row in dados_abordagem:
-            # Garante dados até Col M
-            if len(row) >= 5: 
-                regiao_str = row[0] # Col I (Local)
-                freq_str = row[4]   # Col M
-                if regiao_str and freq_str:
-                    try:
-                        freq_float = round(float(str(freq_str).replace(",", ".")), 3)
-                        if freq_float not in frequencias_map: # Não sobrescreve dados do PAINEL
-                            frequencias_map[freq_float] = regiao_str # Col I já é a Região
-                    except ValueError:
-                        pass # Ignora não numérico
-                            
+        return get_cache_indice_frequencias().obter(_client)
     except Exception as e:
         st.warning(f"Erro ao carregar frequências existentes: {e}")
         # Não bloqueia a execução, apenas a checagem
-        
-    return frequencias_map
-# --- FIM DA MODIFICAÇÃO ---
+        return _IndiceFrequencias([])
 
 
-def _find_header_col_index(header_list: List[str], *preds) -> Optional[int]:
-    for idx, name in enumerate(header_list, start=1):
-        s = (name or "").strip().lower()
-        for p in preds:
-            if p(s): return idx
-    return None
 
-def atualizar_campos_na_aba_mae(_client, estacao_raw, id_ocorrencia, novos_valores: Dict[str, str]) -> str:
+# --- ESCRITAS: planejamento (sem st.*) + envio em lote ---
+class _FalhaEscrita(Exception):
+    """Erro definitivo de uma escrita (aba/ID inexistente, dado inválido): não adianta reenviar."""
+
+class _LoteEscrita:
+    """
+    Junta as escritas de várias operações em um batch_update por aba (e value_input_option).
+    Cada operação pode registrar o que fazer quando o envio da sua aba der certo
+    (ex.: indexar o novo ID) ou falhar (ex.: devolver a linha reservada ao alocador).
+    As células enviadas com sucesso já entram na cópia local do armazém (write-through).
+
+    Com reservas_duraveis (fila de escritas), a linha/ID de cada inserção fica em .reservas para
+    ser gravada no diário antes do envio; a retentativa reaproveita a mesma reserva, e uma falha
+    não devolve a linha ao alocador.
+    """
+    def __init__(self, reservas_duraveis: bool = False):
+        self._planos: Dict[tuple, _PlanoEscrita] = {}
+        self._operacoes = []  # (chave, chave_plano, ao_confirmar, ao_desfazer)
+        self.reservas_duraveis = reservas_duraveis
+        self.reservas: Dict[object, dict] = {}  # chave -> {"linha": ..., "id": ..., "dono": ...}
+
+    def operacao(self, chave, aba, value_input_option: str = "USER_ENTERED",
+                 ao_confirmar=None, ao_desfazer=None) -> _PlanoEscrita:
+        chave_plano = (aba.title, value_input_option)
+        if chave_plano not in self._planos:
+            self._planos[chave_plano] = _PlanoEscrita(aba, value_input_option=value_input_option)
+        self._operacoes.append((chave, chave_plano, ao_confirmar, ao_desfazer))
+        return self._planos[chave_plano]
+
+    def enviar(self) -> Dict[object, Optional[Exception]]:
+        """Envia um batch_update por plano; devolve {chave da operação: exceção ou None}."""
+        falhas = {}
+        for chave_plano, plano in self._planos.items():
+            try:
+                plano.enviar()
+            except Exception as e:
+                falhas[chave_plano] = e
+            else:
+                get_armazem().aplicar_escrita(plano.aba.title, plano.celulas())
+        resultado = {}
+        for chave, chave_plano, ao_confirmar, ao_desfazer in self._operacoes:
+            erro = falhas.get(chave_plano)
+            acao = ao_desfazer if erro else ao_confirmar
+            if acao:
+                acao()
+            resultado[chave] = erro
+        return resultado
+
+def _executar_escrita(_client, planejar, **dados) -> str:
+    """Planeja e envia na hora uma única operação (mesmo caminho usado pelo worker, com lote de 1)."""
+    lote = _LoteEscrita()
+    mensagem = planejar(_client, lote, 0, **dados)
+    erro = lote.enviar().get(0)
+    if erro is not None:
+        raise erro
+    return mensagem
+
+def _reservar_insercao(lote: _LoteEscrita, chave, alocador: _AlocadorLinhas, aba,
+                       reserva: Optional[dict], e_nossa):
+    """
+    (linha, ID, ao_desfazer) de uma inserção. Numa retentativa reaproveita a reserva do diário,
+    para que um envio que chegou à planilha sem confirmação (timeout, conexão caída) não seja
+    gravado de novo com outro ID; só reserva outra se a linha tiver sido tomada por outro registro.
+    """
+    dono = (reserva or {}).get("dono") or uuid.uuid4().hex
+    if reserva and alocador.retomar(aba, reserva["linha"], reserva["id"], dono, e_nossa):
+        row, novo_id = reserva["linha"], reserva["id"]
+    else:
+        row, novo_id = alocador.reservar(aba, dono)
+    lote.reservas[chave] = {"linha": row, "id": novo_id, "dono": dono}
+    ao_desfazer = None if lote.reservas_duraveis else (lambda: alocador.liberar(aba, row, novo_id, dono))
+    return row, novo_id, ao_desfazer
+
+def _planejar_edicao_aba_mae(_client, lote: _LoteEscrita, chave, estacao_raw, id_ocorrencia,
+                             novos_valores: Dict[str, str]) -> str:
     try:
-        planilha = _client.open_by_url(URL_PLANILHA)
-        aba_nome = _normalize_aba_name(estacao_raw)
-        aba = planilha.worksheet(aba_nome)
+        aba = get_registro_planilha(_client).aba(estacao_raw)
     except gspread.exceptions.WorksheetNotFound:
-        return f"ERRO: Aba mãe '{_normalize_aba_name(estacao_raw) or estacao_raw}' não encontrada."
-    except Exception as e:
-        return f"ERRO ao abrir planilha: {e}"
+        raise _FalhaEscrita(f"ERRO: Aba mãe '{_normalize_aba_name(estacao_raw) or estacao_raw}' não encontrada.")
 
+    row_idx = get_indice_id(aba.title, "A").linha(aba, id_ocorrencia)
+    if not row_idx:
+        raise _FalhaEscrita(f"ERRO: ID {id_ocorrencia} não encontrado na aba '{aba.title}'.")
+
+    pos = get_esquemas().campos_da_aba(aba)
+    editaveis = ["Situação", "Identificação", "Autorizado?", "UTE?", "Processo SEI UTE",
+                 "Ocorrência (observações)", "Alguém mais ciente?", "Interferente?"]
+
+    gravados = {campo: novos_valores[campo] for campo in editaveis if campo in novos_valores}
+    plano = lote.operacao(chave, aba, ao_confirmar=lambda: _espelhar_no_painel(estacao_raw, id_ocorrencia, gravados))
+    for campo, valor in gravados.items():
+        col = pos[campo] or (16 if campo == "Situação" else None)
+        if col:
+            plano.celula(row_idx, col, valor)
+    return f"Ocorrência {id_ocorrencia} atualizada na aba '{aba.title}'."
+
+def _espelhar_no_painel(estacao_raw: str, id_ocorrencia, valores: Dict[str, str]):
+    """
+    O PAINEL reúne as abas mãe por fórmula: aplica a edição também na cópia local do PAINEL,
+    para a pendência sair da lista já no próximo rerun (a planilha recalcula do lado dela).
+    """
+    armazem = get_armazem()
+    matriz = armazem.linhas_da_aba("PAINEL")
+    if not matriz:
+        return
+    pos = get_esquemas().resolver(matriz[0])
+    if not (pos["ID"] and pos["Estação"]):
+        return
+    i_id, i_est = pos["ID"] - 1, pos["Estação"] - 1
+    alvo_id, alvo_est = str(id_ocorrencia).strip(), (estacao_raw or "").strip()
+    celulas = {}
+    for n, row in enumerate(matriz[1:], start=2):
+        if (len(row) > max(i_id, i_est) and row[i_id].strip() == alvo_id
+                and row[i_est].strip() == alvo_est):
+            for campo, valor in valores.items():
+                if pos.get(campo):
+                    celulas[(n, pos[campo])] = valor
+    if celulas:
+        armazem.aplicar_escrita("PAINEL", celulas)
+
+def _planejar_edicao_abordagem(_client, lote: _LoteEscrita, chave, id_h: str, novos_valores: Dict[str, str]) -> str:
+    aba = get_registro_planilha(_client).aba("Abordagem")
+
+    row_idx = get_indice_id("Abordagem", "H").linha(aba, id_h)
+    if not row_idx:
+        raise _FalhaEscrita(f"Registro (ID={id_h}) não encontrado na 'Abordagem'.")
+
+    # Campos editáveis na Abordagem (posições em LAYOUT_ABORDAGEM: P, Q, R, S, T, V, W)
+    editaveis = ["Identificação", "Autorizado?", "UTE?", "Processo SEI UTE",
+                 "Ocorrência (observações)", "Interferente?", "Situação"]
+
+    plano = lote.operacao(chave, aba)
+    for campo in editaveis:
+        if campo in novos_valores:
+            plano.celula(row_idx, _col_to_index(LAYOUT_ABORDAGEM[campo]), novos_valores[campo])
+    return "Alterações salvas na 'Abordagem'."
+
+def _planejar_emissao(_client, lote: _LoteEscrita, chave, dados_formulario: Dict[str, str],
+                      reserva: Optional[dict] = None) -> str:
+    aba = get_registro_planilha(_client).aba("Abordagem")
+
+    dia_val = dados_formulario.get("Dia", "")
+    # Checa se é datetime.date ou str (após confirmação) e formata
+    if isinstance(dia_val, date) and not isinstance(dia_val, datetime):
+        dia_val = dia_val.strftime("%d/%m/%Y")
+
+    hora_val = dados_formulario.get("Hora", "")
+    # Checa se é datetime.time ou str (após confirmação) e formata
+    if hasattr(hora_val, "strftime"):
+        hora_val = hora_val.strftime("%H:%M")
+
+    freq_val = float(dados_formulario.get("Frequência em MHz", 0.0) or 0.0)
+    larg_val = float(dados_formulario.get("Largura em kHz", 0.0) or 0.0)
+
+    faixa_val = (dados_formulario.get("Faixa de Frequência", "") or "").strip()
+    ute_val = "Sim" if dados_formulario.get("UTE?") else "Não"
+    proc_val = (dados_formulario.get("Processo SEI ou Ato UTE", "") or "").strip()
+    obs_val = (dados_formulario.get("Observações/Detalhes/Contatos", "") or "").strip()
+    resp_val = (dados_formulario.get("Responsável pela emissão", "") or "").strip()
+    autoriz  = (dados_formulario.get("Autorizado? (Q)", "") or "").strip()
+    situ_val = (dados_formulario.get("Situação", "Pendente") or "Pendente").strip()
+
+    t_concat = f"{obs_val} - {resp_val}" if (obs_val and resp_val) else (obs_val or resp_val)
+
+    if faixa_val == "":
+        raise _FalhaEscrita("ERRO: Faixa de Frequência não informada.")
+
+    vals_I_to_W = [
+        # I: Local, J: Fiscal, K: Data, L: Hora, M: Freq, N: Larg, O: Faixa,
+        # P: Identificação, Q: Autorizado, R: UTE, S: Processo, T: Obs,
+        # U: Ciente (vazio), V: Interferente, W: Situação
+        dados_formulario.get("Local/Região", "Abordagem"),
+        dados_formulario.get("Fiscal", ""),
+        dia_val, hora_val,
+        freq_val, larg_val, faixa_val,
+        dados_formulario.get("Identificação",""),
+        autoriz,
+        ute_val,
+        proc_val,
+        t_concat,
+        "", # Campo "Alguém mais ciente?" (Coluna U), que não está no formulário
+        dados_formulario.get("Interferente?",""),
+        situ_val,
+    ]
+
+    # Linha = primeira com M vazia; ID = maior ID da coluna H + 1
+    alocador = get_alocador_linhas("Abordagem", "H", "M", col_ocupada="M", col_id="H")
+    if not alocador.semeado:
+        # O bloco H:W do snapshot já tem H..M: semeia sem baixar as colunas de novo
+        alocador.semear((carregar_snapshot(_client)["abordagem"] or [])[1:])
+    # A linha já é nossa se a coluna H tiver o ID reservado
+    e_nossa = lambda linha: bool(reserva) and bool(linha) and (linha[0] or "").strip() == str(reserva["id"])
+    row, next_id, ao_desfazer = _reservar_insercao(lote, chave, alocador, aba, reserva, e_nossa)
+
+    # H (ID) + I:W formam um único intervalo contíguo -> uma só chamada
+    indice = get_indice_id("Abordagem", "H")
+    lote.operacao(
+        chave, aba, value_input_option="RAW",
+        ao_confirmar=lambda: indice.registrar(next_id, row),
+        ao_desfazer=ao_desfazer,
+    ).linha(row, "H", [str(next_id)] + vals_I_to_W)
+    return f"Nova emissão registrada na 'Abordagem' (ID {next_id})."
+
+def _planejar_bsr_erb(_client, lote: _LoteEscrita, chave, tipo_ocorrencia: str, regiao: str, lat: str, lon: str,
+                      reserva: Optional[dict] = None) -> str:
+    aba = get_registro_planilha(_client).aba("Abordagem")
+    # Bloco X..AC: linha livre = todas as células do bloco vazias (a partir da linha 1)
+    alocador = get_alocador_linhas("Abordagem", "X", "AC", start_row=1)
+    marca = ["1", regiao] if tipo_ocorrencia == "BSR/Jammer" else ["", "", "1", regiao]
+    valores = marca + [""] * (4 - len(marca)) + [lat or "", lon or ""]  # X..AC
+
+    # Sem coluna de ID: a linha já é nossa se tiver exatamente os valores deste registro
+    normalizar = lambda v: str(v or "").strip().replace(",", ".")
+    e_nossa = lambda linha: [normalizar(c) for c in list(linha) + [""] * (6 - len(linha))] == list(map(normalizar, valores))
+    row, _, ao_desfazer = _reservar_insercao(lote, chave, alocador, aba, reserva, e_nossa)
+
+    plano = lote.operacao(chave, aba, value_input_option="USER_ENTERED", ao_desfazer=ao_desfazer)
+    if tipo_ocorrencia == "BSR/Jammer":
+        plano.linha(row, "X", ["1", regiao])
+    else:
+        plano.linha(row, "Z", ["1", regiao])
+    plano.linha(row, "AB", [lat or "", lon or ""])
+    return f"'{tipo_ocorrencia}' incluído com sucesso."
+
+# --- ESCRITAS SÍNCRONAS (telas) ---
+def atualizar_campos_na_aba_mae(_client, estacao_raw, id_ocorrencia, novos_valores: Dict[str, str]) -> str:
     try:
-        header = aba.row_values(1)
-        cell = aba.find(str(id_ocorrencia), in_column=1)
-        if not cell:
-            return f"ERRO: ID {id_ocorrencia} não encontrado na aba '{aba.title}'."
-        row_idx = cell.row
-
-        def find_col(*checks):
-            return _find_header_col_index(header, *[(lambda s, c=c: c(s)) for c in checks])
-
-        c_situ  = find_col(lambda s: s == "situação", lambda s: s == "situacao") or 16
-        c_iden  = find_col(lambda s: "identificação" in s or "identificacao" in s)
-        c_autz  = find_col(lambda s: "autorizado" in s)
-        c_ute   = find_col(lambda s: s.strip() == "ute" or "ute?" in s)
-        c_proc  = find_col(lambda s: ("processo" in s and "sei" in s))
-        c_obs   = find_col(lambda s: "ocorrência" in s or "ocorrencia" in s or "observa" in s)
-        c_cient = find_col(lambda s: "ciente" in s)
-        c_inter = find_col(lambda s: "interferente" in s)
-
-        updates = []
-        if "Situação" in novos_valores and c_situ: updates.append((row_idx, c_situ, novos_valores["Situação"]))
-        if "Identificação" in novos_valores and c_iden: updates.append((row_idx, c_iden, novos_valores["Identificação"]))
-        if "Autorizado?" in novos_valores and c_autz: updates.append((row_idx, c_autz, novos_valores["Autorizado?"]))
-        if "UTE?" in novos_valores and c_ute: updates.append((row_idx, c_ute, novos_valores["UTE?"]))
-        if "Processo SEI UTE" in novos_valores and c_proc: updates.append((row_idx, c_proc, novos_valores["Processo SEI UTE"]))
-        if "Ocorrência (observações)" in novos_valores and c_obs: updates.append((row_idx, c_obs, novos_valores["Ocorrência (observações)"]))
-        if "Alguém mais ciente?" in novos_valores and c_cient: updates.append((row_idx, c_cient, novos_valores["Alguém mais ciente?"]))
-        if "Interferente?" in novos_valores and c_inter: updates.append((row_idx, c_inter, novos_valores["Interferente?"]))
-
-        for r, c, v in updates:
-            aba.update_cell(r, c, v)
-
-        return f"Ocorrência {id_ocorrencia} atualizada na aba '{aba.title}'."
+        return _executar_escrita(_client, _planejar_edicao_aba_mae, estacao_raw=estacao_raw,
+                                 id_ocorrencia=id_ocorrencia, novos_valores=novos_valores)
+    except _FalhaEscrita as e:
+        return str(e)
     except Exception as e:
-        return f"ERRO ao atualizar a aba '{aba.title}': {e}"
+        return f"ERRO ao atualizar a aba '{_normalize_aba_name(estacao_raw) or estacao_raw}': {e}"
 
 def atualizar_campos_abordagem_por_id(_client, id_h: str, novos_valores: Dict[str, str]) -> str:
     try:
-        planilha = _client.open_by_url(URL_PLANILHA)
-        aba = planilha.worksheet("Abordagem")
-
-        cell = aba.find(str(id_h), in_column=_col_to_index("H"))
-        if not cell:
-            return f"Registro (ID={id_h}) não encontrado na 'Abordagem'."
-        row_idx = cell.row
-
-        writes = []
-        if "Identificação" in novos_valores: writes.append(("P", novos_valores["Identificação"]))
-        if "Autorizado?" in novos_valores: writes.append(("Q", novos_valores["Autorizado?"]))
-        if "UTE?" in novos_valores: writes.append(("R", novos_valores["UTE?"]))
-        if "Processo SEI UTE" in novos_valores: writes.append(("S", novos_valores["Processo SEI UTE"]))
-        if "Ocorrência (observações)" in novos_valores: writes.append(("T", novos_valores["Ocorrência (observações)"]))
-        if "Interferente?" in novos_valores: writes.append(("V", novos_valores["Interferente?"]))
-        if "Situação" in novos_valores: writes.append(("W", novos_valores["Situação"]))
-
-        for col_letter, value in writes:
-            aba.update_cell(row_idx, _col_to_index(col_letter), value)
-
-        return "Alterações salvas na 'Abordagem'."
+        return _executar_escrita(_client, _planejar_edicao_abordagem, id_h=id_h, novos_valores=novos_valores)
+    except _FalhaEscrita as e:
+        return str(e)
     except Exception as e:
         return f"Erro ao atualizar 'Abordagem' (ID={id_h}): {e}"
 
 def inserir_emissao_I_W(_client, dados_formulario: Dict[str, str]) -> bool:
     try:
-        planilha = _client.open_by_url(URL_PLANILHA)
-        aba = planilha.worksheet("Abordagem")
-
-        row = _first_row_where_col_empty(aba, "M", start_row=2)
-        next_id = _next_sequential_id(aba, col_letter="H", start_row=2)
-
-        dia_val = dados_formulario.get("Dia", "")
-        # Checa se é datetime.date ou str (após confirmação) e formata
-        if isinstance(dia_val, date) and not isinstance(dia_val, datetime):
-            dia_val = dia_val.strftime("%d/%m/%Y")
-        
-        hora_val = dados_formulario.get("Hora", "")
-        # Checa se é datetime.time ou str (após confirmação) e formata
-        if hasattr(hora_val, "strftime"):
-            hora_val = hora_val.strftime("%H:%M")
-
-        freq_val = float(dados_formulario.get("Frequência em MHz", 0.0) or 0.0)
-        larg_val = float(dados_formulario.get("Largura em kHz", 0.0) or 0.0)
-
-        faixa_val = (dados_formulario.get("Faixa de Frequência", "") or "").strip()
-        ute_val = "Sim" if dados_formulario.get("UTE?") else "Não"
-        proc_val = (dados_formulario.get("Processo SEI ou Ato UTE", "") or "").strip()
-        obs_val = (dados_formulario.get("Observações/Detalhes/Contatos", "") or "").strip()
-        resp_val = (dados_formulario.get("Responsável pela emissão", "") or "").strip()
-        autoriz  = (dados_formulario.get("Autorizado? (Q)", "") or "").strip()
-        situ_val = (dados_formulario.get("Situação", "Pendente") or "Pendente").strip()
-
-        t_concat = f"{obs_val} - {resp_val}" if (obs_val and resp_val) else (obs_val or resp_val)
-
-        if faixa_val == "":
-            return False
-
-        vals_I_to_W = [
-            # I: Local, J: Fiscal, K: Data, L: Hora, M: Freq, N: Larg, O: Faixa,
-            # P: Identificação, Q: Autorizado, R: UTE, S: Processo, T: Obs,
-            # U: Ciente (vazio), V: Interferente, W: Situação
-            dados_formulario.get("Local/Região", "Abordagem"),
-            dados_formulario.get("Fiscal", ""),
-            dia_val, hora_val,
-            freq_val, larg_val, faixa_val,
-            dados_formulario.get("Identificação",""),
-            autoriz,
-            ute_val,
-            proc_val,
-            t_concat,
-            "", # Campo "Alguém mais ciente?" (Coluna U), que não está no formulário
-            dados_formulario.get("Interferente?",""),
-            situ_val,
-        ]
-
-        aba.update(f"H{row}", [[str(next_id)]], value_input_option="RAW")
-        aba.update(f"I{row}:W{row}", [vals_I_to_W], value_input_option="RAW")
+        _executar_escrita(_client, _planejar_emissao, dados_formulario=dados_formulario)
         return True
-
+    except _FalhaEscrita:
+        return False
     except Exception as e:
         st.error(f"Erro ao inserir na aba 'Abordagem' (H + I:W):")
         st.exception(e)
@@ -805,18 +2420,8 @@ def inserir_emissao_I_W(_client, dados_formulario: Dict[str, str]) -> bool:
 
 def inserir_bsr_erb(_client, tipo_ocorrencia: str, regiao: str, lat: str, lon: str) -> str:
     try:
-        planilha = _client.open_by_url(URL_PLANILHA)
-        aba = planilha.worksheet("Abordagem")
-        row = _first_empty_row_in_block(aba, "X", "AC")
-
-        if tipo_ocorrencia == "BSR/Jammer":
-            aba.update(f"X{row}:Y{row}", [["1", regiao]], value_input_option="USER_ENTERED")
-            aba.update(f"AB{row}:AC{row}", [[lat or "", lon or ""]], value_input_option="USER_ENTERED")
-        else:
-            aba.update(f"Z{row}:AA{row}", [["1", regiao]], value_input_option="USER_ENTERED")
-            aba.update(f"AB{row}:AC{row}", [[lat or "", lon or ""]], value_input_option="USER_ENTERED")
-
-        return f"'{tipo_ocorrencia}' incluído com sucesso."
+        return _executar_escrita(_client, _planejar_bsr_erb, tipo_ocorrencia=tipo_ocorrencia,
+                                 regiao=regiao, lat=lat, lon=lon)
     except gspread.exceptions.WorksheetNotFound:
         return "ERRO: A aba 'Abordagem' não foi encontrada na planilha."
     except Exception as e:
@@ -824,33 +2429,365 @@ def inserir_bsr_erb(_client, tipo_ocorrencia: str, regiao: str, lat: str, lon: s
         st.exception(e)
         return "ERRO: Falha ao registrar. Veja os detalhes acima."
 
-@st.cache_data(ttl=3600)
-def carregar_opcoes_identificacao(_client):
+# --- FILA DE ESCRITAS (write-behind com diário em SQLite) ---
+# Envios das telas vão para um diário local e são confirmados na hora; uma thread do processo
+# drena o diário para a planilha em lotes. COP30_ESCRITA=sincrona volta ao envio direto.
+_log_fila = logging.getLogger("cop30.fila_escritas")
+ESCRITA_ASSINCRONA = os.environ.get("COP30_ESCRITA", "assincrona").strip().lower() != "sincrona"
+ARQUIVO_DIARIO = Path(os.environ.get("COP30_DIARIO", Path(__file__).parent / "diario_escritas.sqlite3"))
+_PLANEJADORES = {
+    "edicao_mae": _planejar_edicao_aba_mae,
+    "edicao_abordagem": _planejar_edicao_abordagem,
+    "emissao": _planejar_emissao,
+    "bsr_erb": _planejar_bsr_erb,
+}
+STATUS_ENVIO = {"fila": "⏳ na fila", "enviando": "📤 enviando", "enviado": "✅ enviado", "falhou": "❌ falhou"}
+
+def _falha_transitoria(erro: Exception) -> bool:
+    if isinstance(erro, _TravaOcupada):
+        return True
+    if isinstance(erro, gspread.exceptions.APIError):
+        return erro.code in _CODIGOS_TRANSITORIOS
+    return isinstance(erro, OSError)  # rede (requests.ConnectionError, timeouts) herda de OSError
+
+class _FilaEscritas:
+    """
+    Diário de escritas em SQLite + thread que o drena para a planilha.
+    Cada entrada passa por fila -> enviando -> enviado/falhou. Edições da mesma ocorrência
+    na fila são fundidas, e tudo o que vai para a mesma aba segue num único batch_update.
+    Falhas transitórias (429/5xx/rede) voltam para a fila com espera crescente; nada é descartado.
+    """
+    INTERVALO_S = 1.0
+    LOTE_MAX = 50
+    ESPERA_MAX_S = 300.0
+
+    def __init__(self, client, arquivo: Path = ARQUIVO_DIARIO):
+        self._client = client
+        self.arquivo = arquivo
+        self._acordar = threading.Event()
+        self._parar = threading.Event()
+        self._lotes = 0
+        with self._conexao() as con:
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("""
+                CREATE TABLE IF NOT EXISTS diario (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    criado REAL NOT NULL,
+                    sessao TEXT,
+                    tipo TEXT NOT NULL,
+                    descricao TEXT,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'fila',
+                    tentativas INTEGER NOT NULL DEFAULT 0,
+                    proxima_tentativa REAL NOT NULL DEFAULT 0,
+                    resultado TEXT,
+                    atualizado REAL
+                )""")
+            con.execute("CREATE INDEX IF NOT EXISTS diario_status ON diario (status, proxima_tentativa)")
+            con.execute("CREATE INDEX IF NOT EXISTS diario_sessao ON diario (sessao, id)")
+            # Entradas que estavam sendo enviadas quando o processo caiu voltam para a fila
+            con.execute("UPDATE diario SET status = 'fila' WHERE status = 'enviando'")
+        self._thread = threading.Thread(target=self._laco, name="cop30-fila-escritas", daemon=True)
+        self._thread.start()
+
+    def _conexao(self) -> sqlite3.Connection:
+        con = sqlite3.connect(self.arquivo, timeout=10, isolation_level=None)
+        con.row_factory = sqlite3.Row
+        return con
+
+    # ---- lado das telas ----
+    def enfileirar(self, tipo: str, sessao: str, descricao: str, **payload) -> int:
+        if tipo not in _PLANEJADORES:
+            raise ValueError(f"Tipo de escrita desconhecido: {tipo}")
+        agora = time.time()
+        with self._conexao() as con:
+            cur = con.execute(
+                "INSERT INTO diario (criado, sessao, tipo, descricao, payload, atualizado) VALUES (?, ?, ?, ?, ?, ?)",
+                (agora, sessao, tipo, descricao, json.dumps(payload, ensure_ascii=False, default=str), agora),
+            )
+            entrada_id = cur.lastrowid
+        self._acordar.set()
+        return entrada_id
+
+    def da_sessao(self, sessao: str, limite: int = 5) -> List[dict]:
+        with self._conexao() as con:
+            linhas = con.execute(
+                "SELECT id, criado, descricao, status, tentativas, resultado FROM diario "
+                "WHERE sessao = ? ORDER BY id DESC LIMIT ?", (sessao, limite),
+            ).fetchall()
+        return [dict(l) for l in linhas]
+
+    def contagem(self) -> Dict[str, int]:
+        with self._conexao() as con:
+            return {l["status"]: l["n"] for l in con.execute("SELECT status, COUNT(*) AS n FROM diario GROUP BY status")}
+
+    def reenviar(self, entrada_id: int):
+        with self._conexao() as con:
+            con.execute("UPDATE diario SET status = 'fila', proxima_tentativa = 0, atualizado = ? "
+                        "WHERE id = ? AND status = 'falhou'", (time.time(), entrada_id))
+        self._acordar.set()
+
+    def parar(self):
+        self._parar.set()
+        self._acordar.set()
+
+    # ---- worker ----
+    def _laco(self):
+        while not self._parar.is_set():
+            self._acordar.wait(timeout=self.INTERVALO_S)
+            self._acordar.clear()
+            try:
+                while not self._parar.is_set() and self.drenar() >= self.LOTE_MAX:
+                    pass
+            except Exception:
+                _log_fila.exception("Erro ao drenar o diário de escritas")
+
+    def _reservar_lote(self) -> List[dict]:
+        agora = time.time()
+        with self._conexao() as con:
+            candidatas = con.execute(
+                "SELECT * FROM diario WHERE status = 'fila' AND proxima_tentativa <= ? ORDER BY id LIMIT ?",
+                (agora, self.LOTE_MAX),
+            ).fetchall()
+            lote = []
+            for linha in candidatas:
+                # UPDATE condicional: outra thread/processo pode ter pego a mesma entrada
+                cur = con.execute("UPDATE diario SET status = 'enviando', atualizado = ? WHERE id = ? AND status = 'fila'",
+                                  (agora, linha["id"]))
+                if cur.rowcount == 1:
+                    lote.append(dict(linha))
+        return lote
+
+    @staticmethod
+    def _chave_fusao(entrada: dict):
+        p = entrada["payload"]
+        if entrada["tipo"] == "edicao_mae":
+            return ("edicao_mae", _normalize_aba_name(p["estacao_raw"]) or p["estacao_raw"], str(p["id_ocorrencia"]))
+        if entrada["tipo"] == "edicao_abordagem":
+            return ("edicao_abordagem", str(p["id_h"]))
+        return ("unica", entrada["id"])
+
+    def _gravar_reservas(self, grupos: Dict[tuple, List[dict]], reservas: Dict[object, dict]):
+        """Grava no diário, antes do envio, a linha/ID reservados para cada inserção (retentativa idempotente)."""
+        with self._conexao() as con:
+            for chave, reserva in reservas.items():
+                for entrada in grupos[chave]:
+                    if entrada["payload"].get("reserva") != reserva:
+                        entrada["payload"]["reserva"] = reserva
+                        con.execute("UPDATE diario SET payload = ? WHERE id = ?",
+                                    (json.dumps(entrada["payload"], ensure_ascii=False, default=str), entrada["id"]))
+
+    def drenar(self) -> int:
+        """Envia um lote de entradas devidas; devolve quantas foram processadas."""
+        entradas = self._reservar_lote()
+        if not entradas:
+            return 0
+        self._lotes += 1
+        diag = get_diagnostico()
+        diag.iniciar_rerun("worker", self._lotes, "fila_escritas")
+        desfechos: Dict[int, tuple] = {}  # id -> (status, resultado, transitória?)
+        try:
+            # Edições da mesma ocorrência viram uma só (valores mais recentes prevalecem)
+            grupos: Dict[tuple, List[dict]] = {}
+            for entrada in entradas:
+                entrada["payload"] = json.loads(entrada["payload"])
+                grupos.setdefault(self._chave_fusao(entrada), []).append(entrada)
+
+            lote = _LoteEscrita(reservas_duraveis=True)
+            mensagens = {}
+            for chave, grupo in grupos.items():
+                payload = dict(grupo[-1]["payload"])
+                if "novos_valores" in payload:
+                    payload["novos_valores"] = {}
+                    for entrada in grupo:
+                        payload["novos_valores"].update(entrada["payload"]["novos_valores"])
+                try:
+                    mensagens[chave] = _PLANEJADORES[grupo[0]["tipo"]](self._client, lote, chave, **payload)
+                except Exception as e:
+                    desfecho = ("fila", f"{type(e).__name__}: {e}", True) if _falha_transitoria(e) else ("falhou", str(e), False)
+                    for entrada in grupo:
+                        desfechos[entrada["id"]] = desfecho
+            self._gravar_reservas(grupos, lote.reservas)
+            enviados = lote.enviar()
+
+            for chave, erro in enviados.items():
+                if erro is None:
+                    desfecho = ("enviado", mensagens[chave], False)
+                elif _falha_transitoria(erro):
+                    desfecho = ("fila", f"{type(erro).__name__}: {erro}", True)
+                else:
+                    desfecho = ("falhou", f"{type(erro).__name__}: {erro}", False)
+                for entrada in grupos[chave]:
+                    desfechos[entrada["id"]] = desfecho
+        except Exception as e:
+            # Falha fora do planejamento de cada operação (diário, payload, envio do lote): nenhuma
+            # entrada fica presa em "enviando"; as que ainda não têm desfecho voltam para a fila
+            _log_fila.exception("Lote %d da fila de escritas falhou", self._lotes)
+            falha_lote = ("fila", f"{type(e).__name__}: {e}", True)
+            for entrada in entradas:
+                desfechos.setdefault(entrada["id"], falha_lote)
+        finally:
+            diag.finalizar_rerun()
+
+        agora = time.time()
+        with self._conexao() as con:
+            for entrada in entradas:
+                status, resultado, transitoria = desfechos.get(entrada["id"], ("fila", None, True))
+                tentativas = entrada["tentativas"] + 1
+                proxima = agora + min(self.ESPERA_MAX_S, 5.0 * 2 ** (tentativas - 1)) if transitoria else 0
+                con.execute(
+                    "UPDATE diario SET status = ?, resultado = ?, tentativas = ?, proxima_tentativa = ?, atualizado = ? WHERE id = ?",
+                    (status, resultado, tentativas, proxima, agora, entrada["id"]),
+                )
+        return len(entradas)
+
+@st.cache_resource(on_release=lambda fila: fila.parar())
+def get_fila_escritas(_client) -> _FilaEscritas:
+    return _FilaEscritas(_client)
+
+def carregar_opcoes_identificacao(client):
+    return _carregar_opcoes_identificacao(client, _versao_snapshot(client, "ident"))
+
+@_cache_data_medido(max_entries=2)
+def _carregar_opcoes_identificacao(_client, versao: str):
     try:
-        planilha = _client.open_by_url(URL_PLANILHA)
-        aba_estacao = planilha.worksheet("RFeye002093 - ANATEL")
-        lista_de_listas = aba_estacao.get('AC3:AC9')
+        lista_de_listas = carregar_snapshot(_client)["ident"]
+        if lista_de_listas is None:
+            raise gspread.exceptions.WorksheetNotFound("RFeye002093 - ANATEL")
         opcoes = [item[0] for item in lista_de_listas if item]
         return opcoes
     except Exception as e:
         st.warning(f"Não é possível carregar 'Identificação da Emissão' (RFeye002093 - ANATEL): {e}")
         return ["Opção não carregada"]
 
-def _load_sheet_as_df(client, nome_aba: str) -> pd.DataFrame:
-    planilha = client.open_by_url(URL_PLANILHA)
-    aba = planilha.worksheet(nome_aba)
-    values = aba.get_all_values()
-    if not values:
-        return pd.DataFrame()
-    header, rows = values[0], values[1:]
-    df = pd.DataFrame(rows, columns=header)
-    df.columns = _dedupe_columns_index(df.columns)
-    
-    df.dropna(how='all', inplace=True)
-    if not df.empty:
-        df = df[~df.apply(lambda row: row.astype(str).str.strip().eq('').all(), axis=1)]
-    
-    return df
+# --- ÍNDICE DE BUSCA (texto livre) ---
+ABAS_BUSCA = ["PAINEL", "Abordagem"] + ABAS_ESTACOES
+_RE_TOKEN = re.compile(r"[0-9a-z]+")
+
+class _IndiceBusca:
+    """
+    Índice invertido das abas de ABAS_BUSCA: token normalizado (sem acento, minúsculo) -> linhas
+    (aba, posição) onde aparece. As abas vêm inteiras do armazém da planilha; o índice só é
+    refeito para as abas cuja versão mudou, e apenas nas linhas que mudaram (hash por linha).
+
+    A consulta quebra o termo em tokens, procura cada um como trecho dos tokens do vocabulário,
+    cruza as linhas candidatas e confirma o termo inteiro no texto da linha, sem chamar a API.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._versoes = {}      # aba -> versão do bloco do armazém já indexada
+        self._cabecalhos = {}   # aba -> cabeçalho (já com colunas deduplicadas)
+        self._linhas = {}       # aba -> linhas de dados (largura do cabeçalho)
+        self._hashes = {}       # aba -> hash de cada linha já indexada
+        self._textos = {}       # (aba, i) -> "v1 | v2 | ..." já normalizado (sem acento, minúsculo)
+        self._tokens_doc = {}   # (aba, i) -> tokens da linha
+        self._postings = {}     # token -> {(aba, i), ...}
+        self._vocab = None      # lista de tokens (None = precisa refazer)
+
+    def _remover(self, doc):
+        for tok in self._tokens_doc.pop(doc, ()):
+            docs = self._postings.get(tok)
+            if docs is not None:
+                docs.discard(doc)
+                if not docs:
+                    del self._postings[tok]
+                    self._vocab = None
+        self._textos.pop(doc, None)
+
+    def _indexar(self, doc, texto_norm: str, tokens: List[str]):
+        tokens = set(tokens)
+        self._textos[doc] = texto_norm
+        self._tokens_doc[doc] = tokens
+        for tok in tokens:
+            docs = self._postings.get(tok)
+            if docs is None:
+                self._postings[tok] = docs = set()
+                self._vocab = None
+            docs.add(doc)
+
+    def _atualizar_aba(self, titulo: str, matriz: Optional[List[List[str]]]):
+        matriz = matriz or []
+        largura = max((len(r) for r in matriz), default=0)
+        # Mesmo formato do get_all_values: tudo completado até a largura da linha mais longa
+        linhas = [list(r) + [""] * (largura - len(r)) for r in matriz]
+        header, dados = (linhas[0], linhas[1:]) if linhas else ([], [])
+
+        antigos = self._hashes.get(titulo, [])
+        novos = []
+        mudadas = []
+        for i, row in enumerate(dados):
+            h = hash(tuple(row))
+            novos.append(h)
+            if i < len(antigos) and antigos[i] == h:
+                continue
+            self._remover((titulo, i))
+            if any((c or "").strip() for c in row):
+                mudadas.append(i)
+        for i in range(len(dados), len(antigos)):
+            self._remover((titulo, i))
+
+        if mudadas:
+            # Normaliza todas as linhas novas/alteradas da aba numa única passada vetorizada
+            textos = _normalizar_serie(pd.Series([" | ".join(dados[i]) for i in mudadas]))
+            for i, texto_norm, tokens in zip(mudadas, textos.tolist(), textos.str.findall(_RE_TOKEN).tolist()):
+                self._indexar((titulo, i), texto_norm, tokens)
+
+        self._cabecalhos[titulo] = _dedupe_columns_index(header)
+        self._linhas[titulo] = dados
+        self._hashes[titulo] = novos
+
+    def atualizar(self, client, forcar: bool = False):
+        # As abas vêm do armazém (que pode chamar a API) fora do lock; ele só cobre a reindexação
+        versoes = {}
+        dados = get_armazem().obter(client, {f"aba:{t}": (t, None) for t in ABAS_BUSCA}, forcar=forcar, versoes=versoes)
+        with self._lock:
+            for titulo in ABAS_BUSCA:
+                versao = versoes[f"aba:{titulo}"]
+                if self._versoes.get(titulo) != versao:
+                    self._atualizar_aba(titulo, dados[f"aba:{titulo}"])
+                    self._versoes[titulo] = versao
+
+    def _docs_do_token(self, parte: str) -> set:
+        if self._vocab is None:
+            self._vocab = list(self._postings)
+        docs = set()
+        for tok in self._vocab:
+            if parte in tok:
+                docs |= self._postings[tok]
+        return docs
+
+    def buscar(self, termo: str, abas: List[str]) -> Dict[str, List[int]]:
+        """Retorna {aba: [posições das linhas que contêm o termo]}."""
+        partes = _RE_TOKEN.findall(_normalize_text(termo))
+        if not partes:
+            return {}
+        with self._lock:
+            candidatos = None
+            for parte in sorted(set(partes), key=len, reverse=True):
+                docs = self._docs_do_token(parte)
+                candidatos = docs if candidatos is None else (candidatos & docs)
+                if not candidatos:
+                    return {}
+            abas_sel = set(abas)
+            candidatos = sorted(d for d in candidatos if d[0] in abas_sel)
+            if not candidatos:
+                return {}
+            mask = _contains_norm(pd.Series([self._textos[d] for d in candidatos]), termo, ja_normalizada=True)
+        achados = {}
+        for doc, ok in zip(candidatos, mask.tolist()):
+            if ok:
+                achados.setdefault(doc[0], []).append(doc[1])
+        return achados
+
+    def linhas(self, titulo: str, posicoes: List[int]) -> pd.DataFrame:
+        with self._lock:
+            header = self._cabecalhos.get(titulo, [])
+            dados = self._linhas.get(titulo, [])
+            return pd.DataFrame([dados[i] for i in posicoes], columns=header)
+
+@st.cache_resource
+def get_indice_busca() -> _IndiceBusca:
+    return _IndiceBusca()
 
 def _buscar_por_texto_livre(client, termos: str, abas: List[str]) -> pd.DataFrame:
     resultados = []
@@ -858,31 +2795,20 @@ def _buscar_por_texto_livre(client, termos: str, abas: List[str]) -> pd.DataFram
     if not termos:
         return pd.DataFrame()
 
-    for nome in abas:
-        try:
-            df = _load_sheet_as_df(client, nome)
-            if df.empty:
-                continue
-
-            relevantes = [col for col in df.columns if col and isinstance(col, str)]
-            if not relevantes:
-                continue
-
-            df_busca = df[relevantes].fillna('').astype(str)
-            combinado = df_busca.agg(" | ".join, axis=1)
-            mask = _contains_norm(combinado, termos)
-
-            achados = df[mask].copy()
-            if achados.empty:
-                continue
-
-            achados.insert(0, "Aba/Origem", nome)
-            resultados.append(achados)
+    indice = get_indice_busca()
+    try:
+        indice.atualizar(client)
+    except Exception as e:
+        # Sem conexão/cota: responde com o que já estiver indexado
+        st.warning(f"Não foi possível atualizar os dados da consulta: {e}")
+    posicoes = indice.buscar(termos, abas)
 
-        except gspread.exceptions.WorksheetNotFound:
-            continue
-        except Exception:
+    for nome in abas:
+        if not posicoes.get(nome):
             continue
+        achados = indice.linhas(nome, posicoes[nome])
+        achados.insert(0, "Aba/Origem", nome)
+        resultados.append(achados)
 
     if not resultados:
         return pd.DataFrame()
@@ -917,6 +2843,79 @@ def _buscar_por_texto_livre(client, termos: str, abas: List[str]) -> pd.DataFram
 
     return res_final
 
+RESULTADOS_POR_PAGINA = 20
+
+def _coalescer(df: pd.DataFrame, nomes: List[str]) -> pd.Series:
+    """Primeiro valor não vazio entre as colunas `nomes` (as que existirem), linha a linha, vetorizado."""
+    cols = [c for c in nomes if c in df.columns]
+    if not cols:
+        return pd.Series("", index=df.index, dtype=object)
+    vals = df[cols].astype(str).apply(lambda s: s.str.strip())
+    vals = vals.where(~vals.apply(lambda s: s.str.lower()).isin(["", "nan", "none"]))
+    return vals.bfill(axis=1).iloc[:, 0].fillna("")
+
+def _resumo_busca(df_res: pd.DataFrame) -> pd.DataFrame:
+    """
+    Tabela compacta dos resultados (uma linha por achado, mesma ordem de df_res).
+    Na Abordagem os campos das emissões estão nas colunas repetidas (".1"), à direita das do resumo.
+    """
+    if df_res.empty:
+        return pd.DataFrame()
+    abord = (df_res["Aba/Origem"] == "Abordagem").to_numpy()
+
+    def campo(nomes_abordagem, nomes_outras):
+        return pd.Series(np.where(abord, _coalescer(df_res, nomes_abordagem), _coalescer(df_res, nomes_outras)),
+                         index=df_res.index)
+
+    return pd.DataFrame({
+        "Origem": df_res["Aba/Origem"].astype(str),
+        "Local": campo(["Local/Região", "Local"], ["Local", "Local/Região", "Estação"]),
+        "Data": campo(["Data.1", "Data"], ["Data", "Dia"]),
+        "Frequência (MHz)": campo(["Frequência (MHz).1", "Frequência (MHz)"], ["Frequência (MHz)", "Frequência"]),
+        "ID": campo(["ID", "ID.1"], ["ID", "ID.1"]),
+        "Identificação": campo(["Identificação.1", "Identificação"], ["Identificação"]),
+        "Situação": campo(["Situação.1", "Situação"], ["Situação"]),
+    })
+
+def _id_sessao() -> str:
+    if 'sessao_id' not in st.session_state:
+        st.session_state.sessao_id = uuid.uuid4().hex[:8]
+    return st.session_state.sessao_id
+
+def render_envios_sessao(client):
+    """Situação dos envios desta sessão no modo write-behind; atualiza sozinho enquanto houver fila."""
+    if not ESCRITA_ASSINCRONA:
+        return
+    fila = get_fila_escritas(client)
+    entradas = fila.da_sessao(_id_sessao())
+    if not entradas:
+        return
+    pendente = any(e["status"] in ("fila", "enviando") for e in entradas)
+    estado = {"atuais": entradas}  # a primeira execução (rerun da página) usa a leitura acima
+
+    @st.fragment(run_every=2 if pendente else None)
+    def _painel():
+        atuais = estado.pop("atuais", None)
+        if atuais is None:
+            atuais = fila.da_sessao(_id_sessao())
+        pendente_agora = any(e["status"] in ("fila", "enviando") for e in atuais)
+        if pendente and not pendente_agora:
+            st.rerun()  # tudo enviado: rerun da página recria o fragmento sem run_every
+        falhou = any(e["status"] == "falhou" for e in atuais)
+        with st.expander("📤 Envios para a planilha", expanded=pendente_agora or falhou):
+            for e in atuais:
+                hora = datetime.fromtimestamp(e["criado"], ZoneInfo("America/Sao_Paulo")).strftime("%H:%M:%S")
+                linha = f"{STATUS_ENVIO.get(e['status'], e['status'])} — #{e['id']} {e['descricao']} ({hora})"
+                if e["status"] == "fila" and e["tentativas"]:
+                    linha += f" · tentativa {e['tentativas'] + 1}"
+                st.caption(linha)
+                if e["status"] == "falhou":
+                    st.caption(f":red[{_safe_str(e['resultado'])}]")
+                    if st.button(f"Reenviar #{e['id']}", key=f"reenviar_{e['id']}"):
+                        fila.reenviar(e["id"])
+                        st.rerun()  # da página: o fragmento volta com run_every enquanto houver fila
+    _painel()
+
 def botao_voltar(label="⬅️ Voltar ao Menu", key=None):
     left, center, right = st.columns([2, 2, 2])
     with center:
@@ -988,12 +2987,7 @@ def tela_menu_principal(client):
     render_header()
     st.divider()
 
-    df_painel = carregar_pendencias_painel_mapeadas(client)
-    df_abord  = carregar_pendencias_abordagem_pendentes(client)
-    
-    count_painel = len(df_painel) if df_painel is not None else 0
-    count_abord = len(df_abord) if df_abord is not None else 0
-    total_pendencias = count_painel + count_abord
+    total_pendencias = contar_pendencias(client)
 
     label_tratar = f"**📝 TRATAR** emissões pendentes ({total_pendencias})"
 
@@ -1021,36 +3015,56 @@ def tela_menu_principal(client):
             st.link_button("🗺️ **Mapa das Estações**", MAPS_URL, use_container_width=True)
             st.link_button("🌍 **Tradutor de Voz**", "https://translate.google.com/?sl=auto&tl=pt&op=translate", use_container_width=True)
 
+            if _diagnostico_autorizado():
+                if st.button("🩺 Diagnóstico", use_container_width=True, key="btn_diag"):
+                    st.session_state.view = 'diagnostico'; st.rerun()
+
+    render_envios_sessao(client)
+
 def tela_consultar(client):
     render_header()
     st.divider()
 
     st.markdown('<div class="info-green">Consulte as emissões pendentes de identificação para verificação em campo (em caso de sucesso, alterar Situação de Pendente para Concluído<br>(Sugestão: verifique por região)</div>', unsafe_allow_html=True)
 
-    df_painel = carregar_pendencias_painel_mapeadas(client)
-    df_abord  = carregar_pendencias_abordagem_pendentes(client)
-    if not df_painel.empty and not df_abord.empty:
-        df_pend = pd.concat([df_painel, df_abord], ignore_index=True)
-    elif not df_painel.empty:
-        df_pend = df_painel
-    else:
-        df_pend = df_abord
-
-    if df_pend is not None and not df_pend.empty:
-        opcoes = [
-            f"{row['Local']} | {row['Data']} | {row['Frequência (MHz)']} MHz | {row['Largura (kHz)']} kHz | {row['Ocorrência (observações)']} | {row['ID']}"
-            for _, row in df_pend.iterrows()
-        ]
+    lista = carregar_lista_pendencias(client)
+
+    if not lista.df.empty:
+        c1, c2, c3 = st.columns(3)
+        regiao = c1.selectbox("Região", [TODAS] + lista.opcoes("Local"), key="pend_regiao")
+        faixa = c2.selectbox("Faixa", [TODAS] + lista.opcoes("Faixa de Frequência Envolvida"), key="pend_faixa")
+        periodo = c3.date_input("Período da identificação", value=(), format="DD/MM/YYYY", key="pend_periodo")
+
+        posicoes = lista.filtrar(regiao, faixa, tuple(periodo))
+        n_paginas = max(1, -(-len(posicoes) // PENDENCIAS_POR_PAGINA))
+        # Filtro novo volta para a primeira página
+        filtros = (regiao, faixa, tuple(periodo))
+        if st.session_state.get("pend_filtros") != filtros:
+            st.session_state.pend_filtros = filtros
+            st.session_state.pend_pagina = 1
+        pagina = min(st.session_state.get("pend_pagina", 1), n_paginas)
+
+        inicio = (pagina - 1) * PENDENCIAS_POR_PAGINA
+        rotulos = lista.rotulos(posicoes[inicio:inicio + PENDENCIAS_POR_PAGINA])
         selecionado = st.selectbox(
             "Selecione a emissão para tratamento:",
-            options=opcoes,
+            options=list(rotulos),
             index=None,
             placeholder="Região | Data da ident | Frequência | Largura | Obs | ID (Estação)"
         )
 
-        if selecionado:
-            idx = opcoes.index(selecionado)
-            registro = df_pend.iloc[idx]
+        colP, colInfo, colN = st.columns([1, 3, 1])
+        with colP:
+            if st.button("◀", disabled=pagina <= 1, use_container_width=True, key="pend_anterior"):
+                st.session_state.pend_pagina = pagina - 1; st.rerun()
+        with colInfo:
+            st.caption(f"Página {pagina} de {n_paginas} · {len(posicoes)} de {len(lista.df)} pendências")
+        with colN:
+            if st.button("▶", disabled=pagina >= n_paginas, use_container_width=True, key="pend_proxima"):
+                st.session_state.pend_pagina = pagina + 1; st.rerun()
+
+        registro = lista.registro(rotulos[selecionado]) if selecionado in rotulos else None
+        if registro is not None:
             id_sel      = str(registro.get("ID", ""))
             estacao_raw = str(registro.get("EstacaoRaw", ""))
             fiscal      = str(registro.get("Fiscal", ""))
@@ -1118,7 +3132,17 @@ def tela_consultar(client):
                             }
                         }
                         msgs = []
-                        if pac["fonte"] == "PAINEL":
+                        if ESCRITA_ASSINCRONA:
+                            descricao = f"Edição do ID {pac['id_sel']} ({local_map})"
+                            if pac["fonte"] == "PAINEL":
+                                n = get_fila_escritas(client).enfileirar("edicao_mae", _id_sessao(), descricao, estacao_raw=pac["estacao_raw"],
+                                                                        id_ocorrencia=pac["id_sel"], novos_valores=pac["novos"])
+                                msgs.append(f"Alterações da ocorrência {pac['id_sel']} recebidas (envio #{n} na fila para a planilha).")
+                            elif pac["fonte"] == "ABORDAGEM":
+                                n = get_fila_escritas(client).enfileirar("edicao_abordagem", _id_sessao(), descricao,
+                                                                        id_h=pac["id_sel"], novos_valores=pac["novos"])
+                                msgs.append(f"Alterações do registro {pac['id_sel']} recebidas (envio #{n} na fila para a planilha).")
+                        elif pac["fonte"] == "PAINEL":
                             r1 = atualizar_campos_na_aba_mae(client, pac["estacao_raw"], pac["id_sel"], pac["novos"]); msgs.append(r1)
                         elif pac["fonte"] == "ABORDAGEM":
                             r2 = atualizar_campos_abordagem_por_id(client, pac["id_sel"], pac["novos"]); msgs.append(r2)
@@ -1128,10 +3152,19 @@ def tela_consultar(client):
     else:
         st.success("✔️ Nenhuma emissão pendente de identificação no momento.")
 
+    render_envios_sessao(client)
     if botao_voltar():
         st.session_state.view = 'main_menu'; st.rerun()
 
 # --- FUNÇÃO TELA_INSERIR (TOTALMENTE SUBSTITUÍDA E CORRIGIDA) ---
+def _registrar_emissao(client, dados_formatados: Dict[str, str]) -> Optional[str]:
+    """Grava (ou enfileira, no modo write-behind) a nova emissão; devolve a mensagem de sucesso ou None."""
+    if ESCRITA_ASSINCRONA:
+        descricao = f"Emissão {float(dados_formatados.get('Frequência em MHz') or 0):.3f} MHz"
+        n = get_fila_escritas(client).enfileirar("emissao", _id_sessao(), descricao, dados_formulario=dados_formatados)
+        return f"Nova emissão recebida (envio #{n} na fila para a planilha)"
+    return "Nova emissão registrada com sucesso" if inserir_emissao_I_W(client, dados_formatados) else None
+
 def tela_inserir(client):
     render_header()
     st.divider()
@@ -1149,6 +3182,7 @@ def tela_inserir(client):
             del st.session_state.confirm_freq_asked
         if 'regiao_existente' in st.session_state:
             del st.session_state.regiao_existente
+        st.session_state.pop('coincidencias_freq', None)
         
         # NÃO DÊ RETURN. Deixe o código continuar para renderizar
         # o formulário novamente, agora com os dados preenchidos.
@@ -1175,16 +3209,26 @@ def tela_inserir(client):
                 del st.session_state.dados_para_salvar
             if 'regiao_existente' in st.session_state:
                 del st.session_state.regiao_existente
+            st.session_state.pop('coincidencias_freq', None)
             st.rerun()
         
         freq_nova = dados_para_salvar.get('Frequência em MHz', 'desconhecida')
         # Pega a região salva para exibir no popup
         regiao_existente = st.session_state.get('regiao_existente', 'região desconhecida')
+        coincidencias = st.session_state.get('coincidencias_freq', [])
         
+        # Lista os registros coincidentes (frequência próxima ou faixa sobreposta)
+        itens = "".join(
+            f"<li>{c['Frequência (MHz)']:.3f} MHz ({c['Largura (kHz)']:.1f} kHz) | {c['Região']} | {c['Aba']} | ID {c['ID']}</li>"
+            for c in coincidencias[:10]
+        )
+        lista = f"<ul style='text-align:left; margin:.5rem 0 0 0;'>{itens}</ul>" if itens else ""
+
         # Exibe a região
         st.markdown(f"""
             <div class='confirm-warning'>
                 <strong>ATENÇÃO:</strong> A frequência <strong>{freq_nova} MHz</strong> já existe na base (registrada na região: <strong>{regiao_existente}</strong>).
+                {lista}
                 <br>Deseja registrar esta nova emissão mesmo assim?
             </div>
             """, unsafe_allow_html=True)
@@ -1205,9 +3249,9 @@ def tela_inserir(client):
                     dados_formatados['Dia'] = dados_formatados['Dia'].strftime('%d/%m/%Y')
                     dados_formatados['Hora'] = dados_formatados['Hora'].strftime('%H:%M')
                     
-                    ok = inserir_emissao_I_W(client, dados_formatados)
-                    if ok:
-                        st.session_state.insert_success = "Nova emissão registrada com sucesso"
+                    msg_ok = _registrar_emissao(client, dados_formatados)
+                    if msg_ok:
+                        st.session_state.insert_success = msg_ok
                     else:
                         st.error("Falha ao registrar.")
                 
@@ -1217,6 +3261,7 @@ def tela_inserir(client):
                 del st.session_state.confirm_freq_asked 
                 if 'regiao_existente' in st.session_state:
                     del st.session_state.regiao_existente
+                st.session_state.pop('coincidencias_freq', None)
                 st.rerun() 
 
         with colR:
@@ -1226,6 +3271,7 @@ def tela_inserir(client):
                 del st.session_state.confirm_freq_asked 
                 if 'regiao_existente' in st.session_state:
                     del st.session_state.regiao_existente
+                st.session_state.pop('coincidencias_freq', None)
                 
                 # Avisa o usuário e recarrega o formulário
                 st.info("Registro cancelado. Você pode editar os dados e tentar novamente.")
@@ -1239,6 +3285,7 @@ def tela_inserir(client):
                 del st.session_state.dados_para_salvar
             if 'regiao_existente' in st.session_state:
                 del st.session_state.regiao_existente
+            st.session_state.pop('coincidencias_freq', None)
             st.session_state.view = 'main_menu'
             st.rerun()
         
@@ -1246,7 +3293,7 @@ def tela_inserir(client):
 
     # ESTADO 4: FORMULÁRIO PRINCIPAL (Default)
     # Se nenhum dos estados acima for verdadeiro, mostra o formulário.
-    frequencias_existentes_map = carregar_todas_frequencias(client)
+    indice_frequencias = carregar_todas_frequencias(client)
     opcoes_identificacao = carregar_opcoes_identificacao(client)
     
     with st.form("form_nova_emissao", clear_on_submit=False):
@@ -1335,17 +3382,20 @@ def tela_inserir(client):
             else:
                 # --- LÓGICA DE CHECAGEM DE DUPLICIDADE ---
                 try:
-                    # Arredonda para 3 casas decimais para a checagem
-                    freq_nova = round(float(dados['Frequência em MHz']), 3)
+                    freq_nova = float(dados['Frequência em MHz'])
+                    larg_nova = float(dados['Largura em kHz'] or 0.0)
                 except:
-                    freq_nova = 0.0 # Já teria falhado no 'erros'
+                    freq_nova, larg_nova = 0.0, 0.0 # Já teria falhado no 'erros'
                 
-                # Checa se a frequência existe
-                if freq_nova in frequencias_existentes_map:
+                # Checa se a frequência existe (±tolerância ou faixa sobreposta)
+                coincidencias = indice_frequencias.consultar(freq_nova, larg_nova)
+                if coincidencias:
                     st.session_state.confirm_freq_asked = True
                     st.session_state.dados_para_salvar = dados
-                    # Armazena a região para o popup
-                    st.session_state.regiao_existente = frequencias_existentes_map[freq_nova]
+                    # Armazena as regiões e os registros para o popup
+                    regioes = list(dict.fromkeys(c["Região"] for c in coincidencias if c["Região"]))
+                    st.session_state.regiao_existente = ", ".join(regioes) or "região desconhecida"
+                    st.session_state.coincidencias_freq = coincidencias
                     st.rerun() # Dispara o ESTADO 3 (popup)
                 else:
                     # Prossiga com o registro (é nova)
@@ -1359,10 +3409,10 @@ def tela_inserir(client):
                     dados_formatados['Hora'] = dados_formatados['Hora'].strftime('%H:%M')
                     
                     with st.spinner("Registrando..."):
-                        ok = inserir_emissao_I_W(client, dados_formatados)
+                        msg_ok = _registrar_emissao(client, dados_formatados)
                     
-                    if ok:
-                        st.session_state.insert_success = "Nova emissão registrada com sucesso"
+                    if msg_ok:
+                        st.session_state.insert_success = msg_ok
                     else:
                         st.error("Falha ao registrar. Verifique os campos obrigatórios (especialmente Faixa de Frequência).")
                         # Se falhar, não fazemos nada, o rerun vai manter os dados
@@ -1373,7 +3423,8 @@ def tela_inserir(client):
     if 'insert_success' in st.session_state:
         st.success(st.session_state.insert_success)
         del st.session_state.insert_success # Limpa o flag AQUI
-        
+
+    render_envios_sessao(client)
     if botao_voltar(key="voltar_inserir"):
         # Limpa os dados do formulário antes de voltar ao menu
         if 'dados_para_salvar' in st.session_state:
@@ -1399,6 +3450,7 @@ def tela_bsr_erb(client):
 
     if st.session_state.bsr_form_submitted:
         st.success(st.session_state.get('bsr_success_message', 'Ocorrência registrada com sucesso!'))
+        render_envios_sessao(client)
         
         _, col_ok, _ = st.columns([3, 4, 3])
         with col_ok:
@@ -1434,8 +3486,13 @@ def tela_bsr_erb(client):
             elif coord_erros:
                 st.error("Erro nas coordenadas: " + " | ".join(coord_erros))
             else:
-                with st.spinner("Registrando..."):
-                    resultado = inserir_bsr_erb(client, tipo, regiao, lat, lon)
+                if ESCRITA_ASSINCRONA:
+                    n = get_fila_escritas(client).enfileirar("bsr_erb", _id_sessao(), f"{tipo} em {regiao.strip()}",
+                                                            tipo_ocorrencia=tipo, regiao=regiao, lat=lat, lon=lon)
+                    resultado = f"'{tipo}' recebido (envio #{n} na fila para a planilha)."
+                else:
+                    with st.spinner("Registrando..."):
+                        resultado = inserir_bsr_erb(client, tipo, regiao, lat, lon)
                 
                 if "ERRO" in resultado:
                     st.error(resultado)
@@ -1469,121 +3526,141 @@ def tela_busca(client):
             st.warning("Digite pelo menos 3 caracteres para consultar.")
         else:
             with st.spinner("Procurando..."):
-                df_res = _buscar_por_texto_livre(client, termo.strip(), sel_abas)
-            if df_res.empty:
-                st.info("Nenhum resultado encontrado para sua consulta.")
-            else:
-                st.success(f"Resultados encontrados: {len(df_res)}")
-
-                for i, (_, row) in enumerate(df_res.iterrows(), start=1):
-                    cabecalho = []
-                    aba_origem = row.get("Aba/Origem")
-
-                    if aba_origem == "Abordagem":
-                        cabecalho.append("Abordagem")
-                        data = _safe_str(row.get("Data.1", row.get("Data")));
-                        if data: cabecalho.append(data)
-                        freq = _safe_str(row.get("Frequência (MHz).1", row.get("Frequência (MHz)")));
-                        if freq: cabecalho.append(f"{freq} MHz")
-                        ident = _safe_str(row.get("Identificação.1", row.get("Identificação")));
-                        if ident: cabecalho.append(ident)
-                        situ = _safe_str(row.get("Situação.1", row.get("Situação")));
-                        if situ: cabecalho.append(situ)
-                    else:
-                        loc = _safe_str(row.get("Local", ""));
-                        if not loc: loc = _safe_str(row.get("Local/Região", row.get("Estação","")))
-                        if loc: cabecalho.append(loc)
-
-                        data = _safe_str(row.get("Data", row.get("Dia","")))
-                        if data: cabecalho.append(data)
-
-                        freq = _safe_str(row.get("Frequência (MHz)", row.get("Frequência","")))
-                        if freq: cabecalho.append(f"{freq} MHz")
-
-                        idv = _safe_str(row.get("ID", ""))
-                        if idv: cabecalho.append(f"ID {idv}")
-
-                    titulo = " | ".join(cabecalho) if cabecalho else f"Resultado #{i} ({aba_origem})"
-
-                    with st.expander(titulo, expanded=False):
-                        key_prefix = f"busca_{i}_{row.get('ID','semid')}"
-                        render_ocorrencia_readonly(row, key_prefix=key_prefix)
+                df_res = _buscar_por_texto_livre(client, termo.strip(), sel_abas).reset_index(drop=True)
+            # Guarda o resultado: paginar e abrir detalhes não refazem a busca. "n" numera a consulta
+            # e entra nas keys da tabela/detalhes, para a seleção da consulta anterior não valer nesta.
+            st.session_state.busca_n = st.session_state.get("busca_n", 0) + 1
+            st.session_state.busca_resultado = {"termo": termo.strip(), "df": df_res, "resumo": _resumo_busca(df_res),
+                                                "n": st.session_state.busca_n}
+            st.session_state.busca_pagina = 1
+
+    resultado = st.session_state.get("busca_resultado")
+    if resultado is not None:
+        df_res, resumo = resultado["df"], resultado["resumo"]
+        if df_res.empty:
+            st.info("Nenhum resultado encontrado para sua consulta.")
+        else:
+            st.success(f"Resultados encontrados para '{resultado['termo']}': {len(df_res)}")
+            n_paginas = max(1, -(-len(df_res) // RESULTADOS_POR_PAGINA))
+            pagina = min(st.session_state.get("busca_pagina", 1), n_paginas)
+            inicio = (pagina - 1) * RESULTADOS_POR_PAGINA
+
+            evento = st.dataframe(
+                resumo.iloc[inicio:inicio + RESULTADOS_POR_PAGINA],
+                hide_index=True, use_container_width=True,
+                on_select="rerun", selection_mode="single-row",
+                key=f"busca_tabela_{resultado['n']}_{pagina}",
+            )
+
+            colP, colInfo, colN = st.columns([1, 3, 1])
+            with colP:
+                if st.button("◀", disabled=pagina <= 1, use_container_width=True, key="busca_anterior"):
+                    st.session_state.busca_pagina = pagina - 1; st.rerun()
+            with colInfo:
+                st.caption(f"Página {pagina} de {n_paginas} · toque numa linha para ver os detalhes")
+            with colN:
+                if st.button("▶", disabled=pagina >= n_paginas, use_container_width=True, key="busca_proxima"):
+                    st.session_state.busca_pagina = pagina + 1; st.rerun()
+
+            # Só a linha aberta monta o formulário de detalhes
+            linhas_sel = evento.selection.rows if evento is not None else []
+            pos = inicio + linhas_sel[0] if linhas_sel else -1
+            if 0 <= pos < len(resumo):
+                st.markdown(f"#### {' | '.join(v for v in resumo.iloc[pos].tolist() if v)}")
+                render_ocorrencia_readonly(df_res.iloc[pos], key_prefix=f"busca_{resultado['n']}_{pos}")
 
     if botao_voltar(key="voltar_busca"):
+        st.session_state.pop("busca_resultado", None)
         st.session_state.view = 'main_menu'; st.rerun()
 
-def tela_tabela_ute(client):
-    render_header()
-    st.divider()
-    st.markdown("#### Atos de UTE - COP30")
-    st.markdown("<p style='text-align: center; font-size: small; margin-top: -0.5rem; margin-bottom: 0.5rem;'>(gire o celular ⟳)</p>", unsafe_allow_html=True)
-
-
-    st.markdown("""
-    <script>
-    function copyToClipboard(text, element) {
+# --- TABELA UTE (HTML pronto por versão dos dados) ---
+_CSS_JS_TABELA_UTE = """
+<style>
+    .ute-filtro { width: 100%; padding: 8px; margin-bottom: .75rem; border: 1px solid #ccc; border-radius: 6px; font-size: 1rem; }
+    .ute-table { width: 100%; border-collapse: collapse; margin-bottom: 1.5rem; }
+    .ute-table th, .ute-table td { border: 1px solid #ddd; padding: 8px; text-align: center; }
+    .ute-table th { background-color: #f2f2f2; color: #333; }
+    .copyable-cell { cursor: pointer; color: #14337b; font-weight: bold; -webkit-tap-highlight-color: transparent; }
+    .copyable-cell:hover { text-decoration: underline; background-color: #f0f0f0; }
+</style>
+<script>
+(function () {
+    const filtro = document.getElementById('ute-filtro');
+    const linhas = Array.from(document.querySelectorAll('#ute-table tbody tr'));
+    const normalizar = (t) => t.normalize('NFD').replace(/[\\u0300-\\u036f]/g, '').toLowerCase().trim();
+    filtro.addEventListener('input', () => {
+        const termo = normalizar(filtro.value);
+        for (const tr of linhas) {
+            tr.style.display = (!termo || tr.dataset.busca.includes(termo)) ? '' : 'none';
+        }
+    });
+    document.getElementById('ute-table').addEventListener('click', (ev) => {
+        const cel = ev.target.closest('.copyable-cell');
+        if (!cel) return;
+        const texto = cel.dataset.copiar;
         const el = document.createElement('textarea');
-        el.value = text;
+        el.value = texto;
         el.style.position = 'absolute';
         el.style.left = '-9999px';
         document.body.appendChild(el);
         el.select();
         try {
-            var successful = document.execCommand('copy');
-            var msg = successful ? 'Copiado! ✔️' : 'Falhou!';
-            element.innerHTML = msg;
+            cel.textContent = document.execCommand('copy') ? 'Copiado! ✔️' : 'Falhou!';
         } catch (err) {
-            element.innerHTML = 'Falhou!';
+            cel.textContent = 'Falhou!';
         }
         document.body.removeChild(el);
-        setTimeout(() => { element.innerHTML = text; }, 1500);
-    }
-    </script>
-    """, unsafe_allow_html=True)
-    
-    st.markdown("""
-    <style>
-        .ute-table {
-            width: 100%;
-            border-collapse: collapse;
-            margin-bottom: 1.5rem;
-        }
-        .ute-table th, .ute-table td {
-            border: 1px solid #ddd;
-            padding: 8px;
-            text-align: center;
-        }
-        .ute-table th {
-            background-color: #f2f2f2;
-            color: #333;
-        }
-        .copyable-cell {
-            cursor: pointer;
-            color: #14337b;
-            font-weight: bold;
-            -webkit-tap-highlight-color: transparent;
-        }
-        .copyable-cell:hover {
-            text-decoration: underline;
-            background-color: #f0f0f0;
-        }
-    </style>
-    """, unsafe_allow_html=True)
-
-    df_ute = carregar_dados_ute(client)
-
-    if not df_ute.empty:
-        html = "<table class='ute-table'><thead><tr><th>País</th><th>Frequência (MHz)</th><th>Largura (kHz)</th><th>Processo SEI</th></tr></thead><tbody>"
-        for _, row in df_ute.iterrows():
-            processo_sei = _safe_str(row['Processo SEI'])
-            html += "<tr>"
-            html += f"<td>{_safe_str(row['País'])}</td>"
-            html += f"<td>{_safe_str(row['Frequência (MHz)'])}</td>"
-            html += f"<td>{_safe_str(row['Largura (kHz)'])}</td>"
-            html += f"<td class='copyable-cell' onclick='copyToClipboard(\"{processo_sei}\", this)'>{processo_sei}</td>"
-            html += "</tr>"
-        html += "</tbody></table>"
-        st.markdown(html, unsafe_allow_html=True)
+        setTimeout(() => { cel.textContent = texto; }, 1500);
+    });
+})();
+</script>
+"""
+
+def _serie_html(s: pd.Series) -> pd.Series:
+    """html.escape (com aspas) aplicado à coluna inteira numa passada vetorizada."""
+    return (s.astype(str).str.replace("&", "&amp;", regex=False).str.replace("<", "&lt;", regex=False)
+            .str.replace(">", "&gt;", regex=False).str.replace('"', "&quot;", regex=False)
+            .str.replace("'", "&#x27;", regex=False))
+
+def _html_tabela_ute(df_ute: pd.DataFrame) -> str:
+    """Tabela dos Atos de UTE (com filtro por país/frequência e cópia do processo no navegador)."""
+    pais = _serie_safe_str(df_ute["País"])
+    freq = _serie_safe_str(df_ute["Frequência (MHz)"])
+    largura = _serie_safe_str(df_ute["Largura (kHz)"])
+    sei = _serie_safe_str(df_ute["Processo SEI"])
+    # Texto do filtro: sem acento/minúsculo, frequência com vírgula e com ponto
+    busca = _normalizar_serie(pais + " " + freq + " " + freq.str.replace(",", ".", regex=False) + " " + sei)
+
+    sei_html = _serie_html(sei)
+    linhas = ("<tr data-busca='" + _serie_html(busca) + "'><td>" + _serie_html(pais) + "</td><td>" + _serie_html(freq)
+              + "</td><td>" + _serie_html(largura) + "</td><td class='copyable-cell' data-copiar='" + sei_html + "'>"
+              + sei_html + "</td></tr>")
+    return (
+        "<input id='ute-filtro' class='ute-filtro' type='search' placeholder='Filtrar por país ou frequência'>"
+        "<table id='ute-table' class='ute-table'><thead><tr><th>País</th><th>Frequência (MHz)</th>"
+        "<th>Largura (kHz)</th><th>Processo SEI</th></tr></thead><tbody>"
+        + "".join(linhas.tolist()) + "</tbody></table>" + _CSS_JS_TABELA_UTE
+    )
+
+def carregar_html_tabela_ute(client) -> str:
+    """HTML da tabela UTE; refeito só quando o conteúdo do bloco da Tabela UTE muda ("" se vazia)."""
+    return _html_tabela_ute_por_versao(client, _versao_snapshot(client, "ute"))
+
+@st.cache_resource(max_entries=2)
+def _html_tabela_ute_por_versao(_client, versao: str) -> str:
+    df_ute = carregar_dados_ute(_client)
+    return "" if df_ute.empty else _html_tabela_ute(df_ute)
+
+def tela_tabela_ute(client):
+    render_header()
+    st.divider()
+    st.markdown("#### Atos de UTE - COP30")
+    st.markdown("<p style='text-align: center; font-size: small; margin-top: -0.5rem; margin-bottom: 0.5rem;'>(gire o celular ⟳)</p>", unsafe_allow_html=True)
+
+
+    html_tabela = carregar_html_tabela_ute(client)
+    if html_tabela:
+        st.html(html_tabela, unsafe_allow_javascript=True)
     else:
         st.info("Nenhum dado de Ato UTE encontrado ou a tabela está vazia.")
 
@@ -1597,10 +3674,88 @@ def tela_tabela_ute(client):
     if botao_voltar(key="voltar_ute"):
         st.session_state.view = 'main_menu'; st.rerun()
 
+def tela_diagnostico(client):
+    render_header()
+    st.divider()
+    diag = get_diagnostico()
+    foto = diag.fotografia()
+    st.markdown("#### 🩺 Diagnóstico de chamadas ao Sheets")
+
+    ultimo_minuto = diag.chamadas_ultimo_minuto()
+    c1, c2, c3 = st.columns(3)
+    c1.metric("Chamadas no último minuto", sum(ultimo_minuto.values()))
+    c2.metric("Chamadas desde o início", sum(int(v["chamadas"]) for v in foto["por_metodo"].values()))
+    c3.metric("Reruns registrados", sum(int(v["reruns"]) for v in foto["por_tela"].values()))
+    cota = get_limitador().estado()
+    c1, c2, c3, c4 = st.columns(4)
+    c1.metric("Tokens de leitura", f"{cota['leitura']}/{COTA_LEITURAS_MIN}")
+    c2.metric("Tokens de escrita", f"{cota['escrita']}/{COTA_ESCRITAS_MIN}")
+    c3.metric("Esperas na fila", cota["esperas"], help=f"{cota['segundos_espera']} s no total")
+    c4.metric("Retentativas (429)", f"{cota['retentativas']} ({cota['cotas_excedidas']})")
+    if ultimo_minuto:
+        st.caption("Último minuto por tela: " + " | ".join(f"{t}: {n}" for t, n in sorted(ultimo_minuto.items(), key=lambda x: -x[1])))
+
+    def _tabela(dados: Dict[str, Dict[str, float]], chave: str) -> pd.DataFrame:
+        df = pd.DataFrame.from_dict(dados, orient="index").rename_axis(chave).reset_index()
+        if not df.empty:
+            df["ms"] = df["ms"].round(1)
+            df = df.sort_values("chamadas", ascending=False)
+        return df
+
+    st.markdown("**Por tela**")
+    st.dataframe(_tabela(foto["por_tela"], "tela"), hide_index=True, use_container_width=True)
+    st.markdown("**Por método**")
+    st.dataframe(_tabela(foto["por_metodo"], "método").drop(columns="reruns", errors="ignore"),
+                 hide_index=True, use_container_width=True)
+
+    st.markdown("**Cache dos loaders (st.cache_data)**")
+    df_cache = pd.DataFrame.from_dict(foto["cache"], orient="index").rename_axis("loader").reset_index()
+    if not df_cache.empty:
+        df_cache["acertos"] = df_cache["chamadas"] - df_cache["faltas"]
+        df_cache["taxa de acerto"] = (df_cache["acertos"] / df_cache["chamadas"].where(df_cache["chamadas"] > 0)).round(3)
+    st.dataframe(df_cache, hide_index=True, use_container_width=True)
+
+    st.markdown("**Últimos reruns**")
+    reruns = [
+        {"hora": datetime.fromtimestamp(r["ts"], ZoneInfo("America/Sao_Paulo")).strftime("%H:%M:%S"),
+         "sessão": r["sessao"], "rerun": r["rerun"], "tela": r["tela"], "chamadas": r["total_chamadas"],
+         "ms Sheets": r["ms_sheets"], "ms rerun": r["ms_rerun"], "bytes": r["bytes"],
+         "cache (faltas)": ", ".join(k for k, v in r["cache"].items() if v == "falta")}
+        for r in reversed(foto["reruns"])
+    ]
+    st.dataframe(pd.DataFrame(reruns), hide_index=True, use_container_width=True)
+
+    st.markdown("**Últimas chamadas**")
+    chamadas = [
+        {"hora": datetime.fromtimestamp(c["ts"], ZoneInfo("America/Sao_Paulo")).strftime("%H:%M:%S"),
+         "tela": c["tela"], "método": c["metodo"], "aba": c["alvo"], "intervalo": c["intervalo"],
+         "ms": c["ms"], "bytes": c["bytes_enviados"] + c["bytes_recebidos"], "erro": c["erro"] or ""}
+        for c in reversed(foto["chamadas"])
+    ]
+    st.dataframe(pd.DataFrame(chamadas), hide_index=True, use_container_width=True)
+    disco = get_cache_disco()
+    if disco is not None:
+        d = disco.estado()
+        st.caption(f"Cache em disco (`{disco.arquivo}`): {d['entradas']} entradas, {d['bytes'] / 1e6:.1f} MB | "
+                   f"acertos {d['acertos']} | faltas {d['faltas']} | esperas por outro processo {d['esperas']} | "
+                   f"despejos {d['despejos']}")
+    if ESCRITA_ASSINCRONA:
+        fila = get_fila_escritas(client).contagem()
+        st.caption("Fila de escritas: " + (" | ".join(f"{STATUS_ENVIO.get(k, k)}: {v}" for k, v in fila.items()) or "vazia"))
+    if diag.arquivo is not None:
+        st.caption(f"Métricas por rerun gravadas em `{diag.arquivo}` (JSONL, até {diag.max_bytes / 1e6:.0f} MB + `.1`).")
+    else:
+        st.caption(f"Métricas dos últimos {diag.MAX_RERUNS} reruns só na memória (COP30_METRICAS=<arquivo> grava em JSONL).")
+
+    if botao_voltar(key="voltar_diag"):
+        st.session_state.view = 'main_menu'; st.rerun()
+
 # =========================== MAIN ===========================
 try:
     client = get_gspread_client()
     if 'view' not in st.session_state: st.session_state.view = 'main_menu'
+    st.session_state.diag_rerun = st.session_state.get('diag_rerun', 0) + 1
+    get_diagnostico().iniciar_rerun(_id_sessao(), st.session_state.diag_rerun, st.session_state.view)
     
     if st.session_state.view == 'main_menu':
         tela_menu_principal(client)
@@ -1614,9 +3769,14 @@ try:
         tela_busca(client)
     elif st.session_state.view == 'tabela_ute':
         tela_tabela_ute(client)
+    elif st.session_state.view == 'diagnostico' and _diagnostico_autorizado():
+        tela_diagnostico(client)
+    elif st.session_state.view == 'diagnostico':
+        st.session_state.view = 'main_menu'; st.rerun()
 except Exception as e:
     st.error("Erro fatal de autenticação ou inicialização. Verifique os seus segredos (secrets.toml).")
 
     st.exception(e)
-
-
+finally:
+    # Também em st.rerun()/st.stop() (exceções de controle que não herdam de Exception)
+    get_diagnostico().finalizar_rerun()
@@ -0,0 +1,195 @@
+"""
+Benchmark das telas do app contra a planilha fake (planilha_fake.py).
+
+Para cada tela roda o script headless (streamlit.testing.v1.AppTest) com cache
+frio (st.cache_data/st.cache_resource limpos) e quente (rerun seguinte), e mede
+tempo de parede, número de chamadas à API do Sheets (por método) e bytes lidos.
+As telas com ação (salvar, registrar, buscar) também têm a ação medida.
+
+Uso:
+    python benchmark.py                         # 1k, 10k e 50k linhas por aba
+    python benchmark.py --tamanhos 1000         # só um tamanho
+    python benchmark.py --atualizar-baseline    # grava benchmark_baseline.json
+    python benchmark.py --latencia 0.05         # simula latência de rede por chamada
+
+Sem --atualizar-baseline, o resultado é comparado com o baseline: qualquer
+chamada a mais (ex.: um col_values novo no caminho de inserção) ou bytes acima
+de +10% é reportado como regressão e o processo sai com código 1. O tempo de
+parede depende da máquina e só entra na comparação com --comparar-tempo (use
+com um baseline gravado na mesma máquina).
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+
+os.environ["COP30_BACKEND"] = "fake"
+# Escritas síncronas: o custo de cada envio fica dentro do passo medido (e não na thread da fila)
+os.environ.setdefault("COP30_ESCRITA", "sincrona")
+
+import streamlit as st
+from streamlit.testing.v1 import AppTest
+
+import planilha_fake
+
+# AppTest fora do `streamlit run` avisa a cada rerun que não há runtime; só polui o relatório
+logging.getLogger("streamlit").setLevel(logging.ERROR)
+
+BASE_DIR = Path(__file__).parent
+APP = str(BASE_DIR / "abordagem.py")
+BASELINE = BASE_DIR / "benchmark_baseline.json"
+TAMANHOS = [1000, 10000, 50000]
+TIMEOUT = 600
+
+
+# --- AÇÕES POR TELA ---
+def _acao_consultar(at):
+    [s for s in at.selectbox if s.label.startswith("Selecione a emissão")][0].select_index(0).run()
+    [s for s in at.selectbox if "Situação" in s.label][0].set_value("Concluído")
+    at.checkbox[0].uncheck()
+    [b for b in at.button if b.label == "Salvar alterações"][0].click().run()
+
+def _acao_inserir(at):
+    at.text_input[0].input("Fiscal Benchmark")
+    at.number_input[0].set_value(6500.5)
+    at.number_input[1].set_value(12.5)
+    at.selectbox[0].set_value("FM")
+    at.selectbox[1].select_index(0)
+    at.selectbox[2].set_value("Sim")
+    at.selectbox[3].set_value("Não")
+    at.text_area[0].input("benchmark")
+    [b for b in at.button if b.label == "Registrar Emissão"][0].click().run()
+
+def _acao_bsr(at):
+    at.radio[0].set_value("ERB Fake")
+    at.text_input[0].input("Docas")
+    at.text_input[1].input("-1.123456")
+    [b for b in at.button if b.label == "Registrar Ocorrência"][0].click().run()
+
+def _acao_busca(at):
+    at.text_input[0].input("98888-0042")
+    [b for b in at.button if b.label == "Consultar"][0].click().run()
+
+# view -> (nome da ação, função) ; None = tela só de leitura
+TELAS = {
+    "main_menu": None,
+    "consultar": ("salvar", _acao_consultar),
+    "inserir": ("registrar", _acao_inserir),
+    "bsr_erb": ("registrar", _acao_bsr),
+    "busca": ("consultar", _acao_busca),
+    "tabela_ute": None,
+}
+
+
+# --- MEDIÇÃO ---
+def _medir(planilha, passo):
+    planilha.zerar_contadores()
+    t0 = time.perf_counter()
+    at = passo()
+    dt = time.perf_counter() - t0
+    erros = [e.value for e in at.exception] + [e.value for e in at.error]
+    return at, {
+        "ms": round(dt * 1000, 1),
+        "chamadas": planilha.total_chamadas,
+        "por_metodo": dict(sorted(planilha.chamadas.items())),
+        "bytes": planilha.bytes,
+        "erros": [str(e)[:200] for e in erros],
+    }
+
+def _nova_sessao(view):
+    at = AppTest.from_file(APP, default_timeout=TIMEOUT)
+    at.session_state["view"] = view
+    return at.run()
+
+def medir_tamanho(n_linhas, latencia=0.0):
+    """Roda todas as telas para um tamanho de planilha e devolve {passo: métricas}."""
+    abas = planilha_fake.semear(n_linhas)
+    resultado = {}
+    for view, acao in TELAS.items():
+        # Cada tela parte da mesma planilha (as ações de outras telas escrevem nela)
+        planilha = planilha_fake.configurar(planilha_fake.PlanilhaFake(abas, latencia=latencia))
+        st.cache_data.clear()
+        st.cache_resource.clear()
+
+        _, resultado[f"{view}:frio"] = _medir(planilha, lambda: _nova_sessao(view))
+        at, resultado[f"{view}:quente"] = _medir(planilha, lambda: _nova_sessao(view))
+        if acao:
+            nome, fn = acao
+            _, resultado[f"{view}:{nome}"] = _medir(planilha, lambda: (fn(at), at)[1])
+    return resultado
+
+
+# --- RELATÓRIO / BASELINE ---
+def _imprimir(n_linhas, resultado):
+    print(f"\n== {n_linhas} linhas por aba ==")
+    print(f"{'passo':24s} {'ms':>10s} {'chamadas':>9s} {'bytes':>12s}  métodos")
+    for passo, m in resultado.items():
+        metodos = " ".join(f"{k}={v}" for k, v in m["por_metodo"].items())
+        print(f"{passo:24s} {m['ms']:10.1f} {m['chamadas']:9d} {m['bytes']:12d}  {metodos}")
+        for e in m["erros"]:
+            print(f"{'':24s} ERRO: {e}")
+
+def comparar(atual, baseline, tolerancia_tempo=None):
+    """Lista de regressões (strings) do resultado atual em relação ao baseline (tempo só com tolerancia_tempo)."""
+    regressoes = []
+    for tamanho, passos in atual.items():
+        base_tamanho = baseline.get(tamanho, {})
+        for passo, m in passos.items():
+            b = base_tamanho.get(passo)
+            if b is None:
+                continue
+            for metodo, qtd in m["por_metodo"].items():
+                if qtd > b["por_metodo"].get(metodo, 0):
+                    regressoes.append(f"{tamanho} {passo}: {metodo} {b['por_metodo'].get(metodo, 0)} -> {qtd}")
+            if m["bytes"] > b["bytes"] * 1.1:
+                regressoes.append(f"{tamanho} {passo}: bytes {b['bytes']} -> {m['bytes']}")
+            if (tolerancia_tempo is not None and m["ms"] > b["ms"] * (1 + tolerancia_tempo)
+                    and m["ms"] - b["ms"] > 50):
+                regressoes.append(f"{tamanho} {passo}: tempo {b['ms']}ms -> {m['ms']}ms")
+            if m["erros"] and not b["erros"]:
+                regressoes.append(f"{tamanho} {passo}: erro novo: {m['erros'][0]}")
+    return regressoes
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--tamanhos", type=int, nargs="+", default=TAMANHOS, help="linhas por aba")
+    ap.add_argument("--latencia", type=float, default=0.0, help="segundos por chamada ao Sheets fake")
+    ap.add_argument("--baseline", type=Path, default=BASELINE)
+    ap.add_argument("--atualizar-baseline", action="store_true", help="grava o resultado como novo baseline")
+    ap.add_argument("--comparar-tempo", action="store_true",
+                    help="também acusa regressão de tempo (só faz sentido com baseline da mesma máquina)")
+    ap.add_argument("--tolerancia-tempo", type=float, default=0.5,
+                    help="com --comparar-tempo, aumento relativo aceito (padrão 0.5 = +50%%)")
+    args = ap.parse_args(argv)
+
+    atual = {}
+    for n in args.tamanhos:
+        atual[str(n)] = medir_tamanho(n, latencia=args.latencia)
+        _imprimir(n, atual[str(n)])
+
+    if args.atualizar_baseline:
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8")) if args.baseline.exists() else {}
+        baseline.update(atual)
+        args.baseline.write_text(json.dumps(baseline, indent=2, ensure_ascii=False), encoding="utf-8")
+        print(f"\nBaseline gravado em {args.baseline}")
+        return 0
+
+    if not args.baseline.exists():
+        print(f"\nSem baseline ({args.baseline}); rode com --atualizar-baseline para criar.")
+        return 0
+    tolerancia = args.tolerancia_tempo if args.comparar_tempo else None
+    regressoes = comparar(atual, json.loads(args.baseline.read_text(encoding="utf-8")), tolerancia)
+    if regressoes:
+        print("\nREGRESSÕES:")
+        for r in regressoes:
+            print("  " + r)
+        return 1
+    print("\nSem regressões em relação ao baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,514 @@
+# -*- coding: utf-8 -*-
+"""
+Backend local (em memória) que emula a parte da API do gspread usada pelo App COP30.
+
+Serve para medir e otimizar o app sem tocar na planilha real da COP30:
+    - latência configurável por chamada (fixa + jitter);
+    - injeção de erros 429 (cota excedida), por taxa aleatória ou por cota/minuto;
+    - contadores de chamadas e bytes trafegados, por método;
+    - fixtures realistas (PAINEL, Abordagem, RFeye, Miaer, CWSM, Tabela UTE).
+
+Para rodar o app inteiro contra o fake (sem secrets.toml):
+    COP30_BACKEND=fake streamlit run abordagem.py
+
+Variáveis de ambiente lidas na criação da instância do processo:
+    COP30_FAKE_LINHAS    linhas por aba nas fixtures (padrão 200)
+    COP30_FAKE_LATENCIA  segundos de latência por chamada (padrão 0)
+    COP30_FAKE_JITTER    segundos extras aleatórios por chamada (padrão 0)
+    COP30_FAKE_TAXA_429  fração das chamadas que falham com 429 (padrão 0)
+    COP30_FAKE_COTA      máximo de chamadas por minuto antes do 429 (padrão: sem limite)
+
+Uso em benchmarks/testes:
+    import planilha_fake
+    planilha_fake.configurar(planilha_fake.PlanilhaFake(planilha_fake.semear(n_linhas=1000), latencia=0.05))
+    cliente = planilha_fake.ClienteFake()   # mesmo papel de gspread.authorize(...)
+"""
+import json
+import os
+import random
+import re
+import threading
+import time
+from collections import Counter, deque
+from datetime import date, timedelta
+from typing import Dict, List, Optional
+
+import gspread
+from gspread.cell import Cell
+from gspread.utils import absolute_range_name
+
+URL_FAKE = "https://docs.google.com/spreadsheets/d/planilha-fake/edit"
+
+
+# ===================== NOTAÇÃO A1 =====================
+def _col_to_index(letter: str) -> int:
+    res = 0
+    for ch in (letter or "").upper():
+        if "A" <= ch <= "Z":
+            res = res * 26 + (ord(ch) - ord("A") + 1)
+    return res
+
+def _index_to_col(idx: int) -> str:
+    s = ""
+    while idx > 0:
+        idx, r = divmod(idx - 1, 26)
+        s = chr(ord("A") + r) + s
+    return s
+
+_RE_CELULA = re.compile(r"^([A-Za-z]*)(\d*)$")
+
+def _parse_a1(rng: str):
+    """'A1:AF' -> (1, 1, None, 32). Extremos abertos viram None."""
+    partes = (rng or "").split(":")
+    ini = _RE_CELULA.match(partes[0].strip())
+    fim = _RE_CELULA.match(partes[-1].strip())
+    if not ini or not fim:
+        raise ValueError(f"Intervalo inválido: {rng}")
+    c1 = _col_to_index(ini.group(1)) or 1
+    r1 = int(ini.group(2)) if ini.group(2) else 1
+    c2 = _col_to_index(fim.group(1)) or None
+    r2 = int(fim.group(2)) if fim.group(2) else None
+    if len(partes) == 1:
+        c2 = c2 or c1
+        r2 = r2 if ini.group(2) else None
+    return r1, c1, r2, c2
+
+def _separar_aba(rng: str):
+    """"'PAINEL'!A1:AF" -> ("PAINEL", "A1:AF")."""
+    if "!" not in rng:
+        if rng.startswith("'") and rng.endswith("'"):
+            return rng[1:-1].replace("''", "'"), None  # só o nome da aba = aba inteira
+        return None, rng
+    aba, intervalo = rng.rsplit("!", 1)
+    aba = aba.strip()
+    if aba.startswith("'") and aba.endswith("'"):
+        aba = aba[1:-1].replace("''", "'")
+    return aba, intervalo
+
+def _tamanho(obj) -> int:
+    return len(json.dumps(obj, ensure_ascii=False, default=str).encode("utf-8"))
+
+
+# ===================== ERROS =====================
+class _RespostaFake:
+    """Imita o `requests.Response` que o `gspread.exceptions.APIError` espera."""
+    def __init__(self, code: int, message: str, status: str):
+        self.status_code = code
+        self._corpo = {"error": {"code": code, "message": message, "status": status}}
+        self.text = json.dumps(self._corpo)
+
+    def json(self):
+        return self._corpo
+
+def _erro_api(code: int, message: str, status: str) -> gspread.exceptions.APIError:
+    return gspread.exceptions.APIError(_RespostaFake(code, message, status))
+
+
+# ===================== PLANILHA =====================
+class PlanilhaFake:
+    """Equivalente ao `gspread.Spreadsheet`, com os dados em memória."""
+
+    def __init__(self, abas: Dict[str, List[List[str]]], latencia: float = 0.0, jitter: float = 0.0,
+                 taxa_429: float = 0.0, cota_por_minuto: Optional[int] = None, seed: Optional[int] = None):
+        self.id = "planilha-fake"
+        self.title = "COP30 (fake)"
+        self.url = URL_FAKE
+        self.latencia = latencia
+        self.jitter = jitter
+        self.taxa_429 = taxa_429
+        self.cota_por_minuto = cota_por_minuto
+        self.chamadas = Counter()
+        self.bytes = 0
+        self.revisao = 0
+        self._rand = random.Random(seed)
+        self._janela = deque()
+        self._lock = threading.RLock()
+        self._abas: Dict[str, "AbaFake"] = {}
+        for i, (titulo, linhas) in enumerate(abas.items()):
+            self._abas[titulo] = AbaFake(self, titulo, i, linhas)
+
+    # ---- latência / cota / contadores ----
+    def _admitir(self, metodo: str):
+        """Conta a chamada e aplica cota, 429 injetado e latência; como no servidor, antes de qualquer efeito."""
+        with self._lock:
+            self.chamadas[metodo] += 1
+            if self.cota_por_minuto is not None:
+                agora = time.monotonic()
+                while self._janela and agora - self._janela[0] > 60:
+                    self._janela.popleft()
+                if len(self._janela) >= self.cota_por_minuto:
+                    raise _erro_api(429, "Quota exceeded for quota metric 'Requests' (fake).", "RESOURCE_EXHAUSTED")
+                self._janela.append(agora)
+            if self.taxa_429 and self._rand.random() < self.taxa_429:
+                raise _erro_api(429, "Quota exceeded (fake, injetado).", "RESOURCE_EXHAUSTED")
+            atraso = self.latencia + (self._rand.random() * self.jitter if self.jitter else 0.0)
+        if atraso > 0:
+            time.sleep(atraso)
+
+    def _responder(self, resposta):
+        if resposta is not None:
+            with self._lock:
+                self.bytes += _tamanho(resposta)
+        return resposta
+
+    def _chamar(self, metodo: str, resposta=None):
+        self._admitir(metodo)
+        return self._responder(resposta)
+
+    def zerar_contadores(self):
+        with self._lock:
+            self.chamadas.clear()
+            self.bytes = 0
+
+    @property
+    def total_chamadas(self) -> int:
+        return sum(self.chamadas.values())
+
+    # ---- API do gspread.Spreadsheet ----
+    def worksheets(self, exclude_hidden: bool = False):
+        self._chamar("worksheets")
+        return list(self._abas.values())
+
+    def worksheet(self, title: str):
+        self._chamar("worksheet")
+        try:
+            return self._abas[title]
+        except KeyError:
+            raise gspread.exceptions.WorksheetNotFound(title)
+
+    def get_lastUpdateTime(self) -> str:
+        self._chamar("get_lastUpdateTime")
+        return f"rev-{self.revisao}"
+
+    def values_batch_get(self, ranges: List[str], params: Optional[dict] = None):
+        params = params or {}
+        value_ranges = []
+        for rng in ranges:
+            titulo, intervalo = _separar_aba(rng)
+            aba = self._abas.get(titulo)
+            if aba is None:
+                self._chamar("values_batch_get")
+                raise _erro_api(400, f"Unable to parse range: {rng}", "INVALID_ARGUMENT")
+            value_ranges.append({
+                "range": rng,
+                "majorDimension": params.get("majorDimension", "ROWS"),
+                "values": aba._ler(intervalo, params.get("majorDimension")),
+            })
+        corpo = {"spreadsheetId": self.id, "valueRanges": value_ranges}
+        return self._chamar("values_batch_get", corpo)
+
+
+class AbaFake:
+    """Equivalente ao `gspread.Worksheet`."""
+
+    def __init__(self, planilha: PlanilhaFake, title: str, sheet_id: int, linhas: List[List[str]]):
+        self.spreadsheet = planilha
+        self.title = title
+        self.id = sheet_id
+        self._linhas = [[("" if v is None else str(v)) for v in linha] for linha in linhas]
+
+    @property
+    def row_count(self) -> int:
+        return max(1000, len(self._linhas))
+
+    @property
+    def col_count(self) -> int:
+        return max(26, max((len(r) for r in self._linhas), default=0))
+
+    # ---- leitura interna (sem contabilizar) ----
+    def _ler(self, intervalo: Optional[str], major_dimension: Optional[str] = None, pad: bool = False):
+        with self.spreadsheet._lock:
+            if not intervalo:
+                r1, c1, r2, c2 = 1, 1, None, None
+            else:
+                r1, c1, r2, c2 = _parse_a1(intervalo)
+            r2 = r2 if r2 is not None else len(self._linhas)
+            c2 = c2 if c2 is not None else self.col_count
+            saida = []
+            for r in range(r1, r2 + 1):
+                linha = self._linhas[r - 1] if r - 1 < len(self._linhas) else []
+                trecho = linha[c1 - 1:c2]
+                if pad:
+                    trecho = trecho + [""] * ((c2 - c1 + 1) - len(trecho))
+                else:
+                    while trecho and trecho[-1] == "":
+                        trecho.pop()
+                saida.append(list(trecho))
+            if not pad:
+                while saida and not saida[-1]:
+                    saida.pop()
+        if (major_dimension or "ROWS").upper().startswith("COL"):
+            largura = max((len(r) for r in saida), default=0)
+            colunas = [[(r[i] if i < len(r) else "") for r in saida] for i in range(largura)]
+            for col in colunas:
+                while col and col[-1] == "":
+                    col.pop()
+            return colunas
+        return saida
+
+    def _escrever(self, r1: int, c1: int, valores: List[List]):
+        with self.spreadsheet._lock:
+            for dr, linha in enumerate(valores):
+                r = r1 + dr
+                while len(self._linhas) < r:
+                    self._linhas.append([])
+                alvo = self._linhas[r - 1]
+                for dc, v in enumerate(linha):
+                    c = c1 + dc
+                    if len(alvo) < c:
+                        alvo.extend([""] * (c - len(alvo)))
+                    alvo[c - 1] = "" if v is None else str(v)
+            self.spreadsheet.revisao += 1
+
+    def _intervalo_local(self, rng: str) -> str:
+        titulo, intervalo = _separar_aba(rng)
+        if titulo is not None and titulo != self.title:
+            raise _erro_api(400, f"Intervalo de outra aba: {rng}", "INVALID_ARGUMENT")
+        return intervalo
+
+    # ---- API do gspread.Worksheet ----
+    # Escritas: _admitir antes de gravar, para um 429 (cota ou injetado) não deixar nada escrito.
+    def get(self, range_name: Optional[str] = None, major_dimension: Optional[str] = None,
+            pad_values: bool = False, **_):
+        valores = self._ler(self._intervalo_local(range_name) if range_name else None, major_dimension, pad_values)
+        return self.spreadsheet._chamar("get", valores)
+
+    def get_all_values(self, **_):
+        largura = max((len(r) for r in self._linhas), default=0)
+        valores = self._ler(f"A1:{_index_to_col(largura)}" if largura else None, pad=True) if largura else []
+        while valores and all(v == "" for v in valores[-1]):
+            valores.pop()
+        return self.spreadsheet._chamar("get_all_values", valores)
+
+    def batch_get(self, ranges: List[str], major_dimension: Optional[str] = None, **_):
+        valores = [self._ler(self._intervalo_local(r), major_dimension) for r in ranges]
+        return self.spreadsheet._chamar("batch_get", valores)
+
+    def col_values(self, col: int, **_):
+        letra = _index_to_col(col)
+        colunas = self._ler(f"{letra}1:{letra}", "COLUMNS")
+        valores = colunas[0] if colunas else []
+        return self.spreadsheet._chamar("col_values", valores)
+
+    def row_values(self, row: int, **_):
+        linhas = self._ler(f"A{row}:{_index_to_col(self.col_count)}{row}")
+        valores = linhas[0] if linhas else []
+        return self.spreadsheet._chamar("row_values", valores)
+
+    def acell(self, label: str, **_):
+        r, c, _, _ = _parse_a1(label)
+        linhas = self._ler(label)
+        valor = linhas[0][0] if linhas and linhas[0] else ""
+        self.spreadsheet._chamar("acell", valor)
+        return Cell(r, c, valor)
+
+    def find(self, query: str, in_row: Optional[int] = None, in_column: Optional[int] = None, **_):
+        achado = None
+        with self.spreadsheet._lock:
+            for r, linha in enumerate(self._linhas, start=1):
+                if in_row is not None and r != in_row:
+                    continue
+                for c, v in enumerate(linha, start=1):
+                    if in_column is not None and c != in_column:
+                        continue
+                    if v == str(query):
+                        achado = Cell(r, c, v)
+                        break
+                if achado:
+                    break
+        # A busca no servidor baixa a planilha inteira (como o gspread real)
+        self.spreadsheet._chamar("find", self._linhas)
+        return achado
+
+    def update(self, range_name=None, values=None, value_input_option=None, **_):
+        # Aceita as duas ordens de argumentos do gspread (range, values) / (values, range)
+        if isinstance(range_name, list) and not isinstance(values, list):
+            range_name, values = values, range_name
+        self.spreadsheet._admitir("update")
+        intervalo = self._intervalo_local(range_name or "A1")
+        r1, c1, _, _ = _parse_a1(intervalo)
+        self._escrever(r1, c1, values or [])
+        return self.spreadsheet._responder({"updatedRange": f"{self.title}!{intervalo}"})
+
+    def update_cell(self, row: int, col: int, value):
+        self.spreadsheet._admitir("update_cell")
+        self._escrever(row, col, [[value]])
+        return self.spreadsheet._responder({"updatedRange": f"{self.title}!{_index_to_col(col)}{row}"})
+
+    def batch_update(self, data: List[dict], value_input_option=None, **_):
+        # Como o gspread: data[i]["range"] de quem chamou vira "'Aba'!H10" antes do envio
+        for item in data:
+            item["range"] = absolute_range_name(self.title, item["range"])
+        self.spreadsheet._admitir("batch_update")
+        # A API valida todos os intervalos antes de gravar: um 400 não deixa escrita pela metade
+        escritas = []
+        for item in data:
+            r1, c1, _, _ = _parse_a1(self._intervalo_local(item["range"]))
+            escritas.append((r1, c1, item.get("values") or []))
+        for r1, c1, valores in escritas:
+            self._escrever(r1, c1, valores)
+        return self.spreadsheet._responder({"totalUpdatedCells": sum(len(l) for _, _, v in escritas for l in v)})
+
+    def append_rows(self, values: List[List], value_input_option=None, table_range: Optional[str] = None, **_):
+        self.spreadsheet._admitir("append_rows")
+        r1, c1, _, _ = _parse_a1(table_range or "A1")
+        with self.spreadsheet._lock:
+            col = c1 - 1
+            ultima = 0
+            for r, linha in enumerate(self._linhas, start=1):
+                if any((v or "") != "" for v in linha[col:col + len(values[0]) if values else col + 1]):
+                    ultima = r
+            self._escrever(max(ultima + 1, r1), c1, values)
+        return self.spreadsheet._responder({"updates": {"updatedRows": len(values)}})
+
+
+class ClienteFake:
+    """Equivalente ao `gspread.Client`: devolve sempre a planilha configurada."""
+
+    def __init__(self, planilha: Optional[PlanilhaFake] = None):
+        self._planilha = planilha
+
+    @property
+    def planilha(self) -> PlanilhaFake:
+        return self._planilha or instancia()
+
+    def open_by_url(self, url: str) -> PlanilhaFake:
+        p = self.planilha
+        p._chamar("open_by_url")
+        return p
+
+    def open_by_key(self, key: str) -> PlanilhaFake:
+        p = self.planilha
+        p._chamar("open_by_key")
+        return p
+
+
+# ===================== INSTÂNCIA DO PROCESSO =====================
+_INSTANCIA: Optional[PlanilhaFake] = None
+
+def configurar(planilha: PlanilhaFake) -> PlanilhaFake:
+    """Define a planilha fake compartilhada pelo processo (app + benchmarks)."""
+    global _INSTANCIA
+    _INSTANCIA = planilha
+    return planilha
+
+def instancia() -> PlanilhaFake:
+    global _INSTANCIA
+    if _INSTANCIA is None:
+        cota = os.environ.get("COP30_FAKE_COTA")
+        _INSTANCIA = PlanilhaFake(
+            semear(int(os.environ.get("COP30_FAKE_LINHAS", "200"))),
+            latencia=float(os.environ.get("COP30_FAKE_LATENCIA", "0")),
+            jitter=float(os.environ.get("COP30_FAKE_JITTER", "0")),
+            taxa_429=float(os.environ.get("COP30_FAKE_TAXA_429", "0")),
+            cota_por_minuto=int(cota) if cota else None,
+        )
+    return _INSTANCIA
+
+
+# ===================== FIXTURES =====================
+ESTACOES = {
+    "RFeye002093 - ANATEL": "RFeye002093",
+    "RFeye002303 - PARQUE DA CIDADE": "RFeye002303",
+    "RFeye002315 - DOCAS": "RFeye002315",
+    "RFeye002012 - OUTEIRO": "RFeye002012",
+    "RFeye002175 - ALDEIA": "RFeye002175",
+    "RFeye002129 - MANGUEIRINHO": "RFeye002129",
+    "Miaer - PARQUE DA CIDADE": "Miaer",
+    "CWSM - UFPA": "CWSM",
+}
+
+CAB_ESTACAO = [
+    "ID", "Estação", "Fiscal", "Data", "HH:mm", "Tipo", "Frequência (MHz)", "Largura (kHz)",
+    "Faixa de Frequência Envolvida", "Identificação", "Autorizado?", "UTE?", "Processo SEI UTE",
+    "Ocorrência (obsevações)", "Alguém mais ciente?", "Situação", "Interferente?",
+]
+
+CAB_ABORDAGEM = [
+    "Data", "Frequência (MHz)", "Identificação", "Situação", "", "", "",
+    "ID", "Local/Região", "Fiscal", "Data", "HH:mm", "Frequência (MHz)", "Largura (kHz)",
+    "Faixa de Frequência Envolvida", "Identificação", "Autorizado?", "UTE?", "Processo SEI UTE",
+    "Ocorrência (obsevações)", "Alguém mais ciente?", "Interferente?", "Situação",
+    "BSR/Jammer", "Local BSR/Jammer", "ERB Fake", "Local ERB Fake", "Latitude", "Longitude",
+]
+
+IDENT = [
+    "Sinal de dados", "Comunicação (voz) relacionada ao evento", "Comunicação (voz) não relacionada ao evento",
+    "Sinal não relacionado ao evento", "Espúrio ou Produto de Intermodulação", "Ruído", "Não identificado",
+]
+FAIXAS = ["FM", "SMA", "SMM", "SLP", "TV", "SMP", "GNSS", "Satélite", "Radiação Restrita"]
+FISCAIS = ["Ana Souza", "João Pereira", "Márcia Lima", "Paulo César", "Luís Araújo", "Beatriz Conceição"]
+OBS = [
+    "Emissão intermitente próxima ao palco", "Rádio comunicador da segurança", "Sinal forte na área azul",
+    "Contato: (91) 98888-{:04d}", "Portaria informou equipe de TV", "Drone de filmagem", "Sem contato local",
+]
+PAISES = ["Brasil", "França", "Alemanha", "Japão", "Estados Unidos", "China", "Índia", "Noruega"]
+
+
+def _linha_ocorrencia(rnd: random.Random, i: int, estacao: str) -> List[str]:
+    dia = date(2025, 11, 1) + timedelta(days=rnd.randrange(30))
+    freq = round(rnd.uniform(30.0, 6000.0), 3)
+    situ = "Pendente" if rnd.random() < 0.15 else "Concluído"
+    return [
+        str(i), estacao, rnd.choice(FISCAIS), dia.strftime("%d/%m/%Y"),
+        f"{rnd.randrange(24):02d}:{rnd.randrange(60):02d}", "Monitoração",
+        f"{freq:.3f}".replace(".", ","), f"{rnd.choice([12.5, 25, 200, 5000]):.1f}".replace(".", ","),
+        rnd.choice(FAIXAS), rnd.choice(IDENT), rnd.choice(["Sim", "Não", "Não licenciável"]),
+        rnd.choice(["Sim", "Não"]), "", rnd.choice(OBS).format(i), "", situ,
+        rnd.choice(["Sim", "Não", "Indefinido"]),
+    ]
+
+
+def semear(n_linhas: int = 200, seed: int = 30) -> Dict[str, List[List[str]]]:
+    """
+    Gera as abas da planilha com `n_linhas` ocorrências em PAINEL, Abordagem e
+    em cada aba de estação. Determinístico para o mesmo `seed`.
+    """
+    rnd = random.Random(seed)
+    abas: Dict[str, List[List[str]]] = {}
+
+    painel = [list(CAB_ESTACAO)]
+    for i in range(1, n_linhas + 1):
+        estacao = rnd.choice(list(ESTACOES.values()))
+        painel.append(_linha_ocorrencia(rnd, i, estacao))
+    abas["PAINEL"] = painel
+
+    abordagem = [list(CAB_ABORDAGEM)]
+    n_bsr = max(1, n_linhas // 20)
+    for i in range(1, n_linhas + 1):
+        base = _linha_ocorrencia(rnd, i, "")
+        local = rnd.choice(["Anatel", "Parque da Cidade", "Docas", "Hangar", "Aldeia", "Blue Zone"])
+        linha = [base[3], base[6], base[9], base[15], "", "", "",
+                 str(i), local] + base[2:5] + base[6:15] + [base[16], base[15]]
+        if i <= n_bsr:
+            lat = f"-1.{rnd.randrange(10**6):06d}"
+            lon = f"-48.{rnd.randrange(10**6):06d}"
+            if rnd.random() < 0.5:
+                linha += ["1", local, "", "", lat, lon]
+            else:
+                linha += ["", "", "1", local, lat, lon]
+        abordagem.append(linha)
+    abas["Abordagem"] = abordagem
+
+    for titulo, estacao in ESTACOES.items():
+        linhas = [list(CAB_ESTACAO)]
+        for i in range(1, n_linhas + 1):
+            linhas.append(_linha_ocorrencia(rnd, i, estacao))
+        abas[titulo] = linhas
+
+    # Opções de identificação em AC3:AC9 da aba da ANATEL
+    anatel = abas["RFeye002093 - ANATEL"]
+    for k, opcao in enumerate(IDENT, start=3):
+        linha = anatel[k - 1]
+        linha.extend([""] * (29 - len(linha)))
+        linha[28] = opcao
+
+    ute = [["País", "Delegação", "Contato", "Equipamento", "Frequência (MHz)", "Largura (kHz)", "Validade", "Processo SEI"]]
+    for i in range(1, max(10, n_linhas // 10) + 1):
+        ute.append([
+            rnd.choice(PAISES), f"Delegação {i}", "", "Rádio portátil",
+            f"{rnd.uniform(100, 900):.4f}".replace(".", ","), f"{rnd.choice([12.5, 25]):.1f}".replace(".", ","),
+            "30/11/2025", f"53500.{rnd.randrange(10**6):06d}/2025-{rnd.randrange(100):02d}",
+        ])
+    abas["Tabela UTE"] = ute
+    return abas
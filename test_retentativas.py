@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+Repetição das chamadas ao Sheets (429/5xx) com o gspread de verdade por baixo.
+
+O Worksheet é o do gspread; só a sessão HTTP é trocada por um stub que responde como a API
+(429 na primeira escrita, 400 para intervalo que não dá para interpretar).
+"""
+import copy
+import json
+import os
+import tempfile
+
+_TMP = tempfile.mkdtemp(prefix="cop30-teste-")
+os.environ["COP30_BACKEND"] = "fake"
+os.environ["COP30_ESCRITA"] = "sincrona"
+os.environ["COP30_DIARIO"] = os.path.join(_TMP, "diario_escritas.sqlite3")
+os.environ["COP30_TRAVAS"] = os.path.join(_TMP, "travas_escrita.sqlite3")
+
+import pytest
+from gspread.http_client import HTTPClient
+from gspread.worksheet import Worksheet
+
+import abordagem
+import planilha_fake
+
+
+class _RespostaStub:
+    def __init__(self, code: int, corpo: dict):
+        self.status_code = code
+        self.ok = code < 400
+        self._corpo = corpo
+        self.text = json.dumps(corpo)
+
+    def json(self):
+        return self._corpo
+
+
+class _SessaoStub:
+    """Sessão HTTP do gspread: as `falhas` primeiras requisições voltam 429; as demais são gravadas."""
+    def __init__(self, falhas: int = 1):
+        self.falhas = falhas
+        self.corpos = []
+
+    def request(self, method, url, json=None, **_):
+        if self.falhas:
+            self.falhas -= 1
+            return _RespostaStub(429, {"error": {"code": 429, "message": "Quota exceeded", "status": "RESOURCE_EXHAUSTED"}})
+        for item in json.get("data", []):
+            if item["range"].count("!") != 1:
+                return _RespostaStub(400, {"error": {"code": 400, "message": f"Unable to parse range: {item['range']}",
+                                                     "status": "INVALID_ARGUMENT"}})
+        self.corpos.append(copy.deepcopy(json))
+        return _RespostaStub(200, {"totalUpdatedCells": sum(len(l) for d in json["data"] for l in d["values"])})
+
+
+def _aba_instrumentada(sessao: _SessaoStub):
+    http = HTTPClient(auth=None, session=sessao)
+    aba = Worksheet(None, {"title": "Abordagem", "sheetId": 1, "index": 0}, spreadsheet_id="planilha", client=http)
+    return abordagem._ApiInstrumentada(aba, aba.title)
+
+
+def test_batch_update_repetido_apos_429_envia_o_intervalo_original(monkeypatch):
+    monkeypatch.setattr(abordagem, "_backoff", lambda tentativa: 0.0)
+    sessao = _SessaoStub(falhas=1)
+    dados = [{"range": "H10:I10", "values": [["301", "Docas"]]}, {"range": "W10", "values": [["Pendente"]]}]
+
+    _aba_instrumentada(sessao).batch_update(dados, value_input_option="USER_ENTERED")
+
+    assert len(sessao.corpos) == 1
+    assert [d["range"] for d in sessao.corpos[0]["data"]] == ["'Abordagem'!H10:I10", "'Abordagem'!W10"]
+    assert dados[0]["range"] == "H10:I10"  # o payload de quem chamou não é alterado
+
+
+def test_batch_update_desiste_depois_do_maximo_de_tentativas(monkeypatch):
+    monkeypatch.setattr(abordagem, "_backoff", lambda tentativa: 0.0)
+    sessao = _SessaoStub(falhas=abordagem.MAX_TENTATIVAS)
+
+    with pytest.raises(abordagem.gspread.exceptions.APIError) as erro:
+        _aba_instrumentada(sessao).batch_update([{"range": "H10", "values": [["1"]]}])
+    assert erro.value.code == 429
+    assert sessao.corpos == []
+
+
+def test_fake_rejeita_429_sem_gravar_e_prefixa_os_intervalos_como_o_gspread():
+    planilha = planilha_fake.PlanilhaFake(planilha_fake.semear(10), taxa_429=1.0)
+    aba = planilha._abas["Abordagem"]
+    antes = aba._ler("H6:I6")
+    dados = [{"range": "H6:I6", "values": [["999", "Docas"]]}]
+
+    with pytest.raises(abordagem.gspread.exceptions.APIError) as erro:
+        aba.batch_update(dados)
+    assert erro.value.code == 429
+    assert aba._ler("H6:I6") == antes
+    assert dados[0]["range"] == "'Abordagem'!H6:I6"
+
+    # Reenviar os mesmos objetos falha como na API real (intervalo com a aba duas vezes)
+    planilha.taxa_429 = 0.0
+    with pytest.raises(abordagem.gspread.exceptions.APIError) as erro:
+        aba.batch_update(dados)
+    assert erro.value.code == 400
+    assert aba._ler("H6:I6") == antes